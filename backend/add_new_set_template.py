@@ -1,6 +1,9 @@
 """
 Template Script to Add New Question Set
 
+For sets kept in a spreadsheet, import_questions.py (CSV/NDJSON, with
+validation and a dry run) is usually easier than editing this file.
+
 Instructions:
 1. Copy this file and rename it (e.g., add_set2_questions.py)
 2. Replace the sample questions with your actual questions
@@ -18,6 +21,8 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from invalidation import InvalidationBus
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -97,6 +102,11 @@ async def seed_new_set():
     
     await db.questions.insert_many(all_questions)
     
+    # Drop the admin dashboard summary; the server rebuilds it on next read
+    await db.question_sets.delete_one({"_id": "summary"})
+    # Running servers re-read their question bank now instead of when it ages out
+    await InvalidationBus.publish_once(db, "questions")
+    
     # Verify
     tamil_count = await db.questions.count_documents({
         "subject": "tamil",
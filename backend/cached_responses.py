@@ -0,0 +1,121 @@
+"""
+Precompressed, ETagged responses
+
+EncodedBody holds one cacheable JSON body in every encoding we serve:
+identity, gzip and (when the brotli package is installed) br. The
+variants are built once, at maximum compression, when the body is built,
+so serving a request is a header lookup and a bytes copy with no
+compression work.
+
+Each variant has a strong ETag derived from a digest of the identity
+bytes plus a per-encoding suffix (different encodings are different
+representations). Because the tag comes from the content, every worker
+and every restart agrees on it. Bodies are rebuilt when their source
+changes (a new question-bank version, an admin write), which changes the
+tag.
+
+respond() answers If-None-Match with 304 Not Modified and otherwise
+picks the smallest encoding the client accepts. Cache-Control: no-cache
+makes browsers revalidate on every load, which costs a 304 with no body.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Preferred order when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class EncodedBody:
+    __slots__ = ("digest", "variants")
+
+    def __init__(self, body: bytes):
+        self.digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        # encoding -> (bytes, etag); None is identity
+        self.variants: Dict[Optional[str], Tuple[bytes, str]] = {None: (body, f'"{self.digest}"')}
+
+        compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            # Tiny bodies can grow when compressed; keep only variants that pay off
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'"{self.digest}-{encoding}"')
+
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+
+    def respond(self, request: Request, media_type: str = "application/json") -> Response:
+        encoding = None
+        accepted = _accepted(request.headers.get("accept-encoding", ""))
+        for candidate in ENCODINGS:
+            if candidate in self.variants and candidate in accepted:
+                encoding = candidate
+                break
+        body, etag = self.variants[encoding]
+
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags.intersection(self.etags()):
+                return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+
+
+class ResponseCache:
+    """EncodedBody per key for bodies not tied to the question bank.
+
+    Entries expire after ttl seconds so writes made through another worker
+    are picked up; writes through this worker call invalidate().
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._entries: Dict[Any, Tuple[float, EncodedBody]] = {}
+        self._generation = 0
+
+    async def get(self, key: Any, build: Callable[[], Awaitable[bytes]]) -> EncodedBody:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        generation = self._generation
+        body = await build()
+        # Compressing at maximum level is CPU work; keep it off the event loop
+        encoded = await asyncio.get_running_loop().run_in_executor(None, EncodedBody, body)
+        # Don't keep a body that an invalidate() during the build made stale
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic() + self.ttl, encoded)
+        return encoded
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
@@ -0,0 +1,170 @@
+"""
+Local content store for uploaded study materials
+
+Files are stored on disk under their SHA-256, in root/<first two hex
+digits>/<digest>. Two uploads of the same PDF therefore share one file,
+and a stored file never changes, so its digest doubles as a strong ETag.
+
+save() consumes an upload as an async stream of chunks. It writes them to
+a temp file in buffered batches, hashing along the way and stopping at
+max_bytes, then renames the finished file into place. The upload is never
+held in memory and a half-written file is never visible.
+
+file_response() serves a stored file:
+  - If-None-Match: 304 with no body
+  - Range: bytes=... (one range, honouring If-Range): 206 streamed from a
+    bounded read loop
+  - otherwise a FileResponse, which goes out through the ASGI pathsend
+    extension (zero-copy) when the server supports it
+Set accel_prefix when nginx fronts the app: full downloads are then
+handed to nginx with X-Accel-Redirect, and nginx sends the file with
+sendfile() itself.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+WRITE_BATCH = 1024 * 1024  # bytes buffered per disk write
+
+
+class TooLarge(Exception):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class StoredFile:
+    __slots__ = ("key", "size")
+
+    def __init__(self, key: str, size: int):
+        self.key = key
+        self.size = size
+
+
+class ContentStore:
+    def __init__(self, root: str, max_bytes: int = 100 * 1024 * 1024, accel_prefix: Optional[str] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.accel_prefix = accel_prefix.rstrip("/") if accel_prefix else None
+        self._tmp = self.root / "tmp"
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    async def save(self, stream: AsyncIterator[bytes]) -> StoredFile:
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pending = bytearray()
+                async for chunk in stream:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise TooLarge(f"File is larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    pending += chunk
+                    if len(pending) >= WRITE_BATCH:
+                        await asyncio.to_thread(f.write, bytes(pending))
+                        pending.clear()
+                if pending:
+                    await asyncio.to_thread(f.write, bytes(pending))
+
+            key = digest.hexdigest()
+            target = self.path(key)
+            if target.exists():
+                os.unlink(tmp_name)  # same content already stored
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, target)
+            return StoredFile(key, size)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def delete(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def file_response(self, request: Request, key: str, size: int, media_type: str,
+                      filename: Optional[str] = None) -> Response:
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+        if filename:
+            # RFC 6266/5987 so Tamil file names survive
+            headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(filename)}"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and ("*" in if_none_match or etag in if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                return StreamingResponse(_read_range(self.path(key), start, end), status_code=206,
+                                         media_type=media_type, headers=headers)
+
+        if self.accel_prefix:
+            headers["X-Accel-Redirect"] = f"{self.accel_prefix}/{key[:2]}/{key}"
+            return Response(media_type=media_type, headers=headers)
+        return FileResponse(self.path(key), media_type=media_type, headers=headers)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """One "bytes=" range as inclusive (start, end); None means serve the whole file."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # unknown unit or several ranges: a full 200 is a valid answer
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            suffix = int(last)  # bytes=-N is the last N bytes
+            if suffix == 0:
+                raise RangeNotSatisfiable(header)
+            start, end = max(0, size - suffix), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,146 @@
+"""
+MongoDB client configuration and lifecycle
+
+One Motor client per process, with its pool configured from the
+environment:
+
+    MONGO_MAX_POOL_SIZE            connections per server (default 100)
+    MONGO_MIN_POOL_SIZE            connections kept open (default 10)
+    MONGO_MAX_IDLE_MS              close idle connections after (default 300000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS    longest wait for a free connection (default 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS  (default 5000)
+    MONGO_CONNECT_TIMEOUT_MS       (default 10000)
+    MONGO_ANALYTICS_MAX_STALENESS  seconds a secondary may lag for analytics reads (default 90)
+    MONGO_WARM_CONNECTIONS         connections opened at startup (default: min pool size)
+
+pymongo waits forever for a free connection by default. During an exam
+rush that turns a saturated pool into requests that hang until the
+client gives up. With a wait-queue timeout they fail fast instead, and
+server.py answers those with a 503 and Retry-After.
+
+Three handles share the pool:
+
+    db          primary reads, default (URI) write concern
+    analytics   secondaryPreferred reads, for admin listings, exports and
+                counters that can tolerate a little replication lag
+    telemetry   w=1 without journal wait, for derived rollups (user_stats,
+                question_stats) that can be rebuilt from test_attempts
+
+Creating the client opens no connections. connect() runs at startup,
+before the app reports ready. It opens the warm connections with
+concurrent pings (one connection each), so the first burst of requests
+doesn't pay for TCP/TLS handshakes and authentication.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+logger = logging.getLogger(__name__)
+
+
+def pool_options(environ=os.environ) -> Dict[str, Any]:
+    options = {
+        "maxPoolSize": int(environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(environ.get("MONGO_MIN_POOL_SIZE", 10)),
+        "maxIdleTimeMS": int(environ.get("MONGO_MAX_IDLE_MS", 300000)),
+        "waitQueueTimeoutMS": int(environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        "serverSelectionTimeoutMS": int(environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(environ.get("MONGO_CONNECT_TIMEOUT_MS", 10000)),
+    }
+    if environ.get("MONGO_APP_NAME"):
+        options["appname"] = environ["MONGO_APP_NAME"]
+    return options
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Connection counts for /metrics; called from pymongo's threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.wait_timeouts = 0
+
+    def _add(self, field: str, amount: int) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def connection_created(self, event) -> None:
+        self._add("open", 1)
+
+    def connection_closed(self, event) -> None:
+        self._add("open", -1)
+
+    def connection_checked_out(self, event) -> None:
+        self._add("in_use", 1)
+
+    def connection_checked_in(self, event) -> None:
+        self._add("in_use", -1)
+
+    def connection_check_out_failed(self, event) -> None:
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self._add("wait_timeouts", 1)
+
+    # Pool-level events we don't track
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+
+class Database:
+    def __init__(self, url: str, name: str, warm_connections: int = 0, max_staleness: int = 90,
+                 event_listeners: Iterable[Any] = (), **options: Any):
+        self.pool = PoolListener()
+        self.client = AsyncIOMotorClient(url, event_listeners=[self.pool, *event_listeners], **options)
+        self.db = self.client[name]
+        self.analytics = self.client.get_database(name, read_preference=SecondaryPreferred(max_staleness=max_staleness))
+        self.telemetry = self.client.get_database(name, write_concern=WriteConcern(w=1, j=False))
+        self.warm_connections = warm_connections
+
+    @classmethod
+    def from_env(cls, event_listeners: Iterable[Any] = (), environ=os.environ) -> "Database":
+        options = pool_options(environ)
+        return cls(
+            environ["MONGO_URL"],
+            environ["DB_NAME"],
+            warm_connections=int(environ.get("MONGO_WARM_CONNECTIONS", options["minPoolSize"])),
+            max_staleness=int(environ.get("MONGO_ANALYTICS_MAX_STALENESS", 90)),
+            event_listeners=event_listeners,
+            **options,
+        )
+
+    async def connect(self) -> None:
+        # Concurrent pings each need their own connection, so this opens warm_connections of them
+        count = max(1, self.warm_connections)
+        await asyncio.gather(*[self.client.admin.command("ping") for _ in range(count)])
+        # Secondaries serve analytics reads; open a connection to one now rather than mid-request
+        try:
+            await self.analytics.command("ping", read_preference=self.analytics.read_preference)
+        except Exception as e:
+            logger.warning("Analytics read warm-up failed: %s", e)
+        logger.info("MongoDB ready (%d warm connections)", count)
+
+    def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,191 @@
+"""
+Index bootstrap and query-plan verification
+
+INDEXES lists every index the API relies on; ensure_indexes() creates them
+at startup (create_index is a no-op when the index already exists). An
+index listed in MIGRATIONS is one the API cannot run safely without: if
+its build fails, the migration fixes the data and the build is retried,
+and startup fails if it still cannot be built.
+QUERY_SHAPES lists the filters the routes send to Mongo; verify_query_plans()
+runs explain() on each one and reports any shape that plans a COLLSCAN.
+
+Run the check from the command line (exits non-zero on a COLLSCAN):
+    python db_indexes.py --check
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from purchases import dedupe_orders
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # Admin user listing (keyset pagination, newest first)
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {"name": "created_id"}),
+    ],
+    "questions": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # Serves set_number alone (admin dashboard, set delete), set_number + subject,
+        # and is the admin listing sort key
+        ([("set_number", ASCENDING), ("subject", ASCENDING), ("question_number", ASCENDING), ("id", ASCENDING)],
+         {"name": "set_subject_number"}),
+        ([("subject", ASCENDING), ("set_number", ASCENDING)], {"name": "subject_set"}),
+    ],
+    "purchased_sets": [
+        # One row per Razorpay order; verify and reconcile upsert on it
+        ([("order_id", ASCENDING)], {"name": "order_unique", "unique": True}),
+        ([("user_id", ASCENDING), ("set_number", ASCENDING), ("is_active", ASCENDING)],
+         {"name": "user_set_active"}),
+    ],
+    "test_attempts": [
+        # Write-behind replays can resend an attempt; the duplicate is rejected
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        # Admin listing: newest first, optionally filtered by user or test type
+        ([("submitted_at", DESCENDING), ("id", DESCENDING)], {"name": "submitted_id"}),
+        ([("user_id", ASCENDING), ("submitted_at", DESCENDING), ("id", DESCENDING)], {"name": "user_submitted"}),
+        ([("test_type", ASCENDING), ("submitted_at", DESCENDING), ("id", DESCENDING)], {"name": "type_submitted"}),
+        # Leaderboard load: a covered scan, cut off by submit time, grouped by board and score
+        ([("test_type", ASCENDING), ("set_number", ASCENDING), ("score", ASCENDING), ("submitted_at", ASCENDING)],
+         {"name": "type_set_score_submitted"}),
+    ],
+    "user_stats": [
+        ([("user_id", ASCENDING)], {"name": "user_unique", "unique": True}),
+    ],
+    "question_stats": [
+        ([("question_id", ASCENDING)], {"name": "question_unique", "unique": True}),
+    ],
+    "exam_sessions": [
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ],
+    "study_materials": [
+        ([("is_active", ASCENDING), ("subject", ASCENDING)], {"name": "active_subject"}),
+        # File downloads look materials up by id; deletes check whether a stored file is still shared
+        ([("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        ([("file_key", ASCENDING)], {"name": "file_key", "sparse": True}),
+    ],
+    "rate_limits": [
+        # Only with RATE_LIMIT_STORE=mongo; a bucket past its expiry is full again anyway
+        ([("expires", ASCENDING)], {"name": "expires_ttl", "expireAfterSeconds": 0}),
+    ],
+    "invalidations": [
+        # Cross-worker cache messages are only read live by change streams; keep an hour for resumes
+        ([("at", ASCENDING)], {"name": "at_ttl", "expireAfterSeconds": 3600}),
+    ],
+}
+
+# (collection, index name) -> coroutine taking the collection, run when that index fails to build
+MIGRATIONS = {
+    # Verify and reconcile rely on it to grant each Razorpay order once
+    ("purchased_sets", "order_unique"): dedupe_orders,
+}
+
+# (collection, filter, sort) mirroring the lookups made by server.py
+QUERY_SHAPES = [
+    ("users", {"username": "shape-check"}, None),
+    ("users", {"email": "shape-check@example.com"}, None),
+    ("users", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("questions", {"id": {"$in": ["shape-check-1", "shape-check-2"]}}, None),
+    ("questions", {"subject": "physics"}, None),
+    ("questions", {"set_number": 1}, None),
+    ("questions", {"subject": "tamil", "set_number": 1}, None),
+    ("questions", {"set_number": 1},
+     [("set_number", ASCENDING), ("subject", ASCENDING), ("question_number", ASCENDING), ("id", ASCENDING)]),
+    ("purchased_sets", {"user_id": "shape-check", "set_number": 1, "is_active": True}, None),
+    ("purchased_sets", {"user_id": "shape-check", "is_active": True}, None),
+    ("purchased_sets", {"order_id": "shape-check"}, None),
+    ("test_attempts", {"user_id": "shape-check"}, None),
+    ("test_attempts", {}, [("submitted_at", DESCENDING), ("id", DESCENDING)]),
+    ("test_attempts", {"user_id": "shape-check"}, [("submitted_at", DESCENDING), ("id", DESCENDING)]),
+    ("test_attempts", {"test_type": "full", "submitted_at": {"$gte": "2025-01-01"}},
+     [("submitted_at", DESCENDING), ("id", DESCENDING)]),
+    ("user_stats", {"user_id": "shape-check"}, None),
+    ("question_stats", {"question_id": {"$in": ["shape-check"]}}, None),
+    ("study_materials", {"is_active": True}, None),
+    ("study_materials", {"id": "shape-check", "is_active": True}, None),
+    ("study_materials", {"file_key": "shape-check"}, None),
+    ("study_materials", {"is_active": True, "subject": "tamil"}, None),
+]
+
+
+async def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                migrate = MIGRATIONS.get((collection, options["name"]))
+                if migrate is None:
+                    # Typically duplicate data blocking a unique index; keep serving but make it loud
+                    logger.error("Could not create index %s.%s: %s", collection, options["name"], e)
+                    continue
+                logger.warning("Could not create index %s.%s (%s); running %s",
+                               collection, options["name"], e, migrate.__name__)
+                removed = await migrate(db[collection])
+                logger.warning("%s removed %d document(s) from %s", migrate.__name__, removed, collection)
+                # No except: serving without this index is worse than not starting
+                await db[collection].create_index(keys, **options)
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+async def verify_query_plans(db):
+    """Return [(collection, filter)] for every query shape that plans a COLLSCAN."""
+    collscans = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append((collection, query))
+    return collscans
+
+
+async def _check():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        collscans = await verify_query_plans(db)
+    finally:
+        client.close()
+
+    for collection, query in collscans:
+        print(f"❌ COLLSCAN: {collection} {query}")
+    if collscans:
+        return 1
+    print(f"✅ All {len(QUERY_SHAPES)} query shapes use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    if "--check" not in sys.argv[1:]:
+        print("Usage: python db_indexes.py --check")
+        sys.exit(2)
+    sys.exit(asyncio.run(_check()))
@@ -0,0 +1,81 @@
+"""
+Per-user entitlement cache
+
+Maps user_id to the frozenset of set_numbers the user has purchased, so
+check-access polls are answered from memory instead of a find_one on
+purchased_sets each time. Entries live in an LRU capped at max_users and
+expire after ttl seconds, which bounds how long a purchase granted or
+revoked outside this process (another worker, a manual fix in Mongo) can
+go unseen.
+
+verify_payment calls grant() so a purchase is visible immediately;
+anything that deactivates a purchase should call invalidate().
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional
+
+
+class EntitlementCache:
+    def __init__(self, collection, max_users: int = 10000, ttl: float = 300.0):
+        self._collection = collection
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: str) -> FrozenSet[int]:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        # Concurrent polls for the same user share one query
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(user_id))
+            self._loading[user_id] = loading
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            if self._loading.get(user_id) is loading and loading.done():
+                del self._loading[user_id]
+
+    async def has_access(self, user_id: str, set_number: int) -> bool:
+        return set_number in await self.get(user_id)
+
+    async def _load(self, user_id: str) -> FrozenSet[int]:
+        cursor = self._collection.find({"user_id": user_id, "is_active": True}, {"_id": 0, "set_number": 1})
+        sets = frozenset(doc["set_number"] for doc in await cursor.to_list(None))
+        # A grant() or invalidate() during the query wins over what was read
+        if self._loading.get(user_id) is asyncio.current_task():
+            self._store(user_id, sets)
+        return sets
+
+    def grant(self, user_id: str, set_number: int) -> None:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._store(user_id, entry[1] | {set_number})
+        else:
+            # Without a fresh entry we don't know the other sets; let the next read load them
+            self.invalidate(user_id)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        if user_id is None:
+            self._entries.clear()
+            self._loading.clear()
+        else:
+            self._entries.pop(user_id, None)
+            self._loading.pop(user_id, None)
+
+    def _store(self, user_id: str, sets: FrozenSet[int]) -> None:
+        self._entries[user_id] = (time.monotonic() + self.ttl, sets)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
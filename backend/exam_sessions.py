@@ -0,0 +1,284 @@
+"""
+Server-side exam sessions
+
+A session holds one student's in-progress test: start time, deadline and
+the current answers as a compact {question_id: label} dict. The frontend
+sends small answer patches as the student works; each patch carries a
+sequence number, so a retried or reordered patch never rolls an answer
+back. Patches only touch memory and mark the session dirty. A background
+task writes every dirty session to exam_sessions with one bulk_write
+every flush_interval seconds, so a dropped connection loses at most the
+unsent patch, and a restarted process loses at most one interval.
+
+finalize() marks the session submitted and hands back the answers the
+server already holds, so the final submit is a tiny request instead of a
+130-answer payload arriving at the deadline.
+
+With several workers, a student's requests can land on different
+processes. Flushes therefore write only the answers that changed
+(answers.<id> paths), never the whole dict, so two holders of a session
+cannot erase each other's answers. A worker that loads a session from
+Mongo announces it through on_claim; server.py sends that over the
+invalidation bus, and the previous holder flushes and drops its copy
+(release()). finalize() on a session loaded from Mongo re-reads the
+stored answers, after a short handoff pause, and applies its own changes
+on top.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "active"
+SUBMITTED = "submitted"
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionClosed(Exception):
+    """The session was already submitted, or a patch arrived after the deadline (plus grace)."""
+
+
+class ExamSession:
+    __slots__ = ("id", "user_id", "test_type", "set_number", "started_at", "deadline",
+                 "answers", "seq", "status", "dirty", "last_seen", "unflushed", "changes", "loaded_at")
+
+    def __init__(self, id: str, user_id: Optional[str], test_type: str, set_number: Optional[int],
+                 started_at: datetime, deadline: datetime, answers: Optional[Dict[str, str]] = None,
+                 seq: int = 0, status: str = ACTIVE):
+        self.id = id
+        self.user_id = user_id
+        self.test_type = test_type
+        self.set_number = set_number
+        self.started_at = started_at
+        self.deadline = deadline
+        self.answers = answers or {}
+        self.seq = seq
+        self.status = status
+        self.dirty = False
+        self.last_seen = time.monotonic()
+        self.unflushed: Dict[str, Optional[str]] = {}  # answer changes since the last flush
+        self.changes: Dict[str, Optional[str]] = {}  # answer changes made by this process
+        self.loaded_at: Optional[float] = None  # set when loaded from Mongo rather than created here
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "ExamSession":
+        return cls(
+            doc["id"], doc.get("user_id"), doc["test_type"], doc.get("set_number"),
+            datetime.fromisoformat(doc["started_at"]), datetime.fromisoformat(doc["deadline"]),
+            doc.get("answers"), doc.get("seq", 0), doc.get("status", ACTIVE)
+        )
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "test_type": self.test_type,
+            "set_number": self.set_number,
+            "started_at": self.started_at.isoformat(),
+            "deadline": self.deadline.isoformat(),
+            "answers": dict(self.answers),  # copied: patches keep landing while a flush encodes it
+            "seq": self.seq,
+            "status": self.status,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def update_doc(self) -> Dict[str, Any]:
+        # Only the answers that changed; None clears an answer
+        fields: Dict[str, Any] = {"updated_at": datetime.now(timezone.utc).isoformat()}
+        cleared = {}
+        for question_id, label in self.unflushed.items():
+            if label is None:
+                cleared[f"answers.{question_id}"] = ""
+            else:
+                fields[f"answers.{question_id}"] = label
+        update: Dict[str, Any] = {"$set": fields, "$max": {"seq": self.seq}}
+        if cleared:
+            update["$unset"] = cleared
+        return update
+
+    def time_left(self) -> int:
+        return max(0, int((self.deadline - datetime.now(timezone.utc)).total_seconds()))
+
+    def time_taken(self) -> int:
+        end = min(datetime.now(timezone.utc), self.deadline)
+        return max(0, int((end - self.started_at).total_seconds()))
+
+    def to_response(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "test_type": self.test_type,
+            "set_number": self.set_number,
+            "started_at": self.started_at.isoformat(),
+            "deadline": self.deadline.isoformat(),
+            "time_left": self.time_left(),
+            "answers": self.answers,
+            "seq": self.seq,
+            "status": self.status
+        }
+
+
+class ExamSessionStore:
+    def __init__(self, collection, flush_interval: float = 5.0, grace: float = 120.0, idle_timeout: float = 4 * 3600,
+                 handoff: float = 0.5):
+        self._collection = collection
+        self.flush_interval = flush_interval
+        self.grace = timedelta(seconds=grace)  # late patches/submits allowed after the deadline
+        self.idle_timeout = idle_timeout
+        self.handoff = handoff  # time for a previous holder to flush after a claim
+        self.on_claim: Optional[Callable[[str], Awaitable[None]]] = None
+        self._sessions: Dict[str, ExamSession] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def create(self, user_id: Optional[str], test_type: str, set_number: Optional[int],
+                     time_limit: int) -> ExamSession:
+        now = datetime.now(timezone.utc)
+        session = ExamSession(str(uuid.uuid4()), user_id, test_type, set_number, now,
+                              now + timedelta(seconds=time_limit))
+        # Written straight away so the session survives a restart before the first flush
+        await self._collection.insert_one(session.to_doc())
+        self._sessions[session.id] = session
+        return session
+
+    async def get(self, session_id: str) -> ExamSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            # Another process, or this one before a restart, created it
+            doc = await self._collection.find_one({"id": session_id}, {"_id": 0})
+            if doc is None:
+                raise SessionNotFound(session_id)
+            loaded = ExamSession.from_doc(doc)
+            loaded.loaded_at = time.monotonic()
+            session = self._sessions.setdefault(session_id, loaded)
+            if session is loaded and self.on_claim is not None:
+                await self.on_claim(session_id)
+        session.last_seen = time.monotonic()
+        return session
+
+    async def patch(self, session_id: str, seq: int, changes: Dict[str, Optional[str]]) -> ExamSession:
+        session = await self.get(session_id)
+        self._check_open(session)
+        if seq <= session.seq:
+            # Already applied (a retry) or overtaken by a newer patch
+            return session
+        for question_id, label in changes.items():
+            if "." in question_id or question_id.startswith("$"):
+                continue  # not a question id, and not safe as a field path
+            if label is None:
+                session.answers.pop(question_id, None)
+            else:
+                session.answers[question_id] = label
+            session.unflushed[question_id] = label
+            session.changes[question_id] = label
+        session.seq = seq
+        session.dirty = True
+        return session
+
+    async def finalize(self, session_id: str) -> ExamSession:
+        session = await self.get(session_id)
+        # No deadline check: a late submit still scores what was saved in time
+        if session.status != ACTIVE:
+            raise SessionClosed("Session already submitted")
+        if session.loaded_at is not None:
+            await self._merge_stored(session)
+        session.status = SUBMITTED
+        session.dirty = False
+        session.unflushed = {}
+        # Conditional: a submit racing this one, here or on another worker, must not score twice
+        result = await self._collection.update_one({"id": session.id, "status": ACTIVE}, {"$set": session.to_doc()})
+        self._sessions.pop(session.id, None)
+        if result.matched_count == 0:
+            raise SessionClosed("Session already submitted")
+        return session
+
+    async def _merge_stored(self, session: ExamSession) -> None:
+        # Answers another worker saved before handing the session over, plus ours on top
+        wait = self.handoff - (time.monotonic() - session.loaded_at)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        doc = await self._collection.find_one({"id": session.id}, {"_id": 0, "answers": 1, "seq": 1}) or {}
+        answers = dict(doc.get("answers") or {})
+        for question_id, label in session.changes.items():
+            if label is None:
+                answers.pop(question_id, None)
+            else:
+                answers[question_id] = label
+        session.answers = answers
+        session.seq = max(session.seq, doc.get("seq", 0))
+
+    async def release(self, session_id: str) -> None:
+        """Another worker has taken the session over: save what we have and forget it."""
+        session = self._sessions.pop(session_id, None)
+        if session is None or not session.dirty:
+            return
+        session.dirty = False
+        try:
+            await self._collection.update_one({"id": session.id, "status": ACTIVE}, session.update_doc())
+        except Exception as e:
+            logger.warning("Exam session handoff flush failed for %s: %s", session_id, e)
+
+    def _check_open(self, session: ExamSession) -> None:
+        if session.status != ACTIVE:
+            raise SessionClosed("Session already submitted")
+        if datetime.now(timezone.utc) > session.deadline + self.grace:
+            raise SessionClosed("Session deadline has passed")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Sessions stay dirty and are retried on the next tick
+                logger.warning("Exam session flush failed: %s", e)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            dirty: List[ExamSession] = [s for s in self._sessions.values() if s.dirty]
+            if dirty:
+                operations = []
+                pending = []
+                for session in dirty:
+                    operations.append(UpdateOne({"id": session.id, "status": ACTIVE}, session.update_doc()))
+                    pending.append(session.unflushed)
+                    session.unflushed = {}
+                    session.dirty = False
+                try:
+                    await self._collection.bulk_write(operations, ordered=False)
+                except Exception:
+                    for session, unflushed in zip(dirty, pending):
+                        # Changes made during the failed write are newer; keep them on top
+                        session.unflushed = {**unflushed, **session.unflushed}
+                        session.dirty = True
+                    raise
+
+            # Forget sessions nobody has touched in a while; they can be reloaded from Mongo
+            cutoff = time.monotonic() - self.idle_timeout
+            for session_id in [sid for sid, s in self._sessions.items() if s.last_seen < cutoff and not s.dirty]:
+                del self._sessions[session_id]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,72 @@
+"""
+Streaming exports
+
+Turns a Motor cursor into an async stream of NDJSON or CSV bytes, optionally
+gzip-compressed on the fly. Rows are encoded as the cursor yields them and
+flushed in ~64 KB chunks, so an export of any size runs in constant memory
+and yields control back to the event loop between batches.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def _ndjson_row(doc: Dict[str, Any]) -> bytes:
+    return json.dumps(doc, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+
+class _CsvEncoder:
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        # BOM so spreadsheet apps detect UTF-8 (Tamil names, emails)
+        self._writer.writerow(self.columns)
+        return b"\xef\xbb\xbf" + self._take()
+
+    def row(self, doc: Dict[str, Any]) -> bytes:
+        self._writer.writerow(["" if doc.get(c) is None else doc.get(c) for c in self.columns])
+        return self._take()
+
+
+async def stream_export(cursor, fmt: str, columns: Optional[List[str]] = None,
+                        gzip: bool = False) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31 -> gzip container
+    csv_encoder = _CsvEncoder(columns or []) if fmt == "csv" else None
+
+    pending = bytearray()
+    if csv_encoder:
+        pending += csv_encoder.header()
+
+    async for doc in cursor.batch_size(BATCH_SIZE):
+        pending += csv_encoder.row(doc) if csv_encoder else _ndjson_row(doc)
+        if len(pending) >= CHUNK_SIZE:
+            chunk = compressor.compress(bytes(pending)) if compressor else bytes(pending)
+            pending.clear()
+            if chunk:
+                yield chunk
+
+    tail = bytes(pending)
+    if compressor:
+        tail = compressor.compress(tail) + compressor.flush()
+    if tail:
+        yield tail
@@ -0,0 +1,56 @@
+"""
+Fast JSON serialization
+
+FastJSONResponse renders with orjson instead of the stdlib json module.
+It is the API router's default response class, so every route's final
+dump uses it. FastAPI still runs jsonable_encoder over plain dict
+returns, and for the large payloads that walk costs more than the dump.
+The heavy routes (full question paper, attempt listings, submit results)
+therefore return FastJSONResponse themselves, which FastAPI passes
+through untouched.
+
+orjson is optional: without it, or with FAST_JSON=0, dumps() falls back
+to compact stdlib json and the routes behave as before.
+tests/bench_json.py compares the paths per endpoint.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_enabled = None
+
+
+def enabled() -> bool:
+    # Decided on first use, after server.py has loaded .env
+    global _enabled
+    if _enabled is None:
+        _enabled = orjson is not None and os.environ.get('FAST_JSON', '1').lower() not in ('0', 'false', 'no')
+    return _enabled
+
+
+def _default(value: Any) -> Any:
+    # Matches what orjson and jsonable_encoder produce for the types we store
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    if enabled():
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    # Keep Tamil text as UTF-8 instead of \uXXXX escapes (about half the bytes)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
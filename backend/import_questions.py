@@ -0,0 +1,102 @@
+"""
+Import question files through the running server
+
+Streams NDJSON or CSV files to POST /api/admin/questions/import in 64 KB
+chunks. The server validates each row, upserts on id and refreshes its
+question bank, then returns a per-row report. Files ending in .gz are sent
+as-is with Content-Encoding: gzip.
+
+Usage:
+    python import_questions.py set2.csv --dry-run        # validate only
+    python import_questions.py set2.csv set3.ndjson.gz --url http://localhost:8001
+    python import_questions.py --template 2 > set2.csv   # blank CSV for one set
+
+The template has one row per question of a set (30 Tamil + 100 Physics)
+with numbers and marks filled in; fill in the text, options and answers.
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import sys
+from pathlib import Path
+
+import httpx
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {".csv": "text/csv; charset=utf-8", ".ndjson": "application/x-ndjson", ".jsonl": "application/x-ndjson"}
+TEMPLATE_COLUMNS = ["set_number", "subject", "part", "question_number", "question_text",
+                    "option_A", "option_B", "option_C", "option_D", "correct_answer", "marks"]
+
+
+def write_template(set_number: int, out) -> None:
+    writer = csv.writer(out)
+    writer.writerow(TEMPLATE_COLUMNS)
+    # Tamil: questions 1-20 carry 2 marks, 21-30 carry 1; Physics: 1.5 each
+    for number in range(1, 31):
+        writer.writerow([set_number, "tamil", "A", number, "", "", "", "", "", "", 2 if number <= 20 else 1])
+    for number in range(1, 101):
+        writer.writerow([set_number, "physics", "B", number, "", "", "", "", "", "", 1.5])
+
+
+async def _file_chunks(path: Path):
+    with path.open("rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def upload(client: httpx.AsyncClient, url: str, path: Path, dry_run: bool) -> int:
+    gzip = path.suffix == ".gz"
+    suffix = Path(path.stem).suffix if gzip else path.suffix
+    if suffix not in CONTENT_TYPES:
+        print(f"❌ {path}: expected .csv, .ndjson or .jsonl (optionally .gz)")
+        return 1
+    headers = {"Content-Type": CONTENT_TYPES[suffix]}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    response = await client.post(f"{url}/api/admin/questions/import", params={"dry_run": str(dry_run).lower()},
+                                 headers=headers, content=_file_chunks(path))
+    if response.status_code != 200:
+        print(f"❌ {path}: HTTP {response.status_code} {response.text}")
+        return 1
+
+    report = response.json()
+    label = "Checked" if dry_run else "Imported"
+    print(f"{'✅' if not report['error_count'] else '⚠️ '} {label} {path}: {report['rows']} rows, "
+          f"{report['inserted']} new, {report['updated']} updated, {report['unchanged']} unchanged, "
+          f"{report['error_count']} rejected")
+    for error in report["errors"]:
+        print(f"   row {error['row']}{' (' + error['id'] + ')' if error['id'] else ''}: {error['error']}")
+    if report["errors_truncated"]:
+        print(f"   ... and {report['error_count'] - len(report['errors'])} more")
+    return 1 if report["error_count"] else 0
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--url", default=os.environ.get("IMPORT_API_URL", "http://localhost:8001"))
+    parser.add_argument("--dry-run", action="store_true", help="validate and count, write nothing")
+    parser.add_argument("--template", type=int, metavar="SET_NUMBER", help="print a blank CSV for one set")
+    args = parser.parse_args()
+
+    if args.template is not None:
+        write_template(args.template, sys.stdout)
+        return 0
+    if not args.files:
+        parser.error("no files given")
+
+    status = 0
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=300.0)) as client:
+        for path in args.files:
+            status |= await upload(client, args.url.rstrip("/"), path, args.dry_run)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
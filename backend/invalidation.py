@@ -0,0 +1,225 @@
+"""
+Cross-worker cache invalidation
+
+Each worker process keeps its own question bank, entitlement cache and
+encoded catalog bodies. When one worker changes the data behind them, it
+drops its own copy and publishes a small message (topic + payload). The
+other workers receive it and drop theirs. Messages say "this is stale",
+never carry the new data, so a lost message costs at most one cache TTL
+of staleness, and handlers are safe to run twice.
+
+Transports (INVALIDATION_BUS):
+
+    changestream  publish inserts into the invalidations collection; every
+                  worker, on any host, tails it with a change stream.
+                  Needs a replica set.
+    unix          every worker binds a datagram socket in
+                  INVALIDATION_SOCKET_DIR and publish sends to all the
+                  others. No broker and no replica set, but one host only.
+    none          single worker; publish does nothing
+    auto          (default) changestream on a replica set, otherwise unix
+
+If a change stream breaks and cannot resume where it left off, messages
+may have been missed, so every topic's handler is called once with an
+empty payload, meaning "drop everything".
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+MAX_MESSAGE = 64 * 1024
+
+
+class InvalidationBus:
+    def __init__(self, mode: str = "auto", collection=None, socket_dir: Optional[str] = None):
+        self.mode = mode
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.transport = "none"
+        self._collection = collection
+        self._socket_dir = socket_dir
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._sock: Optional[socket.socket] = None
+        self._sock_path: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatching: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, db) -> "InvalidationBus":
+        socket_dir = os.environ.get('INVALIDATION_SOCKET_DIR') or os.path.join(
+            tempfile.gettempdir(), f"invalidation-{db.name}")
+        return cls(os.environ.get('INVALIDATION_BUS', 'auto'), db.invalidations, socket_dir)
+
+    @classmethod
+    async def publish_once(cls, db, topic: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        """Publish from a short-lived process, e.g. a script that writes to Mongo directly."""
+        bus = cls.from_env(db)
+        await bus.start()
+        try:
+            await bus.publish(topic, payload)
+        finally:
+            await bus.close()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        message = {"topic": topic, "payload": payload or {}, "origin": self.origin}
+        try:
+            if self.transport == "changestream":
+                await self._collection.insert_one({**message, "at": datetime.now(timezone.utc)})
+            elif self.transport == "unix":
+                await self._send_unix(message)
+        except Exception as e:
+            # The change is already saved; peers catch up when their caches expire
+            logger.warning("Invalidation publish failed (%s): %s", topic, e)
+
+    async def _dispatch(self, message: Dict[str, Any]) -> None:
+        if message.get("origin") == self.origin:
+            return
+        for handler in self._handlers.get(message.get("topic"), ()):
+            try:
+                await handler(message.get("payload") or {})
+            except Exception as e:
+                logger.warning("Invalidation handler for %s failed: %s", message.get("topic"), e)
+
+    async def _drop_everything(self) -> None:
+        for topic in self._handlers:
+            await self._dispatch({"topic": topic, "payload": {}, "origin": None})
+
+    # ---- startup / shutdown ----
+
+    async def start(self) -> None:
+        mode = self.mode
+        if mode == "auto":
+            mode = "changestream" if await self._replica_set() else "unix"
+        if mode == "changestream":
+            await self._start_change_stream()
+        elif mode == "unix":
+            self._start_unix()
+        self.transport = mode
+        logger.info("Invalidation bus: %s", mode)
+
+    async def _replica_set(self) -> bool:
+        try:
+            hello = await self._collection.database.command("hello")
+        except Exception:
+            return False
+        return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self._sock_path)
+            except OSError:
+                pass
+        self.transport = "none"
+
+    # ---- change stream ----
+
+    async def _start_change_stream(self) -> None:
+        # Open the stream before startup finishes, so nothing published after it is missed
+        stream = await self._open_stream(None)
+        self._task = asyncio.create_task(self._tail(stream))
+
+    async def _open_stream(self, resume_token):
+        stream = self._collection.watch([{"$match": {"operationType": "insert"}}],
+                                        resume_after=resume_token, max_await_time_ms=1000)
+        # The cursor is only created on the first fetch; this fails if the resume point is gone
+        change = await stream.try_next()
+        if change is not None:
+            await self._dispatch(change["fullDocument"])
+        return stream
+
+    async def _tail(self, stream) -> None:
+        while True:
+            try:
+                async for change in stream:
+                    await self._dispatch(change["fullDocument"])
+            except asyncio.CancelledError:
+                await stream.close()
+                raise
+            except Exception as e:
+                logger.warning("Invalidation change stream failed: %s", e)
+            resume_token = stream.resume_token
+            await stream.close()
+            stream = None
+            while stream is None:
+                await asyncio.sleep(1)
+                try:
+                    stream = await self._open_stream(resume_token)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Invalidation change stream reopen failed: %s", e)
+                    if resume_token is not None:
+                        # Whatever was published in the gap is lost; start over and drop everything
+                        resume_token = None
+                        await self._drop_everything()
+
+    # ---- unix datagram sockets ----
+
+    def _start_unix(self) -> None:
+        os.makedirs(self._socket_dir, exist_ok=True)
+        self._sock_path = os.path.join(self._socket_dir, f"{os.getpid()}-{uuid.uuid4().hex[:6]}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.bind(self._sock_path)
+        self._sock = sock
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(MAX_MESSAGE)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            task = asyncio.create_task(self._dispatch(message))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _send_unix(self, message: Dict[str, Any]) -> None:
+        data = json.dumps(message, default=str).encode()
+        for path in glob.glob(os.path.join(self._socket_dir, "*.sock")):
+            if path == self._sock_path:
+                continue
+            for attempt in range(3):
+                try:
+                    self._sock.sendto(data, path)
+                    break
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a worker that died without cleaning up
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.01 * (attempt + 1))  # peer's queue is full
+            else:
+                logger.warning("Invalidation to %s dropped: peer not reading", path)
@@ -0,0 +1,231 @@
+"""
+Rank and percentile for submitted tests
+
+Each (test_type, set_number) board is a histogram of scores in
+hundredth-of-a-mark buckets. Question marks are set per question by the
+admin import (1 for Tamil, 1.5 or 2 elsewhere, but any positive value is
+accepted), so scores are binned finely enough that marks with up to two
+decimals never share a bucket with a different score. The bucket counts
+sit in a Fenwick tree, so recording a score and asking how many attempts
+scored above it are both O(log buckets). A 200-mark paper has 20,001
+buckets, which makes both operations about fifteen steps whether there
+are 100 attempts or 10 million. Nothing is sorted, and /test/submit never
+queries test_attempts.
+
+Boards are seeded at startup with one aggregation that groups
+test_attempts by board and score. Each submit is then recorded in memory.
+Attempts submitted through other workers are picked up by a reload every
+refresh_interval seconds. The reload reads from a secondary, and this
+process's own attempts may still be in the write-behind spool, so it only
+takes attempts submitted more than `settle` seconds ago from Mongo and
+re-adds this process's later submits on top. Nothing recorded here is
+dropped, and nothing is counted twice.
+
+rank is 1 + the number of attempts that scored strictly higher, so tied
+scores share a rank. percentile is the share of attempts at or below the
+score.
+
+Submits name their own test type and set, so boards are only kept for the
+pairs accept() allows; any other attempt is stored but not ranked (rank,
+out_of and percentile are None). Otherwise every made-up set number would
+add a board that is never freed.
+"""
+
+import asyncio
+import logging
+import math
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION = 100  # buckets per mark
+
+BoardKey = Tuple[str, Optional[int]]
+
+
+def _bucket(score: float) -> int:
+    return max(0, int(round(score * RESOLUTION)))
+
+
+class ScoreHistogram:
+    __slots__ = ("_counts", "_tree", "count")
+
+    def __init__(self, capacity: int = 1024):
+        self._counts: List[int] = [0] * capacity
+        self._tree: List[int] = [0] * (capacity + 1)  # 1-based Fenwick tree over _counts
+        self.count = 0
+
+    def _grow(self, bucket: int) -> None:
+        capacity = len(self._counts)
+        while capacity <= bucket:
+            capacity *= 2
+        self._counts.extend([0] * (capacity - len(self._counts)))
+        # Rebuild the tree in O(capacity)
+        tree = [0] + self._counts
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def add(self, score: float, n: int = 1) -> None:
+        bucket = _bucket(score)
+        if bucket >= len(self._counts):
+            self._grow(bucket)
+        self._counts[bucket] += n
+        self.count += n
+        i = bucket + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += n
+            i += i & -i
+
+    def at_or_below(self, score: float) -> int:
+        i = min(_bucket(score) + 1, len(self._counts))
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def rank(self, score: float) -> int:
+        return self.count - self.at_or_below(score) + 1
+
+    def percentile(self, score: float) -> Optional[float]:
+        if not self.count:
+            return None
+        return round(self.at_or_below(score) / self.count * 100, 2)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Lowest score with at least q of the attempts at or below it."""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(q * self.count))
+        # Fenwick descent: find the largest prefix whose sum is below target
+        position, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        remaining = target
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] < remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return position / RESOLUTION
+
+    def distribution(self) -> List[Dict[str, Any]]:
+        return [{"score": bucket / RESOLUTION, "count": n} for bucket, n in enumerate(self._counts) if n]
+
+
+class Leaderboard:
+    def __init__(self, collection, refresh_interval: float = 300.0, settle: float = 120.0):
+        self._collection = collection
+        self.refresh_interval = refresh_interval
+        self.settle = settle  # seconds for an attempt to be flushed and replicated to the secondary
+        self._boards: Dict[BoardKey, ScoreHistogram] = {}
+        self._recent: Deque[Tuple[str, BoardKey, float]] = deque()  # (submitted_at, board, score) recorded here
+        # Which (test_type, set_number) pairs get a board; every other attempt goes unranked
+        self.accept: Callable[[str, Optional[int]], bool] = lambda test_type, set_number: True
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self) -> int:
+        # Mongo up to the cutoff, this process's own submits after it
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.settle)).isoformat()
+        pipeline = [
+            # Missing submitted_at counts as old; $not keeps those rows
+            {"$match": {"submitted_at": {"$not": {"$gt": cutoff}}}},
+            # Sorted and projected on the type_set_score_submitted index, so the scan never touches documents
+            {"$sort": {"test_type": 1, "set_number": 1, "score": 1}},
+            {"$project": {"_id": 0, "test_type": 1, "set_number": 1, "score": 1}},
+            {"$group": {
+                "_id": {"test_type": "$test_type", "set_number": "$set_number", "score": "$score"},
+                "count": {"$sum": 1},
+            }},
+        ]
+        boards: Dict[BoardKey, ScoreHistogram] = {}
+        total = 0
+        async for row in self._collection.aggregate(pipeline):
+            key = row["_id"]
+            score = key.get("score")
+            if score is None or key.get("test_type") is None:
+                continue
+            if not self.accept(key["test_type"], key.get("set_number")):
+                continue
+            board = boards.setdefault((key["test_type"], key.get("set_number")), ScoreHistogram())
+            board.add(score, row["count"])
+            total += row["count"]
+        # Includes anything recorded while the aggregation ran
+        while self._recent and self._recent[0][0] <= cutoff:
+            self._recent.popleft()
+        for _, key, score in self._recent:
+            board = boards.get(key)
+            if board is None:
+                board = boards[key] = ScoreHistogram()
+            board.add(score)
+        self._boards = boards
+        return total
+
+    async def start(self) -> None:
+        try:
+            await self.load()
+        except Exception as e:
+            # Ranks start from this process's submits; the next refresh fills in the rest
+            logger.warning("Leaderboard load failed: %s", e)
+        if self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning("Leaderboard refresh failed: %s", e)
+
+    def record(self, test_type: str, set_number: Optional[int], score: float,
+               submitted_at: Optional[str] = None) -> Dict[str, Any]:
+        """submitted_at: the attempt's stored isoformat timestamp, so a reload can tell whether Mongo has it."""
+        if not self.accept(test_type, set_number):
+            return {"rank": None, "out_of": None, "percentile": None}
+        key = (test_type, set_number)
+        board = self._boards.get(key)
+        if board is None:
+            board = self._boards[key] = ScoreHistogram()
+        board.add(score)
+        now = datetime.now(timezone.utc)
+        self._recent.append((submitted_at or now.isoformat(), key, score))
+        # No later reload's cutoff can be earlier than this
+        horizon = (now - timedelta(seconds=self.settle)).isoformat()
+        while self._recent[0][0] <= horizon:
+            self._recent.popleft()
+        return {
+            "rank": board.rank(score),
+            "out_of": board.count,
+            "percentile": board.percentile(score),
+        }
+
+    def board(self, test_type: str, set_number: Optional[int]) -> Optional[ScoreHistogram]:
+        return self._boards.get((test_type, set_number))
+
+    def summary(self, test_type: str, set_number: Optional[int]) -> Dict[str, Any]:
+        board = self.board(test_type, set_number) or ScoreHistogram(capacity=1)
+        return {
+            "test_type": test_type,
+            "set_number": set_number,
+            "attempts": board.count,
+            "median": board.quantile(0.5),
+            "p90": board.quantile(0.9),
+            "top_score": board.quantile(1.0),
+            "distribution": board.distribution(),
+        }
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
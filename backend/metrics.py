@@ -0,0 +1,269 @@
+"""
+Process metrics in the Prometheus text format
+
+Collected per worker process and rendered on GET /metrics:
+
+    http_requests_total{method,route,status}       counter
+    http_request_duration_seconds{method,route}    histogram
+    mongodb_commands_total{command,outcome}        counter (one per round trip)
+    mongodb_command_duration_seconds{command}      histogram
+    event_loop_lag_seconds                         histogram
+    plus gauges read at scrape time (bcrypt queue depth, pending writes, ...)
+
+Routes are labelled by their path template ("/api/users/{user_id}/attempts"),
+so the label set stays small however many users there are. Recording a
+request costs two clock reads, one bisect and a couple of dict lookups.
+There is no per-request allocation beyond the label tuple, so this stays on
+in production.
+
+MetricsMiddleware is plain ASGI rather than BaseHTTPMiddleware, so
+streaming responses (exports, file downloads) pass through untouched. The
+Mongo listener runs on Motor's executor threads and takes a lock; the
+other metrics are only touched from the event loop.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in sorted(self.children.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(round(child.sum, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+class CounterFamily(_Family):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, values: Tuple[str, ...], amount: float = 1) -> None:
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+            for values, value in sorted(self.values.items())
+        ]
+
+
+class CallbackFamily(_Family):
+    """Read at scrape time from a callback, so nothing is updated on the hot path.
+
+    Usually a gauge; kind="counter" exposes a running total some other
+    object already keeps (e.g. cache hits).
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], GaugeValue], labelnames: Tuple[str, ...] = (),
+                 kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning("Gauge %s failed: %s", self.name, e)
+            return []
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(v)}" for values, v in sorted(samples)
+        ]
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics: "Metrics"):
+        self._metrics = metrics
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._metrics.observe_mongo(event.command_name, "ok", event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        self._metrics.observe_mongo(event.command_name, "error", event.duration_micros / 1e6)
+
+
+class Metrics:
+    def __init__(self, lag_interval: float = 0.5):
+        self.lag_interval = lag_interval
+        self.requests = CounterFamily("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+        self.request_duration = HistogramFamily(
+            "http_request_duration_seconds", "Time from request start to response end", ("method", "route"))
+        self.mongo_commands = CounterFamily(
+            "mongodb_commands_total", "MongoDB commands (round trips) sent", ("command", "outcome"))
+        self.mongo_duration = HistogramFamily(
+            "mongodb_command_duration_seconds", "MongoDB command round-trip time", ("command",), MONGO_BUCKETS)
+        self.loop_lag = HistogramFamily(
+            "event_loop_lag_seconds", "How late a timer scheduled on the event loop fired", (), LAG_BUCKETS)
+        self.gauges: List[CallbackFamily] = []
+        self._mongo_lock = threading.Lock()
+        self._lag_task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    def gauge(self, name: str, help: str, read: Callable[[], GaugeValue], labelnames: Iterable[str] = (),
+              kind: str = "gauge") -> None:
+        self.gauges.append(CallbackFamily(name, help, read, tuple(labelnames), kind))
+
+    def mongo_listener(self) -> MongoCommandListener:
+        return MongoCommandListener(self)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.requests.inc((method, route, str(status)))
+        self.request_duration.labels(method, route).observe(seconds)
+
+    def observe_mongo(self, command: str, outcome: str, seconds: float) -> None:
+        with self._mongo_lock:
+            self.mongo_commands.inc((command, outcome))
+            self.mongo_duration.labels(command).observe(seconds)
+
+    async def _watch_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        lag = self.loop_lag.labels()
+        while True:
+            scheduled = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag.observe(max(0.0, loop.time() - scheduled))
+
+    def start(self) -> None:
+        if self._lag_task is None and self.lag_interval > 0:
+            self._lag_task = asyncio.create_task(self._watch_loop_lag())
+
+    async def close(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        with self._mongo_lock:
+            mongo = self.mongo_commands.render() + self.mongo_duration.render()
+        for family in (self.requests, self.request_duration, self.loop_lag):
+            lines += family.render()
+        lines += mongo
+        for gauge in self.gauges:
+            lines += gauge.render()
+        lines += ["# HELP process_start_time_seconds Start time of the process since the epoch",
+                  "# TYPE process_start_time_seconds gauge",
+                  f"process_start_time_seconds {_number(round(self.started_at, 3))}"]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500  # if the app raises before starting a response
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router records the matched route in the shared scope
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", None) or "unmatched",
+                status,
+                time.perf_counter() - start,
+            )
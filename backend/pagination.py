@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination
+
+Pages are read with a sort on unique keys and a filter that resumes right
+after the last document of the previous page, so every page costs one
+bounded index scan no matter how deep the client pages. The cursor handed
+to the client is the sort-key values of that last document, base64-encoded.
+
+Documents whose sort field is null or missing are included: Mongo sorts
+them before every value ascending and after every value descending, and
+keyset_filter() follows that order.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING
+
+Sort = Sequence[Tuple[str, int]]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: Dict[str, Any], sort: Sort) -> str:
+    values = [doc.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: Sort) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def keyset_filter(sort: Sort, values: List[Any]) -> Dict[str, Any]:
+    """Filter matching documents that sort strictly after `values`."""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        value = values[i]
+        if value is None:
+            # Nulls sort first: everything non-null comes after, nothing comes before
+            if direction != ASCENDING:
+                continue
+            after = {"$ne": None}
+        else:
+            after = {"$gt" if direction == ASCENDING else "$lt": value}
+        prefix = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        branches.append({**prefix, field: after})
+        if value is not None and direction != ASCENDING:
+            # Descending, nulls and missing fields come after every value; $lt alone skips them
+            branches.append({**prefix, field: None})
+    if not branches:
+        # Cursor already points past the last possible document
+        return {"_id": {"$exists": False}}
+    return {"$or": branches}
+
+
+def build_projection(fields: Optional[str], default: Dict[str, int], sort: Sort,
+                     hidden: Sequence[str] = ()) -> Dict[str, int]:
+    """Projection for a comma-separated `fields` parameter, or `default` when omitted.
+
+    Sort keys are always returned since the next cursor is built from them.
+    """
+    if not fields:
+        projection = dict(default)
+        for field in hidden:
+            projection[field] = 0
+        return projection
+
+    projection = {"_id": 0}
+    for field in fields.split(","):
+        field = field.strip()
+        if field and field != "_id" and field not in hidden:
+            projection[field] = 1
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
+
+
+async def fetch_page(collection, query: Dict[str, Any], sort: Sort, limit: int,
+                     cursor: Optional[str] = None,
+                     projection: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return (documents, next_cursor); next_cursor is None on the last page."""
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor, sort))
+        query = {"$and": [query, after]} if query else after
+
+    docs = await collection.find(query, projection).sort(list(sort)).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    return docs, next_cursor
@@ -0,0 +1,178 @@
+"""
+Razorpay gateway adapter
+
+One RazorpayGateway per process talks to the Razorpay REST API over a
+pooled keep-alive httpx.AsyncClient, so creating an order is a single
+awaited request on an already-open connection instead of a new SDK client
+and a blocking TLS handshake inside the event loop.
+
+Calls have a hard timeout and are retried with exponential backoff on
+transport errors, 429 and 5xx. POST /orders is not idempotent, so it is
+only retried when the gateway cannot have acted on it: the connection was
+never made, or it answered 429 or 503. A read timeout or a 500 after the
+request was sent may already have created the order.
+
+A circuit breaker stops calling the gateway after repeated failures and
+fails fast with GatewayUnavailable until the reset timeout passes, when a
+single trial call decides whether to close it.
+
+RAZORPAY_API_URL points the adapter at another base URL, e.g. the local
+stub in stub_gateway.py for offline latency and failure testing.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+DEFAULT_API_URL = "https://api.razorpay.com/v1"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Failures that mean the request was never processed, so even a POST can be resent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+UNPROCESSED_STATUSES = {429, 503}
+
+
+class GatewayError(Exception):
+    """The gateway rejected the request (4xx); retrying will not help."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class GatewayUnavailable(Exception):
+    """The gateway could not be reached, kept failing, or the circuit is open."""
+
+    def __init__(self, detail: str, retry_after: float = 1.0):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial):
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise GatewayUnavailable("Payment gateway circuit is open", retry_after=max(1.0, remaining))
+        if state == "half-open":
+            # Let exactly one call through to probe the gateway
+            self._trial = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def release_trial(self) -> None:
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RazorpayGateway:
+    def __init__(self, key_id: Optional[str], key_secret: Optional[str], api_url: str = DEFAULT_API_URL,
+                 timeout: float = 5.0, retries: int = 2, backoff: float = 0.2,
+                 breaker: Optional[CircuitBreaker] = None, max_connections: int = 20):
+        self.key_id = key_id
+        self.api_url = api_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._client = httpx.AsyncClient(
+            base_url=self.api_url,
+            auth=(key_id or "", key_secret or ""),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 3.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60.0),
+        )
+
+    @classmethod
+    def from_env(cls) -> "RazorpayGateway":
+        return cls(
+            key_id=os.environ.get('RAZORPAY_KEY_ID'),
+            key_secret=os.environ.get('RAZORPAY_KEY_SECRET'),
+            api_url=os.environ.get('RAZORPAY_API_URL', DEFAULT_API_URL),
+            timeout=float(os.environ.get('RAZORPAY_TIMEOUT', 5)),
+            retries=int(os.environ.get('RAZORPAY_RETRIES', 2)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get('RAZORPAY_BREAKER_THRESHOLD', 5)),
+                reset_timeout=float(os.environ.get('RAZORPAY_BREAKER_RESET', 30)),
+            ),
+        )
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("POST", "/orders", json=data)
+
+    async def fetch_order(self, order_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        self.breaker.before_call()
+        try:
+            return await self._attempt(method, path, **kwargs)
+        except asyncio.CancelledError:
+            # A cancelled half-open trial must not leave the circuit stuck
+            self.breaker.release_trial()
+            raise
+
+    async def _attempt(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        last_error = "no attempt made"
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Exponential backoff with jitter so retries from many requests don't line up
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                if idempotent or isinstance(e, UNSENT_ERRORS):
+                    continue
+                break
+            if response.status_code in RETRY_STATUSES:
+                last_error = f"HTTP {response.status_code}"
+                if idempotent or response.status_code in UNPROCESSED_STATUSES:
+                    continue
+                break
+            # The gateway answered, so it is healthy even if it said no
+            self.breaker.record_success()
+            if response.status_code >= 400:
+                raise GatewayError(response.status_code, _error_description(response))
+            return response.json()
+
+        self.breaker.record_failure()
+        raise GatewayUnavailable(f"Payment gateway failed after {attempt + 1} attempt(s): {last_error}")
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def _error_description(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["description"]
+    except (ValueError, KeyError, TypeError):
+        return response.text[:200]
@@ -0,0 +1,182 @@
+"""
+Purchases ledger
+
+purchased_sets holds exactly one document per Razorpay order, enforced by a
+unique index on order_id. Every write goes through an upsert keyed on
+order_id, so client retries, double-clicks and replayed gateway events
+record a purchase once, and a verify racing a webhook for the same order
+cannot create a second row.
+
+reconcile() ingests a batch of Razorpay webhook events (payment.captured,
+order.paid, refund.processed). Events are folded per order first, then
+written with a single unordered bulk_write. A refund always wins over a
+capture for the same order, whatever order the events arrive in.
+
+dedupe_orders() is the one-off cleanup for rows recorded before the
+unique index existed; db_indexes.py runs it when the index build fails.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+GRANT_EVENTS = {"payment.captured", "order.paid"}
+REVOKE_EVENTS = {"refund.processed"}
+DUPLICATE_KEY = 11000
+
+
+def purchase_doc(user_id: str, set_number: int, order_id: str, payment_id: str,
+                 amount: float = 100, source: str = "verify") -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "set_number": set_number,
+        "payment_id": payment_id,
+        "order_id": order_id,
+        "amount": amount,
+        "purchased_at": datetime.now(timezone.utc).isoformat(),
+        "is_active": True,
+        "source": source
+    }
+
+
+async def record_purchase(collection, doc: Dict[str, Any]) -> bool:
+    """Insert the purchase unless its order is already recorded; True if this call inserted it."""
+    try:
+        result = await collection.update_one({"order_id": doc["order_id"]}, {"$setOnInsert": doc}, upsert=True)
+    except DuplicateKeyError:
+        # Two upserts for the same order raced; the other one inserted it
+        return False
+    return result.upserted_id is not None
+
+
+class ReconcileResult:
+    def __init__(self):
+        self.received = 0
+        self.granted = 0
+        self.already_recorded = 0
+        self.revoked = 0
+        self.skipped: List[Dict[str, Any]] = []
+        self.user_ids = set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "granted": self.granted,
+            "already_recorded": self.already_recorded,
+            "revoked": self.revoked,
+            "skipped": self.skipped
+        }
+
+
+def _entity(event: Dict[str, Any], name: str) -> Dict[str, Any]:
+    return ((event.get("payload") or {}).get(name) or {}).get("entity") or {}
+
+
+def _set_number(notes: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(notes["set_number"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def reconcile(collection, events: Iterable[Dict[str, Any]]) -> ReconcileResult:
+    result = ReconcileResult()
+    grants: Dict[str, Dict[str, Any]] = {}
+    revokes: Dict[str, str] = {}
+
+    for event in events:
+        result.received += 1
+        kind = event.get("event")
+        payment = _entity(event, "payment")
+        order_id = payment.get("order_id") or _entity(event, "order").get("id")
+        if kind not in GRANT_EVENTS and kind not in REVOKE_EVENTS:
+            result.skipped.append({"event": kind, "order_id": order_id, "reason": "unhandled event"})
+            continue
+        if not order_id:
+            result.skipped.append({"event": kind, "order_id": None, "reason": "no order id"})
+            continue
+
+        notes = payment.get("notes") or _entity(event, "order").get("notes") or {}
+        if notes.get("user_id"):
+            result.user_ids.add(notes["user_id"])
+
+        if kind in REVOKE_EVENTS:
+            if payment.get("amount_refunded", 0) < payment.get("amount", 0):
+                result.skipped.append({"event": kind, "order_id": order_id, "reason": "partial refund"})
+                continue
+            revokes[order_id] = _entity(event, "refund").get("id") or payment.get("id")
+            continue
+
+        set_number = _set_number(notes)
+        if not notes.get("user_id") or set_number is None:
+            result.skipped.append({"event": kind, "order_id": order_id, "reason": "missing user_id/set_number notes"})
+            continue
+        amount = payment.get("amount") or _entity(event, "order").get("amount_paid") or 10000
+        grants.setdefault(order_id, purchase_doc(
+            notes["user_id"], set_number, order_id, payment.get("id"), amount / 100, source="reconcile"
+        ))
+
+    now = datetime.now(timezone.utc).isoformat()
+    revoked = {order_id: {"is_active": False, "refund_id": refund_id, "refunded_at": now}
+               for order_id, refund_id in revokes.items()}
+    # An order captured and refunded in the same batch is inserted already inactive,
+    # so the operations below give the same result in any execution order
+    for order_id, doc in grants.items():
+        if order_id in revoked:
+            doc.update(revoked[order_id])
+
+    operations = [
+        UpdateOne({"order_id": order_id}, {"$setOnInsert": doc}, upsert=True)
+        for order_id, doc in grants.items()
+    ] + [
+        UpdateOne({"order_id": order_id, "is_active": True}, {"$set": fields})
+        for order_id, fields in revoked.items()
+    ]
+    if not operations:
+        return result
+
+    try:
+        write = await collection.bulk_write(operations, ordered=False)
+        details = write.bulk_api_result
+    except BulkWriteError as e:
+        # A concurrent verify inserted the same order between our upserts; that row stands
+        if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+            raise
+        details = e.details
+
+    order_ids = list(grants)
+    inserted = [order_ids[u["index"]] for u in details.get("upserted", [])]
+    result.granted = sum(1 for order_id in inserted if order_id not in revoked)
+    result.already_recorded = len(grants) - len(inserted)
+    # Revokes of existing rows, plus orders that were inserted already refunded
+    result.revoked = details.get("nModified", 0) + len(inserted) - result.granted
+    return result
+
+
+async def dedupe_orders(collection) -> int:
+    """Keep one row per order_id so order_unique can be built; returns the number of rows removed."""
+    # Rows without an order id would all collide on null; give each one its own
+    async for doc in collection.find({"order_id": None}, {"_id": 1, "id": 1}):
+        await collection.update_one({"_id": doc["_id"]},
+                                    {"$set": {"order_id": f"legacy:{doc.get('id') or doc['_id']}"}})
+
+    groups = collection.aggregate([
+        {"$group": {
+            "_id": "$order_id",
+            "rows": {"$push": {"_id": "$_id", "is_active": "$is_active", "purchased_at": "$purchased_at"}},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    removed = 0
+    async for group in groups:
+        # A refund wins, as in reconcile(); otherwise the first purchase stands
+        rows = sorted(group["rows"], key=lambda r: (r.get("is_active") is not False,
+                                                    str(r.get("purchased_at") or ""), str(r["_id"])))
+        result = await collection.delete_many({"_id": {"$in": [r["_id"] for r in rows[1:]]}})
+        removed += result.deleted_count
+    return removed
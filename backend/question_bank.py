@@ -0,0 +1,145 @@
+"""
+In-memory question bank
+
+Keeps a snapshot of the questions collection grouped by subject and set
+number, with correct answers already stripped and every question
+pre-serialized to JSON. The student-facing question routes read from the
+snapshot instead of scanning Mongo on every request. The snapshot also
+keeps the full documents (answers included) for server-side scoring.
+
+The snapshot is versioned: admin routes that write to the questions
+collection call invalidate(), and the next read reloads it with a single
+query. Writes that bypass the server (seed_questions.py, a manual fix in
+Mongo) or an invalidation message that never arrives are caught by
+max_age: an older snapshot is re-read, and kept (memos and all) if the
+questions have not changed.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fast_json import dumps
+
+# Fields that must never reach a student before submission
+HIDDEN_FIELDS = ("correct_answer",)
+
+
+def dump_json(value: Any) -> bytes:
+    # Compact UTF-8 (Tamil text is not \uXXXX-escaped); orjson when available
+    return dumps(value)
+
+
+class QuestionGroup:
+    """Questions of one subject (optionally one set), ready to serve."""
+
+    __slots__ = ("questions", "fragments", "body")
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.questions = questions
+        self.fragments = [dump_json(q) for q in questions]
+        self.body = b"[" + b",".join(self.fragments) + b"]"
+
+
+EMPTY_GROUP = QuestionGroup([])
+
+
+class QuestionSnapshot:
+    """Immutable view of the question bank at one version."""
+
+    def __init__(self, version: int, questions: List[Dict[str, Any]]):
+        self.version = version
+        self.questions = questions  # full documents, never sent to students
+        self._groups: Dict[Tuple[str, Optional[int]], QuestionGroup] = {}
+        self._memo: Dict[Any, Any] = {}
+
+        grouped: Dict[Tuple[str, Optional[int]], List[Dict[str, Any]]] = {}
+        for full in questions:
+            q = {k: v for k, v in full.items() if k not in HIDDEN_FIELDS}
+            subject = q.get("subject")
+            # (subject, None) holds the subject across every set
+            grouped.setdefault((subject, None), []).append(q)
+            if q.get("set_number") is not None:
+                grouped.setdefault((subject, q["set_number"]), []).append(q)
+
+        for key, items in grouped.items():
+            self._groups[key] = QuestionGroup(items)
+        self.set_numbers = frozenset(n for _, n in self._groups if n is not None)
+
+    def group(self, subject: str, set_number: Optional[int] = None) -> QuestionGroup:
+        return self._groups.get((subject, set_number), EMPTY_GROUP)
+
+    def memo(self, key: Any, build: Callable[["QuestionSnapshot"], Any]) -> Any:
+        """Cache a value derived from this snapshot (e.g. a full response body)."""
+        if key not in self._memo:
+            self._memo[key] = build(self)
+        return self._memo[key]
+
+    async def memo_in_executor(self, key: Any, build: Callable[["QuestionSnapshot"], Any]) -> Any:
+        """memo() for builds too slow for the event loop: run in a thread, once however many callers wait."""
+        value = self._memo.get(key)
+        if value is None:
+            value = self._memo[key] = asyncio.get_running_loop().run_in_executor(None, build, self)
+        if not isinstance(value, asyncio.Future):
+            return value
+        try:
+            result = await asyncio.shield(value)
+        except Exception:
+            if self._memo.get(key) is value:
+                del self._memo[key]  # let the next caller try again
+            raise
+        self._memo[key] = result
+        return result
+
+
+class QuestionBank:
+    def __init__(self, collection, max_age: Optional[float] = None):
+        self._collection = collection
+        self.max_age = max_age
+        self.version = 0
+        self._snapshot: Optional[QuestionSnapshot] = None
+        self._expires = 0.0
+        self._loading: Optional[asyncio.Future] = None
+
+    def _fresh(self, snapshot: Optional[QuestionSnapshot]) -> bool:
+        return (snapshot is not None and snapshot.version == self.version
+                and (self.max_age is None or time.monotonic() < self._expires))
+
+    def current(self) -> Optional[QuestionSnapshot]:
+        """The loaded snapshot if it is up to date, without waiting for a reload."""
+        snapshot = self._snapshot
+        return snapshot if self._fresh(snapshot) else None
+
+    async def snapshot(self) -> QuestionSnapshot:
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+
+        # Concurrent misses share a single load instead of stampeding Mongo
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load(self.version))
+        loading = self._loading
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            if self._loading is loading and loading.done():
+                self._loading = None
+
+    async def _load(self, version: int) -> QuestionSnapshot:
+        started = time.monotonic()
+        questions = await self._collection.find({}, {"_id": 0}).to_list(None)
+        previous = self._snapshot
+        if previous is not None and previous.version == version and previous.questions == questions:
+            snapshot = previous  # only aged out; keep what was derived from it
+        else:
+            snapshot = QuestionSnapshot(version, questions)
+        # A write during the load makes this snapshot stale; serve it once but don't keep it
+        if version == self.version:
+            self._snapshot = snapshot
+            self._expires = started + (self.max_age or 0)
+        return snapshot
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._snapshot = None
+        self._loading = None
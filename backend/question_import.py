@@ -0,0 +1,282 @@
+"""
+Streaming question imports
+
+The counterpart of exports.py. An upload (NDJSON or CSV, optionally
+gzip-compressed) is decoded as its bytes arrive. Each row is validated
+against a pydantic model and written in ordered chunks of upserts keyed on
+id, so importing the same file twice changes nothing, and a corrected file
+replaces the rows it repeats. Memory is bounded by one chunk plus the set
+of ids already seen, never by the size of the upload.
+
+Rows without an id get the repo's usual <subject>_s<set>_<number> id. A
+row whose id already appeared earlier in the same upload is reported as
+a duplicate and skipped. Every rejected row is reported with its row
+number (the first MAX_ERRORS of them).
+
+CSV columns are the question fields plus one option_<label> column per
+option, in order:
+
+    set_number,subject,part,question_number,question_text,option_A,option_B,option_C,option_D,correct_answer,marks
+"""
+
+import codecs
+import csv
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+CHUNK_ROWS = 500
+MAX_ERRORS = 1000
+OPTION_PREFIX = "option_"
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "application/json"),
+    "csv": ("text/csv",),
+}
+
+# (row number, parsed row or None, parse error or None)
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def detect_format(content_type: str) -> Optional[str]:
+    media_type = content_type.split(";")[0].strip().lower()
+    for fmt, media_types in FORMATS.items():
+        if media_type in media_types:
+            return fmt
+    return None
+
+
+async def decompressed(stream: AsyncIterator[bytes], gzip: bool) -> AsyncIterator[bytes]:
+    if not gzip:
+        async for chunk in stream:
+            yield chunk
+        return
+    decompressor = zlib.decompressobj(wbits=47)  # gzip or zlib header
+    async for chunk in stream:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig drops the BOM spreadsheet apps put in front of CSV files
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def ndjson_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    row_number = 0
+    async for line in _lines(stream):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, row, None
+
+
+def _csv_question(header: List[str], values: List[str]) -> Dict[str, Any]:
+    row: Dict[str, Any] = {}
+    options = []
+    for column, value in zip(header, values):
+        value = value.strip()
+        if not value:
+            continue  # empty cells fall back to model defaults
+        if column.lower().startswith(OPTION_PREFIX):
+            options.append({"label": column[len(OPTION_PREFIX):].upper(), "text": value})
+        else:
+            row[column] = value
+    if options:
+        row["options"] = options
+    return row
+
+
+async def csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    header: Optional[List[str]] = None
+    row_number = 0
+    record = ""
+    async for line in _lines(stream):
+        record += line
+        if record.count('"') % 2:
+            continue  # inside a quoted field that spans lines
+        text, record = record, ""
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            row_number += 1
+            yield row_number, None, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, _csv_question(header, values), None
+    if record.strip():
+        row_number += 1
+        yield row_number, None, "Invalid CSV: unterminated quoted field"
+
+
+async def iter_rows(rows: List[Dict[str, Any]]) -> AsyncIterator[Row]:
+    # A JSON body that is already in memory, fed through the same pipeline
+    for row_number, row in enumerate(rows, start=1):
+        if isinstance(row, dict):
+            yield row_number, row, None
+        else:
+            yield row_number, None, "Expected a JSON object"
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def default_question_id(row: Dict[str, Any]) -> Optional[str]:
+    try:
+        return f"{row['subject']}_s{int(row.get('set_number', 1))}_{int(row['question_number'])}"
+    except (KeyError, TypeError, ValueError):
+        return None  # the model reports the missing/invalid field
+
+
+class ImportReport:
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.valid = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.error_count = 0
+        # Existing questions whose answer or options were replaced
+        self.rekeyed: List[str] = []
+
+    def error(self, row_number: int, question_id: Optional[str], message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"row": row_number, "id": question_id, "error": message})
+
+    @property
+    def changed(self) -> bool:
+        return not self.dry_run and bool(self.inserted or self.updated)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "valid": self.valid,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+
+async def _write_chunk(collection, chunk: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> None:
+    ids = [doc["id"] for _, doc in chunk]
+    existing = {
+        doc["id"]: doc
+        async for doc in collection.find({"id": {"$in": ids}}, {"_id": 0})
+    }
+
+    operations: List[Tuple[int, str, UpdateOne]] = []
+    for row_number, doc in chunk:
+        current = existing.get(doc["id"])
+        if current is not None and all(current.get(k) == v for k, v in doc.items()):
+            report.unchanged += 1
+            continue
+        if current is not None and (current.get("correct_answer") != doc["correct_answer"]
+                                    or current.get("options") != doc["options"]):
+            report.rekeyed.append(doc["id"])
+        operations.append((row_number, doc["id"], UpdateOne({"id": doc["id"]}, {"$set": doc}, upsert=True)))
+
+    if report.dry_run:
+        for _, question_id, _ in operations:
+            if question_id in existing:
+                report.updated += 1
+            else:
+                report.inserted += 1
+        return
+
+    # Ordered, so rows land in file order; on a failing row, record it and resume after it
+    while operations:
+        try:
+            result = await collection.bulk_write([op for _, _, op in operations], ordered=True)
+            report.inserted += result.upserted_count
+            report.updated += result.modified_count
+            return
+        except BulkWriteError as e:
+            details = e.details
+            report.inserted += details.get("nUpserted", 0)
+            report.updated += details.get("nModified", 0)
+            failed = details["writeErrors"][0]
+            row_number, question_id, _ = operations[failed["index"]]
+            report.error(row_number, question_id, failed.get("errmsg", "Write failed"))
+            operations = operations[failed["index"] + 1:]
+
+
+async def import_questions(collection, rows: AsyncIterator[Row], model: Type[BaseModel],
+                           chunk_size: int = CHUNK_ROWS, dry_run: bool = False) -> ImportReport:
+    report = ImportReport(dry_run=dry_run)
+    seen: Set[str] = set()
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+
+    async for row_number, row, parse_error in rows:
+        report.rows += 1
+        if parse_error is not None:
+            report.error(row_number, None, parse_error)
+            continue
+        if not row.get("id"):
+            question_id = default_question_id(row)
+            if question_id:
+                row["id"] = question_id
+        try:
+            doc = model(**row).model_dump()
+        except ValidationError as e:
+            report.error(row_number, row.get("id"), _validation_message(e))
+            continue
+        if doc["id"] in seen:
+            report.duplicates += 1
+            report.error(row_number, doc["id"], "Duplicate id in this upload")
+            continue
+        seen.add(doc["id"])
+        report.valid += 1
+
+        chunk.append((row_number, doc))
+        if len(chunk) >= chunk_size:
+            await _write_chunk(collection, chunk, report)
+            chunk = []
+
+    if chunk:
+        await _write_chunk(collection, chunk, report)
+    return report
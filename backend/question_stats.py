@@ -0,0 +1,115 @@
+"""
+Per-question item statistics
+
+question_stats holds one counter document per question:
+
+    answered        times the question was answered
+    correct         times the answer matched the key
+    picks.<label>   times each option was picked
+
+apply_answers() is a write-behind listener on test_attempts. For each
+batch of inserted attempts it tallies every answer in memory first, then
+sends one bulk_write with a single $inc upsert per distinct question. A
+batch of 500 full tests is about 130 updates, not 65,000, and
+/test/submit itself does no extra writes.
+
+Correctness is judged against the answer key current at flush time,
+which is milliseconds after submission. When an admin changes a
+question's answer or options, its counters are reset (see
+reset_question()), because older picks were made against different
+options.
+
+item_analysis() joins the counters with the question bank for the
+admin item-analysis endpoint.
+"""
+
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+# Option labels become field names; anything unusual is counted as "other"
+_SAFE_LABEL = re.compile(r"^[A-Za-z0-9_-]{1,16}$")
+
+
+async def apply_answers(collection, answer_key, attempts: Iterable[Dict[str, Any]]) -> int:
+    answered: Counter = Counter()
+    correct: Counter = Counter()
+    picks: Dict[str, Counter] = defaultdict(Counter)
+
+    position, key = answer_key.position, answer_key.key_labels
+    for attempt in attempts:
+        for answer in attempt.get("answers") or ():
+            question_id = answer.get("question_id")
+            pos = position.get(question_id)
+            if pos is None:
+                continue
+            label = answer.get("selected_answer")
+            answered[question_id] += 1
+            if label == key[pos]:
+                correct[question_id] += 1
+            picks[question_id][label if isinstance(label, str) and _SAFE_LABEL.match(label) else "other"] += 1
+
+    operations = []
+    for question_id, count in answered.items():
+        inc = {"answered": count, "correct": correct[question_id]}
+        for label, n in picks[question_id].items():
+            inc[f"picks.{label}"] = n
+        operations.append(UpdateOne({"question_id": question_id}, {"$inc": inc}, upsert=True))
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def reset_question(collection, question_id: str) -> None:
+    await collection.delete_one({"question_id": question_id})
+
+
+async def reset_questions(collection, question_ids: List[str]) -> None:
+    if question_ids:
+        await collection.delete_many({"question_id": {"$in": list(question_ids)}})
+
+
+def item_analysis(questions: List[Dict[str, Any]], stats: Dict[str, Dict[str, Any]],
+                  min_answered: int = 0, sort: str = "question_number") -> List[Dict[str, Any]]:
+    items = []
+    for q in questions:
+        s = stats.get(q["id"]) or {}
+        answered = s.get("answered", 0)
+        if answered < min_answered:
+            continue
+        correct = s.get("correct", 0)
+        picks = s.get("picks") or {}
+        labels = [o["label"] for o in q.get("options", [])]
+        distribution = {
+            label: {"count": picks.get(label, 0),
+                    "percentage": round(picks.get(label, 0) / answered * 100, 2) if answered else 0}
+            for label in labels + [label for label in picks if label not in labels]
+        }
+        wrong = [(d["count"], label) for label, d in distribution.items()
+                 if label != q.get("correct_answer") and d["count"]]
+        # The wrong option picked most often
+        top_distractor: Optional[str] = max(wrong)[1] if wrong else None
+        items.append({
+            "question_id": q["id"],
+            "question_number": q.get("question_number"),
+            "subject": q.get("subject"),
+            "part": q.get("part"),
+            "set_number": q.get("set_number"),
+            "question_text": q.get("question_text"),
+            "correct_answer": q.get("correct_answer"),
+            "answered": answered,
+            "correct": correct,
+            # Classical item difficulty: share answering correctly (lower is harder)
+            "p_value": round(correct / answered, 4) if answered else None,
+            "options": distribution,
+            "top_distractor": top_distractor,
+        })
+
+    if sort == "difficulty":
+        # Hardest first; questions nobody has answered go last
+        items.sort(key=lambda item: (item["p_value"] is None, item["p_value"] or 0))
+    else:
+        items.sort(key=lambda item: (item["subject"] or "", item["set_number"] or 0, item["question_number"] or 0))
+    return items
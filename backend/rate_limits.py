@@ -0,0 +1,253 @@
+"""
+Rate limiting and admission control
+
+RateLimiter throttles the routes one client can abuse: login and register
+(bcrypt), test submits and exam-session starts and submits (scoring, an
+attempt write, a session held in memory) and feedback (a Mongo insert).
+Each route has a budget per client IP and one per user: the user id, or
+the username/email the request names before anyone is logged in. Budgets
+are token buckets. A bucket holds up to `count` tokens and refills
+continuously at count/seconds, so no sliding window of `seconds` ever
+admits more than twice `count`, and there is no fixed-window reset for a
+client to burst across. Budgets come from RATE_LIMIT_<ROUTE>_<SCOPE>
+("count/seconds", or "off"), e.g.
+
+    RATE_LIMIT_LOGIN_IP=120/60      120 logins a minute from one address
+    RATE_LIMIT_LOGIN_USER=10/60     10 attempts a minute at one username
+
+IP budgets are generous on purpose: a school lab logging in at the start
+of an exam shares one NAT address.
+
+Buckets are kept in memory per worker by default (RATE_LIMIT_STORE=memory).
+RATE_LIMIT_STORE=mongo keeps them in the rate_limits collection instead,
+shared by every worker, at one round trip per throttled request, using
+an atomic pipeline update (MongoDB 4.2+). RATE_LIMIT_STORE=off disables
+limiting. If Mongo fails, the request is allowed: losing the limiter
+should not take logins down with it.
+
+Admission caps the requests in progress on a worker. Beyond
+max_in_flight, requests wait in a short FIFO queue; when the queue is
+full, or a request has waited queue_timeout, it is answered with a 429
+straight away. That keeps latency bounded for the requests that are
+admitted, instead of every request slowing down together.
+AdmissionMiddleware is pure ASGI, like MetricsMiddleware.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# route -> scope -> "count/seconds"
+DEFAULT_BUDGETS = {
+    "login": {"ip": "120/60", "user": "10/60"},
+    "register": {"ip": "60/60", "user": "5/60"},
+    "submit": {"ip": "300/60", "user": "10/60"},
+    "feedback": {"ip": "20/60", "user": "5/60"},
+}
+
+MAX_KEY_LENGTH = 200
+
+
+class Budget:
+    __slots__ = ("count", "seconds", "rate")
+
+    def __init__(self, count: int, seconds: float):
+        self.count = count
+        self.seconds = seconds
+        self.rate = count / seconds  # tokens per second
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Budget"]:
+        if value.strip().lower() in ("", "0", "off", "none"):
+            return None
+        count, _, seconds = value.partition("/")
+        return cls(int(count), float(seconds or 60))
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, key: str, budget: Budget) -> float:
+        now = time.monotonic()
+        entry = self._buckets.get(key)
+        tokens = float(budget.count) if entry is None else min(budget.count, entry[0] + (now - entry[1]) * budget.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / budget.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # Least recently used; a forgotten bucket starts full again
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class MongoBuckets:
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def take(self, key: str, budget: Budget) -> float:
+        # Wall clock: the buckets are shared by processes (and hosts) whose monotonic clocks differ
+        now = time.time()
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$at", now]}]}]}
+        refilled = {"$add": [{"$ifNull": ["$tokens", budget.count]}, {"$multiply": [elapsed, budget.rate]}]}
+        doc = await self._collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": {"$min": [budget.count, refilled]}}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "at": now,
+                    # A bucket left alone this long is full again, so the TTL index can drop it
+                    "expires": datetime.now(timezone.utc) + timedelta(seconds=budget.seconds),
+                }},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            projection={"_id": 0, "tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return 0.0 if doc["allowed"] else (1 - doc["tokens"]) / budget.rate
+
+
+class RateLimiter:
+    def __init__(self, budgets: Dict[str, Dict[str, Budget]], store=None):
+        self.budgets = budgets
+        self.store = store  # None: limiting disabled
+        self.limited: Dict[Tuple[str, str], int] = {}  # (route, scope) -> requests refused
+
+    @classmethod
+    def from_env(cls, collection, environ=os.environ) -> "RateLimiter":
+        budgets: Dict[str, Dict[str, Budget]] = {}
+        for route, scopes in DEFAULT_BUDGETS.items():
+            for scope, default in scopes.items():
+                budget = Budget.parse(environ.get(f"RATE_LIMIT_{route.upper()}_{scope.upper()}", default))
+                if budget is not None:
+                    budgets.setdefault(route, {})[scope] = budget
+        kind = environ.get("RATE_LIMIT_STORE", "memory").lower()
+        if kind == "off":
+            store = None
+        elif kind == "mongo":
+            store = MongoBuckets(collection)
+        else:
+            store = MemoryBuckets(int(environ.get("RATE_LIMIT_MAX_KEYS", 100000)))
+        return cls(budgets, store)
+
+    async def check(self, route: str, ip: Optional[str] = None, user: Optional[str] = None) -> float:
+        """Takes a token from each of the route's buckets; returns 0, or seconds to wait before retrying."""
+        if self.store is None:
+            return 0.0
+        for scope, value in (("ip", ip), ("user", user)):
+            budget = self.budgets.get(route, {}).get(scope)
+            if budget is None or not value:
+                continue
+            try:
+                wait = await self.store.take(f"{route}:{scope}:{str(value)[:MAX_KEY_LENGTH]}", budget)
+            except Exception as e:
+                logger.warning("Rate limit store failed, allowing request: %s", e)
+                return 0.0
+            if wait > 0:
+                key = (route, scope)
+                self.limited[key] = self.limited.get(key, 0) + 1
+                return wait
+        return 0.0
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str], trusted_hops: int = 0) -> Optional[str]:
+    """The caller's address. With trusted_hops proxies in front, X-Forwarded-For's entry that many from the end."""
+    if trusted_hops > 0 and forwarded_for:
+        hops = [part.strip() for part in forwarded_for.split(",") if part.strip()]
+        if hops:
+            return hops[max(0, len(hops) - trusted_hops)]
+    return peer
+
+
+class Admission:
+    def __init__(self, max_in_flight: int = 256, max_queue: int = 128, queue_timeout: float = 1.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @classmethod
+    def from_env(cls) -> "Admission":
+        return cls(
+            max_in_flight=int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 256)),
+            max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 128)),
+            queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', 1000)) / 1000,
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True  # release() handed over its slot
+        except asyncio.TimeoutError:
+            # release() may have handed us the slot just as the timeout fired; pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away; if a slot was handed over in the meantime, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot goes straight to the longest waiter
+                return
+        self.in_flight -= 1
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, admission: Admission, exempt: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.app = app
+        self.admission = admission
+        self.exempt = exempt  # called with the ASGI scope; True lets the request bypass admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.admission.max_in_flight <= 0 or (self.exempt and self.exempt(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.admission.acquire():
+            await send({"type": "http.response.start", "status": 429, "headers": [
+                (b"content-type", b"application/json"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body", "body": b'{"detail":"Server is busy, please try again"}'})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
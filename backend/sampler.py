@@ -0,0 +1,102 @@
+"""
+Sample-test pools
+
+A SamplePool is built once per question-bank version for one subject
+(optionally one set): a shuffled permutation of the group's question
+positions, plus one shuffled permutation per (part, marks) stratum. The
+shuffle is seeded from the group's sorted question ids, so every worker,
+restart and reload of an unchanged group builds the same permutation.
+
+draw() picks k questions in O(k): a start offset and a stride coprime to
+the pool size walk the permutation, which visits k distinct positions
+without copying or reshuffling the pool. The walk is driven by a
+random.Random, so a seed string (e.g. "<user_id>:<attempt>") reproduces
+the same paper on reload without storing it anywhere, as long as no
+question has been added to or removed from the group in between.
+
+With stratify=True the k questions are split across strata in proportion
+to their size (largest remainder), so a 10-question paper keeps the bank's
+mix of parts and mark values.
+
+mongo_sample() is the $sample fallback, used while the bank is reloading
+after an admin edit so sample requests don't wait for the full reload.
+"""
+
+import hashlib
+import math
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from question_bank import HIDDEN_FIELDS, QuestionGroup
+
+
+def seed_rng(seed: Optional[str]) -> random.Random:
+    if seed is None:
+        return random.Random()
+    # Stable across processes and restarts, unlike hash()
+    digest = hashlib.blake2b(seed.encode("utf-8"), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+
+def _walk(order: List[int], k: int, rng: random.Random) -> List[int]:
+    n = len(order)
+    k = min(k, n)
+    if k == 0:
+        return []
+    start = rng.randrange(n)
+    stride = rng.randrange(1, n) if n > 1 else 1
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return [order[(start + i * stride) % n] for i in range(k)]
+
+
+class SamplePool:
+    def __init__(self, group: QuestionGroup, shuffle_seed: Optional[str] = None):
+        self.group = group
+        # Start from id order: the bank's load order from Mongo is not guaranteed
+        self.order = sorted(range(len(group.questions)), key=lambda pos: str(group.questions[pos].get("id")))
+        if shuffle_seed is None:
+            shuffle_seed = "\n".join(str(group.questions[pos].get("id")) for pos in self.order)
+        seed_rng(shuffle_seed).shuffle(self.order)
+
+        strata: Dict[Tuple[Any, Any], List[int]] = {}
+        for pos in self.order:
+            q = group.questions[pos]
+            strata.setdefault((q.get("part"), q.get("marks")), []).append(pos)
+        # Sorted so the allocation (and therefore a seeded paper) is reproducible
+        self.strata = [strata[key] for key in sorted(strata, key=repr)]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def draw(self, k: int, seed: Optional[str] = None, stratify: bool = False) -> List[int]:
+        rng = seed_rng(seed)
+        if not stratify or len(self.strata) <= 1:
+            return _walk(self.order, k, rng)
+
+        k = min(k, len(self.order))
+        total = len(self.order)
+        quotas = [k * len(s) / total for s in self.strata]
+        counts = [int(q) for q in quotas]
+        # Hand the remaining slots to the strata with the largest remainders
+        by_remainder = sorted(range(len(quotas)), key=lambda i: quotas[i] - counts[i], reverse=True)
+        for i in by_remainder[:k - sum(counts)]:
+            counts[i] += 1
+
+        picked: List[int] = []
+        for stratum, count in zip(self.strata, counts):
+            picked.extend(_walk(stratum, count, rng))
+        rng.shuffle(picked)
+        return picked
+
+    def fragments(self, positions: List[int]) -> List[bytes]:
+        return [self.group.fragments[pos] for pos in positions]
+
+    def total_marks(self, positions: List[int]) -> float:
+        return sum(self.group.questions[pos].get("marks", 0) for pos in positions)
+
+
+async def mongo_sample(collection, query: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+    projection = {"_id": 0, **{field: 0 for field in HIDDEN_FIELDS}}
+    pipeline = [{"$match": query}, {"$sample": {"size": k}}, {"$project": projection}]
+    return await collection.aggregate(pipeline).to_list(k)
@@ -0,0 +1,201 @@
+"""
+Compiled scoring engine
+
+AnswerKey compiles the question bank once per bank version into flat
+columns indexed by question position: the answer key, marks, and a
+(subject, part) group code. Scoring then needs no question documents, and
+the per-subject and per-part subtotals come out of the same pass as the
+total.
+
+Two entry points share the compiled key:
+
+score()        one submission; a tight loop over the columns, since for
+               ~130 answers NumPy's per-call overhead outweighs the work
+score_batch()  many submissions; every answer is tagged with its submission
+               index and the whole batch is scored with one vectorized
+               comparison and four bincounts
+
+tests/bench_scoring.py compares both against the original per-answer loop.
+"""
+
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+NO_MATCH = -1  # selected label that is not an option of any question
+
+AnswerPairs = Iterable[Tuple[str, str]]  # (question_id, selected_answer)
+
+
+class ScoreResult:
+    __slots__ = ("score", "total_marks", "positions", "answers", "correct",
+                 "_groups", "_earned", "_offered", "_right", "_answered")
+
+    def __init__(self, score, total_marks, positions, answers, correct,
+                 groups, earned, offered, right, answered):
+        self.score = score
+        self.total_marks = total_marks
+        self.positions = positions  # question positions in the answer key (list or array)
+        self.answers = answers  # (question_id, selected_answer) pairs, aligned with positions
+        self.correct = correct
+        self._groups = groups
+        self._earned = earned
+        self._offered = offered
+        self._right = right
+        self._answered = answered
+
+    @property
+    def percentage(self) -> float:
+        return round((self.score / self.total_marks * 100), 2) if self.total_marks > 0 else 0
+
+    @property
+    def subjects(self) -> Dict[str, Dict[str, float]]:
+        return self._rollup(0)
+
+    @property
+    def parts(self) -> Dict[str, Dict[str, float]]:
+        return self._rollup(1)
+
+    def _rollup(self, index: int) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for g, group in enumerate(self._groups):
+            if not self._answered[g]:
+                continue
+            entry = totals.setdefault(group[index], {"score": 0.0, "total_marks": 0.0, "correct": 0, "answered": 0})
+            entry["score"] += self._earned[g]
+            entry["total_marks"] += self._offered[g]
+            entry["correct"] += int(self._right[g])
+            entry["answered"] += self._answered[g]
+        return totals
+
+
+class AnswerKey:
+    def __init__(self, questions: Sequence[Dict[str, Any]]):
+        self.ids = [q["id"] for q in questions]
+        self.position = {qid: i for i, qid in enumerate(self.ids)}
+
+        labels = sorted({o["label"] for q in questions for o in q.get("options", [])}
+                        | {q.get("correct_answer") for q in questions if q.get("correct_answer")})
+        self.label_count = max(1, len(labels))
+        label_codes = {label: code for code, label in enumerate(labels)}
+        # (question_id, label) -> position * label_count + label code, for batch encoding
+        self.pair_codes = {
+            (qid, label): pos * self.label_count + code
+            for pos, qid in enumerate(self.ids)
+            for label, code in label_codes.items()
+        }
+
+        # Each question belongs to one (subject, part) group; subtotals are kept per group
+        self.groups = sorted({(q.get("subject") or "", q.get("part") or "") for q in questions})
+        self.group_count = max(1, len(self.groups))
+        group_codes = {g: i for i, g in enumerate(self.groups)}
+
+        # Columns as plain lists for score() and as arrays for score_batch()
+        self.key_labels = [q.get("correct_answer") for q in questions]
+        self.marks_list = [float(q.get("marks", 0)) for q in questions]
+        self.group_list = [group_codes[(q.get("subject") or "", q.get("part") or "")] for q in questions]
+        self.key = np.array([label_codes.get(q.get("correct_answer"), NO_MATCH) for q in questions], dtype=np.int16)
+        self.marks = np.array(self.marks_list, dtype=np.float64)
+        self.group = np.array(self.group_list, dtype=np.int32)
+
+        # Static half of each detailed result, built once per compile
+        self.details = [{
+            "question_id": q["id"],
+            "question_number": q.get("question_number"),
+            "question_text": q.get("question_text"),
+            "correct_answer": q.get("correct_answer"),
+            "marks": q.get("marks", 0),
+            "options": q.get("options", [])
+        } for q in questions]
+
+    def score(self, answers: AnswerPairs) -> ScoreResult:
+        """Score one submission; answers for unknown questions are ignored."""
+        position, key, marks, group = self.position, self.key_labels, self.marks_list, self.group_list
+        width = self.group_count
+        earned, offered = [0.0] * width, [0.0] * width
+        right, answered = [0] * width, [0] * width
+        positions, scored, correct = [], [], []
+
+        for pair in answers:
+            question_id, label = pair
+            pos = position.get(question_id)
+            if pos is None:
+                continue
+            g = group[pos]
+            offered[g] += marks[pos]
+            answered[g] += 1
+            ok = label == key[pos]
+            if ok:
+                earned[g] += marks[pos]
+                right[g] += 1
+            positions.append(pos)
+            scored.append(pair)
+            correct.append(ok)
+
+        return ScoreResult(sum(earned), sum(offered), positions, scored, correct,
+                           self.groups, earned, offered, right, answered)
+
+    def score_batch(self, submissions: Sequence[AnswerPairs]) -> List[ScoreResult]:
+        """Score many submissions with one vectorized pass over all of their answers."""
+        batch = [a if isinstance(a, list) else list(a) for a in submissions]
+        count = len(batch)
+        if count == 0:
+            return []
+
+        flat = list(chain.from_iterable(batch))
+        combined = list(map(self.pair_codes.get, flat))
+        if None in combined:
+            # Unknown question or label somewhere: the exact per-submission path handles it
+            return [self.score(pairs) for pairs in batch]
+
+        combined = np.array(combined, dtype=np.int32)
+        positions = combined // self.label_count
+        codes = combined % self.label_count
+        owner = np.repeat(np.arange(count), [len(pairs) for pairs in batch])
+
+        slot = owner * self.group_count + self.group[positions]
+        correct = self.key[positions] == codes
+        marks = self.marks[positions]
+
+        # Four bincounts over (submission, subject/part group) give every subtotal
+        size = count * self.group_count
+        earned = np.bincount(slot, weights=marks * correct, minlength=size).reshape(count, -1)
+        offered = np.bincount(slot, weights=marks, minlength=size).reshape(count, -1)
+        right = np.bincount(slot, weights=correct, minlength=size).reshape(count, -1).tolist()
+        answered = np.bincount(slot, minlength=size).reshape(count, -1).tolist()
+        scores = earned.sum(axis=1).tolist()
+        totals = offered.sum(axis=1).tolist()
+        earned, offered = earned.tolist(), offered.tolist()
+
+        results = []
+        start = 0
+        for i, pairs in enumerate(batch):
+            end = start + len(pairs)
+            results.append(ScoreResult(
+                float(scores[i]), float(totals[i]), positions[start:end], pairs, correct[start:end],
+                self.groups, earned[i], offered[i], right[i], answered[i]
+            ))
+            start = end
+        return results
+
+    def detailed_results(self, result: ScoreResult) -> List[Dict[str, Any]]:
+        details = self.details
+        positions, correct = result.positions, result.correct
+        if isinstance(positions, np.ndarray):
+            # score_batch() hands out array views; plain ints/bools are faster to iterate
+            positions, correct = positions.tolist(), correct.tolist()
+        out = []
+        for pos, (_, sel), ok in zip(positions, result.answers, correct):
+            detail = details[pos]
+            out.append({
+                "question_id": detail["question_id"],
+                "question_number": detail["question_number"],
+                "question_text": detail["question_text"],
+                "selected_answer": sel,
+                "correct_answer": detail["correct_answer"],
+                "is_correct": ok,
+                "marks": detail["marks"],
+                "options": detail["options"]
+            })
+        return out
@@ -4,6 +4,8 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from invalidation import InvalidationBus
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -164,6 +166,11 @@ async def seed_data():
     if all_questions:
         await db.questions.insert_many(all_questions)
     
+    # Drop the admin dashboard summary; the server rebuilds it on next read
+    await db.question_sets.delete_one({"_id": "summary"})
+    # Running servers re-read their question bank now instead of when it ages out
+    await InvalidationBus.publish_once(db, "questions")
+    
     print(f"Seeded {len(tamil_questions)} Tamil questions")
     print(f"Seeded {len(physics_questions)} Physics questions")
     print(f"Total: {len(all_questions)} questions seeded successfully!")
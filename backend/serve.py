@@ -0,0 +1,57 @@
+"""
+Run the API with several worker processes
+
+Each worker is a separate process with its own event loop, Mongo pool
+and caches, so the app scales across cores. The workers keep their caches
+coherent through the invalidation bus (invalidation.py): an admin edit,
+a payment or a study-material change on one worker is dropped from the
+caches of all the others.
+
+Usage:
+    python serve.py --workers 4 --port 8001
+    python serve.py --workers 4 --bus unix      # force the no-replica-set transport
+
+MONGO_MAX_POOL_SIZE and MONGO_MIN_POOL_SIZE are per worker; four workers
+with the default pool of 100 can open 400 connections per server.
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+
+def main():
+    import uvicorn
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bus", choices=["auto", "changestream", "unix", "none"],
+                        help="invalidation transport (default: INVALIDATION_BUS, else auto)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # The workers read these when they import server.py
+    load_dotenv(ROOT_DIR / '.env')
+    if args.bus:
+        os.environ["INVALIDATION_BUS"] = args.bus
+    elif args.workers == 1:
+        os.environ.setdefault("INVALIDATION_BUS", "none")
+    socket_dir = os.environ.setdefault(
+        "INVALIDATION_SOCKET_DIR", os.path.join(tempfile.gettempdir(), f"invalidation-{os.environ['DB_NAME']}"))
+    # Sockets left by a previous run whose workers were killed
+    for path in glob.glob(os.path.join(socket_dir, "*.sock")):
+        os.unlink(path)
+
+    uvicorn.run("server:app", app_dir=str(ROOT_DIR), host=args.host, port=args.port,
+                workers=args.workers, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,127 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, WaitQueueTimeoutError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone
-import bcrypt
-import random
 import hmac
 import hashlib
+import json
+import math
+import zlib
+from question_bank import EMPTY_GROUP, QuestionBank, dump_json
+from password_hashing import PasswordHasher, PoolSaturated
+from db_indexes import ensure_indexes
+from pagination import InvalidCursor, build_projection, fetch_page
+from exports import FORMATS, stream_export
+from scoring import AnswerKey
+from write_behind import WriteBehindQueue
+from payment_gateway import RazorpayGateway, GatewayError, GatewayUnavailable
+from entitlements import EntitlementCache
+from purchases import purchase_doc, record_purchase, reconcile
+from sampler import SamplePool, mongo_sample
+from exam_sessions import ExamSessionStore, SessionClosed, SessionNotFound
+from cached_responses import EncodedBody, ResponseCache
+from fast_json import FastJSONResponse
+from user_stats import analytics_view, apply_attempts
+from question_stats import apply_answers, item_analysis, reset_question, reset_questions
+from question_import import csv_rows, decompressed, detect_format, import_questions, iter_rows, ndjson_rows
+from leaderboard import Leaderboard
+from content_store import ContentStore, TooLarge
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware
+from database import Database
+from invalidation import InvalidationBus
+from rate_limits import Admission, AdmissionMiddleware, RateLimiter, client_ip
+from pymongo import ASCENDING, DESCENDING
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Per-process request/Mongo/event-loop metrics, served on /metrics
+metrics = Metrics(lag_interval=float(os.environ.get('METRICS_LAG_INTERVAL', '0.5')))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# MongoDB connection: pool sized from the environment, warmed at startup
+database = Database.from_env(event_listeners=[metrics.mongo_listener()] if METRICS_ENABLED else [])
+db = database.db
+# Secondary reads for admin/analytics, relaxed writes for rebuildable rollups (see database.py)
+analytics_db = database.analytics
+telemetry_db = database.telemetry
+
+# Tells the other worker processes to drop their in-memory caches (see invalidation.py)
+invalidation_bus = InvalidationBus.from_env(db)
+
+# In-memory question bank, invalidated by the admin question routes and re-read once it
+# is QUESTION_BANK_TTL seconds old (catches writes made outside the server)
+question_bank = QuestionBank(db.questions, max_age=float(os.environ.get('QUESTION_BANK_TTL', '300')) or None)
+
+# Per-route token buckets by client IP and user; requests in progress capped per worker
+rate_limiter = RateLimiter.from_env(telemetry_db.rate_limits)
+admission = Admission.from_env()
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+# bcrypt runs on a bounded worker pool so logins don't block the event loop
+password_hasher = PasswordHasher.from_env()
+
+# One pooled Razorpay client per process (keep-alive, timeouts, retries, circuit breaker)
+payment_gateway = RazorpayGateway.from_env()
+
+# Purchased set_numbers per user, so check-access polls skip Mongo
+entitlements = EntitlementCache(
+    db.purchased_sets,
+    max_users=int(os.environ.get('ENTITLEMENT_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('ENTITLEMENT_CACHE_TTL', '300'))
+)
+
+# Test attempts are spooled locally and written to Mongo in batches
+attempt_writer = WriteBehindQueue(
+    db.test_attempts,
+    os.environ.get('ATTEMPT_SPOOL_DIR', str(ROOT_DIR / 'spool' / 'test_attempts')),
+    max_batch=int(os.environ.get('ATTEMPT_BATCH_SIZE', '500')),
+    max_delay=float(os.environ.get('ATTEMPT_FLUSH_MS', '50')) / 1000,
+    fsync=os.environ.get('ATTEMPT_SPOOL_FSYNC', '').lower() in ('1', 'true', 'yes')
+)
+
+async def update_user_rollups(attempts):
+    # Per-user analytics follow the attempt batches, one bulk_write per batch
+    await apply_attempts(telemetry_db.user_stats, attempts)
+
+async def update_question_stats(attempts):
+    # Per-question counters: one $inc per distinct question in the batch
+    answer_key = _answer_key(await question_bank.snapshot())
+    await apply_answers(telemetry_db.question_stats, answer_key, attempts)
+
+attempt_writer.add_listener(update_user_rollups)
+attempt_writer.add_listener(update_question_stats)
+
+# In-progress exams: answers autosaved in memory, flushed to Mongo in batches
+exam_sessions = ExamSessionStore(
+    db.exam_sessions,
+    flush_interval=float(os.environ.get('EXAM_SESSION_FLUSH_SECONDS', '5'))
+)
+
+async def claim_exam_session(session_id):
+    # Whichever worker held this session before flushes its answers and lets go
+    await invalidation_bus.publish("exam_session", {"id": session_id})
+
+exam_sessions.on_claim = claim_exam_session
+
+# Score histograms per test type and set, for rank/percentile on submit
+leaderboard = Leaderboard(
+    analytics_db.test_attempts,
+    refresh_interval=float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '300')),
+    settle=float(os.environ.get('LEADERBOARD_SETTLE_SECONDS', '120'))
+)
 
 # Create the main app
 app = FastAPI()
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
 
 # ==================== MODELS ====================
 
@@ -65,6 +162,23 @@ class Question(BaseModel):
     subject: str  # "tamil" or "physics"
     part: str  # "A" or "B"
 
+class QuestionImport(Question):
+    # One row of a bulk import: stricter than Question, and set_number is kept
+    question_number: int = Field(ge=1)
+    marks: float = Field(gt=0)
+    set_number: int = Field(1, ge=1)
+
+    @model_validator(mode="after")
+    def check_options(self):
+        labels = [option.label for option in self.options]
+        if len(labels) < 2:
+            raise ValueError("At least two options are required")
+        if len(set(labels)) != len(labels):
+            raise ValueError("Option labels must be unique")
+        if self.correct_answer not in labels:
+            raise ValueError(f"correct_answer {self.correct_answer!r} is not one of the option labels")
+        return self
+
 class Answer(BaseModel):
     question_id: str
     selected_answer: str
@@ -74,18 +188,31 @@ class TestAttempt(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: Optional[str] = None
     test_type: str  # "sample" or "full"
+    set_number: Optional[int] = None
     answers: List[Answer]
     score: float
     total_marks: float
     time_taken: int  # in seconds
+    subject_scores: Dict[str, Dict[str, Any]] = {}
+    part_scores: Dict[str, Dict[str, Any]] = {}
     submitted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TestSubmission(BaseModel):
     user_id: Optional[str] = None
     test_type: str
+    set_number: Optional[int] = None
     answers: List[Answer]
     time_taken: int
 
+class ExamSessionCreate(BaseModel):
+    user_id: Optional[str] = None
+    test_type: str = "full"
+    set_number: Optional[int] = None
+
+class AnswerPatch(BaseModel):
+    seq: int  # increases with every patch the client sends
+    answers: Dict[str, Optional[str]]  # question_id -> label, or None to clear
+
 class Feedback(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -124,6 +251,11 @@ class StudyMaterial(BaseModel):
     set_number: Optional[int] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = True
+    # Set when a file is uploaded to the content store (file_url then points at our download route)
+    file_key: Optional[str] = None
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    content_type: Optional[str] = None
 
 class StudyMaterialCreate(BaseModel):
     title: str
@@ -135,141 +267,281 @@ class StudyMaterialCreate(BaseModel):
 
 # ==================== AUTH ROUTES ====================
 
+async def throttle(request: Request, route: str, user: Optional[str] = None):
+    ip = client_ip(request.client.host if request.client else None,
+                   request.headers.get("x-forwarded-for"), TRUSTED_PROXY_HOPS)
+    retry_after = await rate_limiter.check(route, ip, user)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many requests, please try again later",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
 @api_router.post("/auth/register", response_model=UserResponse)
-async def register(user_data: UserCreate):
-    # Check if user exists
-    existing = await db.users.find_one({"username": user_data.username})
-    if existing:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    
-    existing_email = await db.users.find_one({"email": user_data.email})
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+async def register(user_data: UserCreate, request: Request):
+    await throttle(request, "register", user_data.username)
     # Hash password
-    hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), bcrypt.gensalt())
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again", headers={"Retry-After": "1"})
     
     user = User(
         username=user_data.username,
         email=user_data.email,
-        password=hashed_password.decode('utf-8')
+        password=hashed_password
     )
     
     doc = user.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.users.insert_one(doc)
+    
+    # The unique username/email indexes reject duplicates atomically
+    try:
+        await db.users.insert_one(doc)
+    except DuplicateKeyError as e:
+        if "email" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail="Email already registered")
+        raise HTTPException(status_code=400, detail="Username already exists")
     
     return UserResponse(id=user.id, username=user.username, email=user.email)
 
 @api_router.post("/auth/login", response_model=UserResponse)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
+    # Before the user lookup, so unknown usernames are throttled too
+    await throttle(request, "login", credentials.username)
     user = await db.users.find_one({"username": credentials.username})
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not bcrypt.checkpw(credentials.password.encode('utf-8'), user['password'].encode('utf-8')):
+    try:
+        password_ok = await password_hasher.verify(credentials.password, user['password'])
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again", headers={"Retry-After": "1"})
+    
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     return UserResponse(id=user['id'], username=user['username'], email=user['email'])
 
 # ==================== QUESTIONS ROUTES ====================
 
+def _sample_pool(snapshot, subject, set_number):
+    group = snapshot.group(subject, set_number)
+    if group is EMPTY_GROUP:
+        # No such subject or set: an empty paper, never cached, so made-up parameters can't grow the memo
+        return SamplePool(group)
+    # Built once per question bank version; the shuffle depends only on the group's question ids
+    return snapshot.memo(
+        ("sample_pool", subject, set_number),
+        lambda snap: SamplePool(snap.group(subject, set_number))
+    )
+
 @api_router.get("/questions/sample")
-async def get_sample_questions():
-    # Get 10 random physics questions
-    all_physics = await db.questions.find({"subject": "physics"}, {"_id": 0}).to_list(None)
-    
-    if len(all_physics) >= 10:
-        sample = random.sample(all_physics, 10)
+async def get_sample_questions(
+    subject: str = "physics",
+    set_number: Optional[int] = None,
+    count: int = Query(10, ge=1, le=50),
+    seed: Optional[str] = None,
+    stratify: bool = False
+):
+    # Random questions from the precomputed pool (answers are already stripped in the bank).
+    # The same seed (e.g. "<user_id>:<attempt>") returns the same paper on reload.
+    snapshot = question_bank.current()
+    if snapshot is None and seed is None:
+        # The bank is reloading after an admin edit; let Mongo pick instead of waiting
+        query = {"subject": subject}
+        if set_number is not None:
+            query["set_number"] = set_number
+        questions = await mongo_sample(db.questions, query, count)
+        fragments = [dump_json(q) for q in questions]
+        total_marks = sum(q.get("marks", 0) for q in questions)
     else:
-        sample = all_physics
-    
-    # Remove correct answers from sample
-    for q in sample:
-        q.pop('correct_answer', None)
+        snapshot = snapshot or await question_bank.snapshot()
+        pool = _sample_pool(snapshot, subject, set_number)
+        positions = pool.draw(count, seed=seed, stratify=stratify)
+        fragments = pool.fragments(positions)
+        total_marks = pool.total_marks(positions)
     
-    return {"questions": sample, "total_marks": 15, "time_limit": 900}  # 15 minutes
+    if float(total_marks).is_integer():
+        total_marks = int(total_marks)
+    time_limit = 90 * len(fragments)  # 15 minutes for 10 questions
+    body = (
+        b'{"questions":[' + b",".join(fragments) + b'],"total_marks":' + dump_json(total_marks)
+        + b',"time_limit":' + dump_json(time_limit) + b'}'
+    )
+    return Response(content=body, media_type="application/json")
+
+def _full_test_body(snapshot, set_number):
+    tamil = snapshot.group("tamil", set_number)
+    physics = snapshot.group("physics", set_number)
+    return (
+        b'{"tamil_questions":' + tamil.body
+        + b',"physics_questions":' + physics.body
+        + b',"total_marks":200,"time_limit":10800}'  # 3 hours
+    )
+
+async def _full_test_encoded(snapshot, set_number):
+    # Max-level gzip/brotli of the full paper takes ~150 ms: built in a thread, once per set and bank version
+    return await snapshot.memo_in_executor(
+        ("full", set_number), lambda snap: EncodedBody(_full_test_body(snap, set_number)))
+
+async def warm_full_test():
+    # Before the exam-start rush, so no request waits for the build
+    snapshot = await question_bank.snapshot()
+    await _full_test_encoded(snapshot, None)
 
 @api_router.get("/questions/full")
-async def get_full_questions():
-    # Get all questions (Tamil + Physics)
-    tamil_questions = await db.questions.find({"subject": "tamil"}, {"_id": 0}).to_list(None)
-    physics_questions = await db.questions.find({"subject": "physics"}, {"_id": 0}).to_list(None)
-    
-    # Remove correct answers
-    for q in tamil_questions + physics_questions:
-        q.pop('correct_answer', None)
-    
-    return {
-        "tamil_questions": tamil_questions,
-        "physics_questions": physics_questions,
-        "total_marks": 200,
-        "time_limit": 10800  # 3 hours
-    }
+async def get_full_questions(request: Request, set_number: Optional[int] = None):
+    # Tamil + Physics questions, optionally limited to one set; compressed once per bank version
+    snapshot = await question_bank.snapshot()
+    if set_number is not None and set_number not in snapshot.set_numbers:
+        # Only real sets get a cached body; any other number would add one more
+        raise HTTPException(status_code=404, detail="Question set not found")
+    return (await _full_test_encoded(snapshot, set_number)).respond(request)
 
 # ==================== TEST SUBMISSION ====================
 
-@api_router.post("/test/submit")
-async def submit_test(submission: TestSubmission):
-    # Get all questions with answers
-    question_ids = [ans.question_id for ans in submission.answers]
-    questions = await db.questions.find({"id": {"$in": question_ids}}, {"_id": 0}).to_list(None)
-    
-    # Create question lookup
-    q_lookup = {q['id']: q for q in questions}
-    
-    # Calculate score and detailed results
-    score = 0
-    total_marks = 0
-    detailed_results = []
-    
-    for ans in submission.answers:
-        question = q_lookup.get(ans.question_id)
-        if question:
-            total_marks += question['marks']
-            is_correct = ans.selected_answer == question['correct_answer']
-            if is_correct:
-                score += question['marks']
-            
-            detailed_results.append({
-                "question_id": ans.question_id,
-                "question_number": question['question_number'],
-                "question_text": question['question_text'],
-                "selected_answer": ans.selected_answer,
-                "correct_answer": question['correct_answer'],
-                "is_correct": is_correct,
-                "marks": question['marks'],
-                "options": question['options']
-            })
+def _answer_key(snapshot):
+    # Compiled once per question bank version
+    return snapshot.memo("answer_key", lambda snap: AnswerKey(snap.questions))
+
+def _record_attempt(snapshot, user_id, test_type, answers, time_taken, set_number=None):
+    # answers: (question_id, selected_answer) pairs
+    answer_key = _answer_key(snapshot)
+    result = answer_key.score(answers)
+    score = result.score
+    total_marks = result.total_marks
+    detailed_results = answer_key.detailed_results(result)
     
     # Save test attempt
     attempt = TestAttempt(
-        user_id=submission.user_id,
-        test_type=submission.test_type,
-        answers=submission.answers,
+        user_id=user_id,
+        test_type=test_type,
+        set_number=set_number,
+        answers=[Answer(question_id=qid, selected_answer=sel) for qid, sel in answers],
         score=score,
         total_marks=total_marks,
-        time_taken=submission.time_taken
+        time_taken=time_taken,
+        subject_scores=result.subjects,
+        part_scores=result.parts
     )
     
     doc = attempt.model_dump()
     doc['submitted_at'] = doc['submitted_at'].isoformat()
-    await db.test_attempts.insert_one(doc)
+    # Spooled now, inserted with the next batch
+    attempt_writer.submit(doc)
     
     return {
         "attempt_id": attempt.id,
         "score": score,
         "total_marks": total_marks,
-        "percentage": round((score / total_marks * 100), 2) if total_marks > 0 else 0,
+        "percentage": result.percentage,
+        "subject_scores": result.subjects,
+        "part_scores": result.parts,
+        # rank, out_of, percentile among every attempt at this test type and set (None if it has no board)
+        **leaderboard.record(test_type, set_number, score, doc['submitted_at']),
         "detailed_results": detailed_results
     }
 
+def _ranked_board(test_type, set_number):
+    # Real test types and sets only; a reload racing an admin edit keeps whatever set it finds
+    snapshot = question_bank.current()
+    if test_type not in EXAM_TIME_LIMITS:
+        return False
+    return set_number is None or snapshot is None or set_number in snapshot.set_numbers
+
+leaderboard.accept = _ranked_board
+
+@api_router.post("/test/submit")
+async def submit_test(submission: TestSubmission, request: Request):
+    await throttle(request, "submit", submission.user_id)
+    # Score against the compiled answer key (no per-submission question lookup)
+    snapshot = await question_bank.snapshot()
+    answers = [(ans.question_id, ans.selected_answer) for ans in submission.answers]
+    result = _record_attempt(snapshot, submission.user_id, submission.test_type, answers,
+                             submission.time_taken, submission.set_number)
+    # Already plain JSON types; skip jsonable_encoder's walk over ~130 detailed results
+    return FastJSONResponse(result)
+
+@api_router.get("/leaderboard/{test_type}")
+async def get_leaderboard(test_type: str, set_number: Optional[int] = None):
+    # Score distribution from memory; no scan of test_attempts
+    return leaderboard.summary(test_type, set_number)
+
+# ==================== USER HISTORY ====================
+
+@api_router.get("/users/{user_id}/attempts")
+async def get_user_attempts(
+    user_id: str,
+    test_type: Optional[str] = None,
+    include_answers: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    # Newest first, served by the user_submitted index
+    query = {"user_id": user_id}
+    if test_type:
+        query["test_type"] = test_type
+    projection = {"_id": 0} if include_answers else {"_id": 0, "answers": 0}
+    attempts, next_cursor = await _admin_page(db.test_attempts, query, ATTEMPT_SORT, limit, cursor, projection)
+    return FastJSONResponse({"attempts": attempts, "next_cursor": next_cursor})
+
+@api_router.get("/users/{user_id}/analytics")
+async def get_user_analytics(user_id: str):
+    # One rollup document, maintained as attempts are written
+    stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    return analytics_view(user_id, stats)
+
+# ==================== EXAM SESSIONS ====================
+
+EXAM_TIME_LIMITS = {"full": 10800, "sample": 900}  # seconds
+
+async def _exam_session(session_id, action):
+    try:
+        return await action(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Exam session not found")
+    except SessionClosed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@api_router.post("/exam/sessions")
+async def start_exam_session(data: ExamSessionCreate, request: Request):
+    # Shares the submit budget: every session held in memory ends in a submit
+    await throttle(request, "submit", data.user_id)
+    if data.test_type not in EXAM_TIME_LIMITS:
+        raise HTTPException(status_code=400, detail="Unknown test type")
+    session = await exam_sessions.create(data.user_id, data.test_type, data.set_number,
+                                         EXAM_TIME_LIMITS[data.test_type])
+    return session.to_response()
+
+@api_router.get("/exam/sessions/{session_id}")
+async def get_exam_session(session_id: str):
+    # Used to resume after a reload or a dropped connection
+    session = await _exam_session(session_id, exam_sessions.get)
+    return session.to_response()
+
+@api_router.patch("/exam/sessions/{session_id}/answers")
+async def autosave_answers(session_id: str, patch: AnswerPatch):
+    session = await _exam_session(session_id, lambda sid: exam_sessions.patch(sid, patch.seq, patch.answers))
+    return {"session_id": session.id, "seq": session.seq, "time_left": session.time_left()}
+
+@api_router.post("/exam/sessions/{session_id}/submit")
+async def submit_exam_session(session_id: str, request: Request):
+    # Scores the answers the server already holds; the client sends nothing but the id
+    held = await _exam_session(session_id, exam_sessions.get)
+    await throttle(request, "submit", held.user_id)
+    snapshot = await question_bank.snapshot()
+    session = await _exam_session(session_id, exam_sessions.finalize)
+    result = _record_attempt(snapshot, session.user_id, session.test_type,
+                             list(session.answers.items()), session.time_taken(), session.set_number)
+    result["session_id"] = session.id
+    return FastJSONResponse(result)
+
 # ==================== FEEDBACK ====================
 
 @api_router.post("/feedback")
-async def submit_feedback(feedback_data: FeedbackCreate):
+async def submit_feedback(feedback_data: FeedbackCreate, request: Request):
+    await throttle(request, "feedback", feedback_data.email)
     feedback = Feedback(**feedback_data.model_dump())
     doc = feedback.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
@@ -280,13 +552,6 @@ async def submit_feedback(feedback_data: FeedbackCreate):
 
 @api_router.post("/payment/create-order")
 async def create_payment_order(set_number: int, user_id: str):
-    import razorpay
-    
-    razorpay_key = os.environ.get('RAZORPAY_KEY_ID')
-    razorpay_secret = os.environ.get('RAZORPAY_KEY_SECRET')
-    
-    client = razorpay.Client(auth=(razorpay_key, razorpay_secret))
-    
     # Amount in paise (100 rupees = 10000 paise)
     amount = 10000  # ₹100
     
@@ -303,13 +568,24 @@ async def create_payment_order(set_number: int, user_id: str):
         }
     }
     
-    order = client.order.create(data=order_data)
+    try:
+        order = await payment_gateway.create_order(order_data)
+    except GatewayUnavailable as e:
+        logger.warning(f"Razorpay order creation failed: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Payment service is temporarily unavailable, please try again",
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except GatewayError as e:
+        logger.error(f"Razorpay rejected order: {e}")
+        raise HTTPException(status_code=502, detail="Could not create payment order")
     
     return {
         "order_id": order['id'],
         "amount": order['amount'],
         "currency": order['currency'],
-        "key_id": razorpay_key
+        "key_id": payment_gateway.key_id
     }
 
 @api_router.post("/payment/verify")
@@ -326,47 +602,142 @@ async def verify_payment(verification: PaymentVerification):
     if generated_signature != verification.razorpay_signature:
         raise HTTPException(status_code=400, detail="Invalid payment signature")
     
-    # Payment verified - grant access
-    access_doc = {
-        "id": str(uuid.uuid4()),
-        "user_id": verification.user_id,
-        "set_number": verification.set_number,
-        "payment_id": verification.razorpay_payment_id,
-        "order_id": verification.razorpay_order_id,
-        "amount": 100,
-        "purchased_at": datetime.now(timezone.utc).isoformat(),
-        "is_active": True
-    }
+    # Payment verified - grant access (once per order, however often the client retries)
+    access_doc = purchase_doc(
+        verification.user_id,
+        verification.set_number,
+        verification.razorpay_order_id,
+        verification.razorpay_payment_id
+    )
     
-    await db.purchased_sets.insert_one(access_doc)
+    inserted = await record_purchase(db.purchased_sets, access_doc)
+    entitlements.grant(verification.user_id, verification.set_number)
+    # Our entry is already current; only the other workers drop theirs
+    await invalidation_bus.publish("entitlements", {"user_id": verification.user_id})
     
     return {
         "success": True,
-        "message": "Payment verified successfully",
-        "set_number": verification.set_number
+        "message": "Payment verified successfully" if inserted else "Payment already verified",
+        "set_number": verification.set_number,
+        "already_verified": not inserted
     }
 
+@api_router.post("/payment/reconcile")
+async def reconcile_payments(request: Request):
+    # Webhook-style: a Razorpay event, a list of events, or {"events": [...]}, signed
+    # with the webhook secret over the raw body
+    webhook_secret = os.environ.get('RAZORPAY_WEBHOOK_SECRET')
+    if not webhook_secret:
+        raise HTTPException(status_code=503, detail="Payment reconciliation is not configured")
+    
+    body = await request.body()
+    expected = hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get("X-Razorpay-Signature", "")):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if isinstance(payload, dict):
+        payload = payload.get("events", [payload])
+    if not isinstance(payload, list) or not all(isinstance(e, dict) for e in payload):
+        raise HTTPException(status_code=400, detail="Expected an event or a list of events")
+    
+    result = await reconcile(db.purchased_sets, payload)
+    if result.revoked:
+        # Refund events may lack user notes; refunds are rare, so drop every cached entitlement
+        await entitlements_changed(None)
+    else:
+        for user_id in result.user_ids:
+            await entitlements_changed(user_id)
+    
+    return result.to_dict()
+
+async def entitlements_changed(user_id):
+    # Reconcile and refunds: None drops every user's entry; the other workers do the same
+    entitlements.invalidate(user_id)
+    await invalidation_bus.publish("entitlements", {"user_id": user_id})
+
 @api_router.get("/payment/check-access/{user_id}/{set_number}")
 async def check_set_access(user_id: str, set_number: int):
     # Check if user has purchased this set
-    access = await db.purchased_sets.find_one({
-        "user_id": user_id,
-        "set_number": set_number,
-        "is_active": True
-    })
-    
-    return {"has_access": access is not None}
+    return {"has_access": await entitlements.has_access(user_id, set_number)}
+
+@api_router.get("/payment/entitlements/{user_id}")
+async def get_entitlements(user_id: str):
+    # Every purchased set in one call, for pages that list several sets
+    return {"user_id": user_id, "set_numbers": sorted(await entitlements.get(user_id))}
 
 # ==================== STUDY MATERIALS ====================
 
+# Encoded /study-materials bodies per subject, dropped by the admin material routes
+materials_cache = ResponseCache(ttl=float(os.environ.get('MATERIALS_CACHE_TTL', '60')))
+
 @api_router.get("/study-materials")
-async def get_study_materials(subject: Optional[str] = None):
-    query = {"is_active": True}
-    if subject:
-        query["subject"] = subject
+async def get_study_materials(request: Request, subject: Optional[str] = None):
+    async def build():
+        query = {"is_active": True}
+        if subject:
+            query["subject"] = subject
+        materials = await db.study_materials.find(query, {"_id": 0}).to_list(None)
+        return dump_json({"materials": materials})
+    
+    encoded = await materials_cache.get(subject, build)
+    return encoded.respond(request)
+
+async def materials_changed():
+    materials_cache.invalidate()
+    await invalidation_bus.publish("materials")
+
+# Uploaded material files, stored on disk by content hash
+content_store = ContentStore(
+    os.environ.get('CONTENT_STORE_DIR', str(ROOT_DIR / 'content')),
+    max_bytes=int(os.environ.get('MATERIAL_MAX_MB', '100')) * 1024 * 1024,
+    accel_prefix=os.environ.get('CONTENT_STORE_ACCEL_PREFIX') or None
+)
+
+async def _release_file(file_key):
+    # Identical uploads share one stored file; remove it once nothing points at it
+    if file_key and not await db.study_materials.find_one({"file_key": file_key}, {"_id": 1}):
+        content_store.delete(file_key)
+
+@api_router.get("/study-materials/{material_id}/file")
+async def download_study_material(material_id: str, request: Request):
+    material = await db.study_materials.find_one(
+        {"id": material_id, "is_active": True},
+        {"_id": 0, "file_key": 1, "file_size": 1, "file_name": 1, "content_type": 1}
+    )
+    if not material or not material.get("file_key") or not content_store.exists(material["file_key"]):
+        raise HTTPException(status_code=404, detail="File not found")
+    return content_store.file_response(
+        request, material["file_key"], material["file_size"],
+        material.get("content_type") or "application/octet-stream", material.get("file_name")
+    )
+
+@api_router.put("/admin/study-materials/{material_id}/file")
+async def upload_study_material(material_id: str, request: Request, filename: Optional[str] = None):
+    # Raw request body, written to disk as it arrives (no multipart parsing, nothing held in memory)
+    material = await db.study_materials.find_one({"id": material_id}, {"_id": 0, "file_key": 1})
+    if material is None:
+        raise HTTPException(status_code=404, detail="Material not found")
+    try:
+        stored = await content_store.save(request.stream())
+    except TooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    materials = await db.study_materials.find(query, {"_id": 0}).to_list(None)
-    return {"materials": materials}
+    content_type = request.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+    await db.study_materials.update_one({"id": material_id}, {"$set": {
+        "file_key": stored.key,
+        "file_name": filename,
+        "file_size": stored.size,
+        "content_type": content_type,
+        "file_url": f"/api/study-materials/{material_id}/file",
+    }})
+    if material.get("file_key") != stored.key:
+        await _release_file(material.get("file_key"))
+    await materials_changed()
+    return {"id": material_id, "file_key": stored.key, "file_size": stored.size, "content_type": content_type}
 
 @api_router.post("/admin/study-materials")
 async def add_study_material(material_data: StudyMaterialCreate):
@@ -374,21 +745,25 @@ async def add_study_material(material_data: StudyMaterialCreate):
     doc = material.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.study_materials.insert_one(doc)
+    await materials_changed()
     return {"message": "Study material added successfully", "id": material.id}
 
 @api_router.delete("/admin/study-materials/{material_id}")
 async def delete_study_material(material_id: str):
-    result = await db.study_materials.delete_one({"id": material_id})
-    if result.deleted_count == 0:
+    deleted = await db.study_materials.find_one_and_delete({"id": material_id}, {"_id": 0, "file_key": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Material not found")
+    await _release_file(deleted.get("file_key"))
+    await materials_changed()
     return {"message": "Study material deleted successfully"}
 
 # ==================== STATS ====================
 
 @api_router.get("/stats")
 async def get_stats():
-    total_users = await db.users.count_documents({})
-    total_attempts = await db.test_attempts.count_documents({})
+    # Collection metadata rather than a count scan; exact to within replication lag
+    total_users = await analytics_db.users.estimated_document_count()
+    total_attempts = await analytics_db.test_attempts.estimated_document_count()
     return {
         "total_users": total_users,
         "total_attempts": total_attempts
@@ -425,53 +800,123 @@ async def admin_login(credentials: AdminLogin):
     else:
         raise HTTPException(status_code=401, detail="Invalid admin credentials")
 
-@api_router.get("/admin/question-sets")
-async def get_all_question_sets():
-    # Get unique set numbers from questions
-    tamil_sets = await db.questions.distinct("set_number", {"subject": "tamil"})
-    physics_sets = await db.questions.distinct("set_number", {"subject": "physics"})
-    
-    all_sets = set(tamil_sets + physics_sets)
-    
-    sets_data = []
-    for set_num in sorted(all_sets):
-        tamil_count = await db.questions.count_documents({"subject": "tamil", "set_number": set_num})
-        physics_count = await db.questions.count_documents({"subject": "physics", "set_number": set_num})
-        
-        sets_data.append({
+# Per set, per subject and per part counts/marks in a single round trip
+QUESTION_SET_PIPELINE = [
+    {"$match": {"set_number": {"$ne": None}}},
+    {"$group": {
+        "_id": {"set_number": "$set_number", "subject": "$subject", "part": "$part"},
+        "questions": {"$sum": 1},
+        "marks": {"$sum": "$marks"}
+    }},
+    {"$sort": {"_id.set_number": 1, "_id.subject": 1, "_id.part": 1}}
+]
+
+async def refresh_question_set_summary():
+    """Rebuild the materialized question_sets summary read by the dashboard."""
+    rows = await db.questions.aggregate(QUESTION_SET_PIPELINE).to_list(None)
+    
+    sets = {}
+    for row in rows:
+        key = row["_id"]
+        set_num = key["set_number"]
+        entry = sets.setdefault(set_num, {
             "set_number": set_num,
             "set_name": f"Set {set_num}",
-            "tamil_questions": tamil_count,
-            "physics_questions": physics_count,
-            "total_questions": tamil_count + physics_count,
+            "tamil_questions": 0,
+            "physics_questions": 0,
+            "total_questions": 0,
+            "total_marks": 0,
+            "subjects": {},
             "price": 100,
             "is_active": True
         })
+        subject = entry["subjects"].setdefault(key["subject"], {"questions": 0, "marks": 0, "parts": {}})
+        subject["parts"][key.get("part") or "-"] = {"questions": row["questions"], "marks": row["marks"]}
+        subject["questions"] += row["questions"]
+        subject["marks"] += row["marks"]
+        if key["subject"] in ("tamil", "physics"):
+            entry[f"{key['subject']}_questions"] += row["questions"]
+        entry["total_questions"] += row["questions"]
+        entry["total_marks"] += row["marks"]
     
-    return {"sets": sets_data}
+    summary = {
+        "_id": "summary",
+        "sets": [sets[n] for n in sorted(sets)],
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.question_sets.replace_one({"_id": "summary"}, summary, upsert=True)
+    return summary
+
+async def questions_changed():
+    # Called by every admin route that writes to the questions collection
+    question_bank.invalidate()
+    await invalidation_bus.publish("questions")
+    await refresh_question_set_summary()
+    await warm_full_test()
+
+@api_router.get("/admin/question-sets")
+async def get_all_question_sets():
+    summary = await db.question_sets.find_one({"_id": "summary"})
+    if summary is None:
+        summary = await refresh_question_set_summary()
+    
+    return {"sets": summary["sets"]}
+
+QUESTION_SORT = [("set_number", ASCENDING), ("subject", ASCENDING), ("question_number", ASCENDING), ("id", ASCENDING)]
+USER_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+ATTEMPT_SORT = [("submitted_at", DESCENDING), ("id", DESCENDING)]
+
+async def _admin_page(collection, query, sort, limit, cursor, projection):
+    try:
+        return await fetch_page(collection, query, sort, limit, cursor, projection)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.get("/admin/questions")
-async def get_all_questions(subject: Optional[str] = None, set_number: Optional[int] = None):
+async def get_all_questions(
+    subject: Optional[str] = None,
+    set_number: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=500),
+    fields: Optional[str] = None
+):
     query = {}
     if subject:
         query["subject"] = subject
-    if set_number:
+    if set_number is not None:
         query["set_number"] = set_number
     
-    questions = await db.questions.find(query, {"_id": 0}).to_list(None)
-    return {"questions": questions}
+    projection = build_projection(fields, {"_id": 0}, QUESTION_SORT)
+    questions, next_cursor = await _admin_page(db.questions, query, QUESTION_SORT, limit, cursor, projection)
+    return FastJSONResponse({"questions": questions, "next_cursor": next_cursor})
+
+async def _finish_import(report):
+    if report.changed:
+        # Old picks were made against a different answer key
+        await reset_questions(db.question_stats, report.rekeyed)
+        await questions_changed()
+    return FastJSONResponse(report.to_dict())
 
 @api_router.post("/admin/questions/bulk")
-async def add_questions_bulk(questions_data: List[Dict[str, Any]]):
-    # Add set_number to each question if not present
-    for q in questions_data:
-        if "set_number" not in q:
-            q["set_number"] = 1
-        if "id" not in q:
-            q["id"] = str(uuid.uuid4())
-    
-    await db.questions.insert_many(questions_data)
-    return {"message": f"Added {len(questions_data)} questions successfully"}
+async def add_questions_bulk(questions_data: List[Any], dry_run: bool = False):
+    # Same validation and upsert-by-id as /import, for a JSON array already in memory
+    report = await import_questions(db.questions, iter_rows(questions_data), QuestionImport, dry_run=dry_run)
+    return await _finish_import(report)
+
+@api_router.post("/admin/questions/import")
+async def import_questions_stream(request: Request, format: Optional[str] = None, dry_run: bool = False):
+    # Raw NDJSON or CSV body, optionally gzip-compressed; parsed as it streams in
+    fmt = format or detect_format(request.headers.get("content-type", ""))
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=415, detail="Send NDJSON or CSV (Content-Type or ?format=)")
+    gzip = request.headers.get("content-encoding", "").lower() == "gzip"
+    chunks = decompressed(request.stream(), gzip)
+    rows = csv_rows(chunks) if fmt == "csv" else ndjson_rows(chunks)
+    try:
+        report = await import_questions(db.questions, rows, QuestionImport, dry_run=dry_run)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Body is not valid gzip")
+    return await _finish_import(report)
 
 @api_router.put("/admin/questions/{question_id}")
 async def update_question(question_id: str, update_data: QuestionUpdate):
@@ -485,6 +930,11 @@ async def update_question(question_id: str, update_data: QuestionUpdate):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Question not found")
     
+    if "correct_answer" in update_dict or "options" in update_dict:
+        # Earlier picks were made against a different key or options
+        await reset_question(db.question_stats, question_id)
+    await questions_changed()
+    
     return {"message": "Question updated successfully"}
 
 @api_router.delete("/admin/questions/{question_id}")
@@ -494,29 +944,139 @@ async def delete_question(question_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Question not found")
     
+    await questions_changed()
+    
     return {"message": "Question deleted successfully"}
 
 @api_router.delete("/admin/question-sets/{set_number}")
 async def delete_question_set(set_number: int):
     result = await db.questions.delete_many({"set_number": set_number})
+    await questions_changed()
     
     return {
         "message": f"Deleted set {set_number} successfully",
         "deleted_count": result.deleted_count
     }
 
+@api_router.get("/admin/item-analysis")
+async def get_item_analysis(
+    set_number: Optional[int] = None,
+    subject: Optional[str] = None,
+    min_answered: int = Query(0, ge=0),
+    sort: str = Query("question_number", pattern="^(question_number|difficulty)$")
+):
+    # Questions come from the in-memory bank; their counters in one query
+    snapshot = await question_bank.snapshot()
+    questions = [
+        q for q in snapshot.questions
+        if (set_number is None or q.get("set_number") == set_number)
+        and (subject is None or q.get("subject") == subject)
+    ]
+    ids = [q["id"] for q in questions]
+    stats = {
+        doc["question_id"]: doc
+        async for doc in analytics_db.question_stats.find({"question_id": {"$in": ids}}, {"_id": 0})
+    }
+    items = item_analysis(questions, stats, min_answered=min_answered, sort=sort)
+    return FastJSONResponse({"items": items, "count": len(items)})
+
 @api_router.get("/admin/users")
-async def get_all_users():
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(None)
-    return {"users": users}
+async def get_all_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = None
+):
+    projection = build_projection(fields, {"_id": 0}, USER_SORT, hidden=["password"])
+    users, next_cursor = await _admin_page(analytics_db.users, {}, USER_SORT, limit, cursor, projection)
+    return FastJSONResponse({"users": users, "next_cursor": next_cursor})
 
 @api_router.get("/admin/test-attempts")
-async def get_all_attempts():
-    attempts = await db.test_attempts.find({}, {"_id": 0}).to_list(None)
-    return {"attempts": attempts}
+async def get_all_attempts(
+    test_type: Optional[str] = None,
+    user_id: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    include_answers: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = None
+):
+    query = {}
+    if test_type:
+        query["test_type"] = test_type
+    if user_id:
+        query["user_id"] = user_id
+    # submitted_at is stored as a UTC isoformat string, which sorts chronologically
+    date_range = {}
+    if submitted_from:
+        date_range["$gte"] = _utc_isoformat(submitted_from)
+    if submitted_to:
+        date_range["$lt"] = _utc_isoformat(submitted_to)
+    if date_range:
+        query["submitted_at"] = date_range
+    
+    # The answers array dominates attempt size, so it is only sent on request
+    default_projection = {"_id": 0} if include_answers else {"_id": 0, "answers": 0}
+    projection = build_projection(fields, default_projection, ATTEMPT_SORT)
+    attempts, next_cursor = await _admin_page(analytics_db.test_attempts, query, ATTEMPT_SORT, limit, cursor, projection)
+    return FastJSONResponse({"attempts": attempts, "next_cursor": next_cursor})
+
+def _utc_isoformat(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+# ==================== EXPORTS ====================
+
+# dataset -> (collection, projection, CSV columns)
+EXPORT_DATASETS = {
+    "users": ("users", {"_id": 0, "password": 0}, ["id", "username", "email", "created_at"]),
+    "test-attempts": (
+        "test_attempts",
+        {"_id": 0},
+        ["id", "user_id", "test_type", "score", "total_marks", "time_taken", "submitted_at"]
+    ),
+    "purchases": (
+        "purchased_sets",
+        {"_id": 0},
+        ["id", "user_id", "set_number", "order_id", "payment_id", "amount", "purchased_at", "is_active"]
+    ),
+}
+
+@api_router.get("/admin/export/{dataset}")
+async def export_dataset(dataset: str, request: Request, format: str = "csv"):
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown export dataset")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+    
+    collection, projection, columns = EXPORT_DATASETS[dataset]
+    media_type, extension = FORMATS[format]
+    gzip = "gzip" in request.headers.get("accept-encoding", "")
+    
+    cursor = analytics_db[collection].find({}, projection)
+    filename = f"{dataset}-{datetime.now(timezone.utc):%Y%m%d}.{extension}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    
+    return StreamingResponse(
+        stream_export(cursor, format, columns, gzip=gzip),
+        media_type=media_type,
+        headers=headers
+    )
 
 app.include_router(api_router)
 
+def _admission_exempt(scope):
+    # Exam autosaves are never shed: they only touch memory, and refusing them loses a student's work
+    path = scope["path"]
+    return path == "/metrics" or (scope["method"] == "PATCH" and path.startswith("/api/exam/sessions/"))
+
+# Inside CORS, so browsers can read the 429
+app.add_middleware(AdmissionMiddleware, admission=admission, exempt=_admission_exempt)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -525,12 +1085,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(WaitQueueTimeoutError)
+async def mongo_pool_exhausted(request: Request, exc: WaitQueueTimeoutError):
+    # Every pooled connection stayed busy for MONGO_WAIT_QUEUE_TIMEOUT_MS; ask the client to retry
+    logger.warning(f"MongoDB pool exhausted on {request.url.path}")
+    return FastJSONResponse({"detail": "Server is busy, please try again"}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+# ==================== METRICS ====================
+
+# Read when /metrics is scraped; nothing extra runs per request
+metrics.gauge("bcrypt_queue_depth", "Password hashing calls waiting for a worker thread",
+              lambda: password_hasher.queue_depth)
+metrics.gauge("bcrypt_in_flight", "Password hashing calls running or queued", lambda: password_hasher.in_flight)
+metrics.gauge("attempt_writes_pending", "Test attempts spooled but not yet in Mongo", lambda: attempt_writer.pending)
+metrics.gauge("exam_sessions_in_memory", "Exam sessions held by this process", lambda: len(exam_sessions))
+metrics.gauge("entitlement_cache_requests_total", "Entitlement lookups by result",
+              lambda: {("hit",): entitlements.hits, ("miss",): entitlements.misses}, ("result",), kind="counter")
+metrics.gauge("mongodb_pool_connections", "MongoDB connections by state",
+              lambda: {("open",): database.pool.open, ("in_use",): database.pool.in_use}, ("state",))
+metrics.gauge("mongodb_pool_wait_timeouts_total", "Requests that gave up waiting for a MongoDB connection",
+              lambda: database.pool.wait_timeouts, kind="counter")
+metrics.gauge("admission_requests", "Requests admitted and in progress, or waiting for a slot",
+              lambda: {("in_flight",): admission.in_flight, ("queued",): admission.queued}, ("state",))
+metrics.gauge("admission_shed_total", "Requests refused with a 429 because the worker was full",
+              lambda: admission.shed, kind="counter")
+metrics.gauge("rate_limited_total", "Requests refused with a 429 by a per-route budget",
+              lambda: dict(rate_limiter.limited), ("route", "scope"), kind="counter")
+metrics.gauge("payment_gateway_circuit_open", "1 while the payment circuit breaker is open",
+              lambda: 1 if payment_gateway.breaker.state == "open" else 0)
+
+if METRICS_ENABLED:
+    # Outermost, so the time includes every other middleware
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        # Outside /api: scraped from inside the deployment, not exposed through the ingress
+        return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_metrics():
+    if METRICS_ENABLED:
+        metrics.start()
+
+@app.on_event("startup")
+async def connect_database():
+    # Open the warm connections before uvicorn starts accepting requests
+    await database.connect()
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes(db)
+
+async def on_questions_changed(payload):
+    # Another worker edited the bank; reload it now rather than in the next full-paper request
+    question_bank.invalidate()
+    await warm_full_test()
+
+async def on_entitlements_changed(payload):
+    entitlements.invalidate(payload.get("user_id"))
+
+async def on_materials_changed(payload):
+    materials_cache.invalidate()
+
+async def on_exam_session_claimed(payload):
+    if payload.get("id"):
+        await exam_sessions.release(payload["id"])
+    # else: messages were lost; sessions loaded elsewhere merge stored answers on submit
+
+invalidation_bus.subscribe("questions", on_questions_changed)
+invalidation_bus.subscribe("entitlements", on_entitlements_changed)
+invalidation_bus.subscribe("materials", on_materials_changed)
+invalidation_bus.subscribe("exam_session", on_exam_session_claimed)
+
+@app.on_event("startup")
+async def start_invalidation_bus():
+    # Before warming anything, so a change made elsewhere during startup isn't missed
+    await invalidation_bus.start()
+
+@app.on_event("startup")
+async def warm_question_bank():
+    # Load the bank before the exam-start rush rather than on the first request
+    await warm_full_test()
+
+@app.on_event("startup")
+async def start_attempt_writer():
+    # Replays any attempts spooled by a previous process before taking new ones
+    await attempt_writer.start()
+
+@app.on_event("startup")
+async def start_exam_sessions():
+    await exam_sessions.start()
+
+@app.on_event("startup")
+async def load_leaderboard():
+    # After the attempt writer has replayed its spool, so those attempts are counted
+    await leaderboard.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    password_hasher.shutdown()
+    # Session flush first: it can still be followed by attempt writes
+    await exam_sessions.close()
+    await leaderboard.close()
+    await attempt_writer.close()
+    await payment_gateway.close()
+    await metrics.close()
+    await invalidation_bus.close()
+    database.close()
\ No newline at end of file
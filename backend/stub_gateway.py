@@ -0,0 +1,120 @@
+"""
+Local Razorpay stub for offline testing
+
+Implements just enough of the Razorpay orders API for payment_gateway.py:
+POST /v1/orders and GET /v1/orders/{id}. Each request waits LATENCY_MS
+(plus up to JITTER_MS), fails with a 503 at FAILURE_RATE, and hangs past
+the client timeout at HANG_RATE, so the adapter's timeout, retry and
+circuit breaker behaviour can be exercised without network access.
+
+Usage:
+    python stub_gateway.py --port 8300 --latency-ms 150 --failure-rate 0.2
+    RAZORPAY_API_URL=http://127.0.0.1:8300/v1 uvicorn server:app
+
+GET /stub/config shows the current settings and POST /stub/config changes
+them at runtime (e.g. {"failure_rate": 1.0} to trip the breaker).
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+config: Dict[str, float] = {
+    "latency_ms": 100.0,
+    "jitter_ms": 50.0,
+    "failure_rate": 0.0,
+    "hang_rate": 0.0,
+    "hang_seconds": 30.0,
+}
+orders: Dict[str, Dict[str, Any]] = {}
+
+app = FastAPI()
+
+
+async def _simulate():
+    await asyncio.sleep((config["latency_ms"] + random.random() * config["jitter_ms"]) / 1000)
+    roll = random.random()
+    if roll < config["hang_rate"]:
+        await asyncio.sleep(config["hang_seconds"])
+    elif roll < config["hang_rate"] + config["failure_rate"]:
+        return JSONResponse(status_code=503, content={
+            "error": {"code": "SERVER_ERROR", "description": "Stub gateway failure"}
+        })
+    return None
+
+
+@app.post("/v1/orders")
+async def create_order(request: Request):
+    data = await request.json()
+    failure = await _simulate()
+    if failure is not None:
+        return failure
+    if not isinstance(data.get("amount"), int) or data["amount"] < 100:
+        return JSONResponse(status_code=400, content={
+            "error": {"code": "BAD_REQUEST_ERROR", "description": "The amount must be atleast INR 1.00"}
+        })
+    order = {
+        "id": f"order_{uuid.uuid4().hex[:14]}",
+        "entity": "order",
+        "amount": data["amount"],
+        "amount_paid": 0,
+        "amount_due": data["amount"],
+        "currency": data.get("currency", "INR"),
+        "receipt": data.get("receipt"),
+        "status": "created",
+        "attempts": 0,
+        "notes": data.get("notes", {}),
+        "created_at": int(time.time()),
+    }
+    orders[order["id"]] = order
+    return order
+
+
+@app.get("/v1/orders/{order_id}")
+async def fetch_order(order_id: str):
+    failure = await _simulate()
+    if failure is not None:
+        return failure
+    if order_id not in orders:
+        return JSONResponse(status_code=400, content={
+            "error": {"code": "BAD_REQUEST_ERROR", "description": "The id provided does not exist"}
+        })
+    return orders[order_id]
+
+
+@app.get("/stub/config")
+async def get_config():
+    return config
+
+
+@app.post("/stub/config")
+async def update_config(changes: Dict[str, float]):
+    config.update({k: float(v) for k, v in changes.items() if k in config})
+    return config
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--failure-rate", type=float, default=config["failure_rate"])
+    parser.add_argument("--hang-rate", type=float, default=config["hang_rate"])
+    args = parser.parse_args()
+
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                  failure_rate=args.failure_rate, hang_rate=args.hang_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
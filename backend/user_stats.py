@@ -0,0 +1,212 @@
+"""
+Per-user attempt rollups
+
+user_stats holds one document per user, updated incrementally as attempts
+are written, so a student's analytics are a single find_one instead of an
+aggregation over their raw attempts:
+
+    attempts, total_score, total_marks, sum_percentage    ($inc)
+    best_score, best_percentage, last_at                  ($max)
+    first_at                                              ($min)
+    by_type.<test_type>.{attempts, sum_percentage, best_percentage}
+    by_subject.<subject>.{score, total_marks, correct, answered}
+    by_part.<part>.{score, total_marks, correct, answered}
+    trend: the last TREND_LENGTH attempts                 ($push/$slice)
+
+apply_attempts() is registered as a write-behind listener on
+test_attempts. It turns each batch of inserted attempts into one
+bulk_write of upserts. Rollups are derived data: if they ever drift (e.g.
+an update lost in a crash), rebuild them from test_attempts with
+    python user_stats.py --rebuild
+which is safe to run while the server is taking submits.
+"""
+
+import asyncio
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from db_indexes import INDEXES
+
+TREND_LENGTH = 20
+BREAKDOWN_FIELDS = ("score", "total_marks", "correct", "answered")
+
+# Subject/part/test-type names become field names; keep them to safe characters
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _percentage(score: float, total_marks: float) -> float:
+    return round((score / total_marks * 100), 2) if total_marks > 0 else 0
+
+
+def attempt_update(doc: Dict[str, Any]) -> Optional[UpdateOne]:
+    if not doc.get("user_id"):
+        return None  # anonymous sample tests have nobody to roll up for
+    return UpdateOne({"user_id": doc["user_id"]}, _rollup_update(doc), upsert=True)
+
+
+def _rollup_update(doc: Dict[str, Any]) -> Dict[str, Any]:
+    score = doc.get("score", 0)
+    total_marks = doc.get("total_marks", 0)
+    percentage = _percentage(score, total_marks)
+    submitted_at = doc.get("submitted_at")
+    test_type = doc.get("test_type") or "unknown"
+
+    inc: Dict[str, Any] = {
+        "attempts": 1,
+        "total_score": score,
+        "total_marks": total_marks,
+        "sum_percentage": percentage,
+    }
+    best: Dict[str, Any] = {"best_score": score, "best_percentage": percentage}
+    if _SAFE_KEY.match(test_type):
+        inc[f"by_type.{test_type}.attempts"] = 1
+        inc[f"by_type.{test_type}.sum_percentage"] = percentage
+        best[f"by_type.{test_type}.best_percentage"] = percentage
+
+    for prefix, breakdown in (("by_subject", doc.get("subject_scores")), ("by_part", doc.get("part_scores"))):
+        for name, values in (breakdown or {}).items():
+            if not _SAFE_KEY.match(str(name)):
+                continue
+            for field in BREAKDOWN_FIELDS:
+                inc[f"{prefix}.{name}.{field}"] = values.get(field, 0)
+
+    update = {
+        "$inc": inc,
+        "$max": best,
+        "$push": {"trend": {"$each": [{
+            "attempt_id": doc.get("id"),
+            "test_type": test_type,
+            "score": score,
+            "total_marks": total_marks,
+            "percentage": percentage,
+            "submitted_at": submitted_at,
+        }], "$slice": -TREND_LENGTH}},
+    }
+    if submitted_at:
+        update["$max"]["last_at"] = submitted_at
+        update["$min"] = {"first_at": submitted_at}
+    return update
+
+
+async def apply_attempts(collection, docs: Iterable[Dict[str, Any]]) -> int:
+    operations = [op for op in map(attempt_update, docs) if op is not None]
+    if operations:
+        await collection.bulk_write(operations, ordered=True)  # ordered keeps each user's trend in order
+    return len(operations)
+
+
+def _rates(breakdown: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            **values,
+            "accuracy": round(values.get("correct", 0) / values["answered"] * 100, 2) if values.get("answered") else 0,
+            "percentage": _percentage(values.get("score", 0), values.get("total_marks", 0)),
+        }
+        for name, values in breakdown.items()
+    }
+
+
+def analytics_view(user_id: str, stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape a user_stats document for the API; averages are derived, never stored."""
+    stats = stats or {}
+    attempts = stats.get("attempts", 0)
+    by_type = {
+        name: {
+            "attempts": values.get("attempts", 0),
+            "best_percentage": values.get("best_percentage"),
+            "average_percentage": round(values.get("sum_percentage", 0) / values["attempts"], 2)
+            if values.get("attempts") else None,
+        }
+        for name, values in (stats.get("by_type") or {}).items()
+    }
+    return {
+        "user_id": user_id,
+        "attempts": attempts,
+        "best_score": stats.get("best_score"),
+        "best_percentage": stats.get("best_percentage"),
+        "average_percentage": round(stats.get("sum_percentage", 0) / attempts, 2) if attempts else None,
+        "overall_percentage": _percentage(stats.get("total_score", 0), stats.get("total_marks", 0)) if attempts else None,
+        "first_at": stats.get("first_at"),
+        "last_at": stats.get("last_at"),
+        "by_type": by_type,
+        "by_subject": _rates(stats.get("by_subject") or {}),
+        "by_part": _rates(stats.get("by_part") or {}),
+        "trend": stats.get("trend", []),
+    }
+
+
+async def rebuild(db, batch_size: int = 1000, settle: float = 5.0) -> int:
+    """
+    Recompute every rollup from test_attempts (oldest first, so trends come out in order).
+
+    The server keeps applying new attempts to user_stats meanwhile, so the
+    rollups are built in user_stats_rebuild from the attempts submitted
+    before the rebuild started, and renamed over user_stats in one step.
+    Attempts submitted since then may have been applied to the old
+    collection, so they are applied again after the rename, skipping any
+    the server has already applied to the new one (their id is in the
+    trend, which keeps a user's last TREND_LENGTH attempts). settle is
+    how long the server gets to apply an attempt after writing it.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    temp = db.user_stats_rebuild
+    await temp.drop()  # left over from an interrupted rebuild
+    for keys, options in INDEXES["user_stats"]:
+        await temp.create_index(keys, **options)
+
+    query = {"user_id": {"$nin": [None, ""]}}
+    # Missing submitted_at counts as old; $not keeps those rows
+    cursor = db.test_attempts.find({**query, "submitted_at": {"$not": {"$gt": started}}}, {"_id": 0, "answers": 0})
+    cursor = cursor.sort([("submitted_at", 1), ("id", 1)]).batch_size(batch_size)
+    batch: List[Dict[str, Any]] = []
+    count = 0
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            count += await apply_attempts(temp, batch)
+            batch = []
+    if batch:
+        count += await apply_attempts(temp, batch)
+
+    await temp.rename("user_stats", dropTarget=True)
+    renamed = datetime.now(timezone.utc).isoformat()
+    # Attempts written before the rename were applied to the old collection or, from here on, the new one
+    await asyncio.sleep(settle)
+    cursor = db.test_attempts.find({**query, "submitted_at": {"$gt": started, "$lte": renamed}},
+                                   {"_id": 0, "answers": 0}).sort([("submitted_at", 1), ("id", 1)])
+    async for doc in cursor:
+        try:
+            await db.user_stats.update_one({"user_id": doc["user_id"], "trend.attempt_id": {"$ne": doc.get("id")}},
+                                           _rollup_update(doc), upsert=True)
+        except DuplicateKeyError:
+            continue  # the user's rollup already has it
+        count += 1
+    return count
+
+
+async def _rebuild():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        count = await rebuild(client[os.environ['DB_NAME']])
+    finally:
+        client.close()
+    print(f"✅ Rebuilt user rollups from {count} attempts")
+    return 0
+
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv[1:]:
+        print("Usage: python user_stats.py --rebuild")
+        sys.exit(2)
+    sys.exit(asyncio.run(_rebuild()))
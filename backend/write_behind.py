@@ -0,0 +1,231 @@
+"""
+Write-behind queue with a local spool
+
+submit() appends the document to a local append-only spool segment and to
+an in-memory buffer, then returns immediately. A background task coalesces
+the buffer into insert_many batches, flushed when max_batch documents are
+waiting or max_delay seconds after the first one arrived.
+
+Every flush rotates the spool segment, so a segment holds exactly one batch
+and is deleted once that batch is in Mongo. If the insert fails (Mongo
+down or too slow), the segment stays on disk and is retried from the file;
+segments left behind by a crashed or stopped process are replayed on
+startup. Segments are named after a random run id, and each running queue
+holds an flock on <run id>.lock in the spool directory, so a segment
+belongs to a live process exactly when its lock is held. PIDs are not
+used for this: a restarted container usually gets its old PID back.
+
+Replays can repeat documents that already made it to Mongo, so the target
+collection needs a unique index on `id`; duplicate-key errors are treated
+as success.
+
+Listeners registered with add_listener() are called with each chunk of
+newly inserted documents. Derived data such as rollups is updated in the
+same batches, off the request path.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+Listener = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+def _owner_alive(spool_dir: Path, owner: str) -> bool:
+    try:
+        fd = os.open(spool_dir / f"{owner}.lock", os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)  # also drops the lock if we just took it
+    return False
+
+
+class WriteBehindQueue:
+    def __init__(self, collection, spool_dir, max_batch: int = 500, max_delay: float = 0.05,
+                 retry_delay: float = 2.0, fsync: bool = False):
+        self._collection = collection
+        self.spool_dir = Path(spool_dir)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.fsync = fsync
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._segment = None
+        self._segment_path: Optional[Path] = None
+        self._segment_seq = 0
+        self._failed: List[Path] = []  # segments whose insert failed, retried from disk
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Listener] = []
+        self._run_id = uuid.uuid4().hex[:12]
+        self._lock_fd: Optional[int] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def start(self) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        # Held until close() or process exit; other queues sharing the directory leave our segments alone
+        self._lock_fd = os.open(self.spool_dir / f"{self._run_id}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        # Segments from runs that are gone were never confirmed in Mongo
+        dead = set()
+        for path in sorted(self.spool_dir.glob("*.ndjson")):
+            owner = path.name.split("-", 1)[0]
+            if owner != self._run_id and not _owner_alive(self.spool_dir, owner):
+                self._failed.append(path)
+                dead.add(owner)
+        for lock in self.spool_dir.glob("*.lock"):
+            # Lock files of crashed runs; a minute's margin for one created but not yet locked
+            stale = lock.stem in dead or (time.time() - lock.stat().st_mtime > 60
+                                          and not _owner_alive(self.spool_dir, lock.stem))
+            if lock.stem != self._run_id and stale:
+                lock.unlink(missing_ok=True)
+        if self._failed:
+            logger.info("Replaying %d spooled segment(s) from %s", len(self._failed), self.spool_dir)
+            await self.flush()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, doc: Dict[str, Any]) -> None:
+        if self._segment is None:
+            self._segment_seq += 1
+            self._segment_path = self.spool_dir / f"{self._run_id}-{time.time_ns()}-{self._segment_seq}.ndjson"
+            self._segment = open(self._segment_path, "a", encoding="utf-8")
+        self._segment.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+
+        self._buffer.append(doc)
+        self._has_items.set()
+        if len(self._buffer) >= self.max_batch:
+            self._full.set()
+
+    async def _run(self) -> None:
+        while True:
+            if self._failed and not self._buffer:
+                # Nothing new; come back after retry_delay to retry failed segments
+                try:
+                    await asyncio.wait_for(self._has_items.wait(), self.retry_delay)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._has_items.wait()
+            if len(self._buffer) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            for path in list(self._failed):
+                try:
+                    docs = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+                    await self._insert(docs)
+                except FileNotFoundError:
+                    # Another worker that started alongside us replayed it first
+                    self._failed.remove(path)
+                    continue
+                except Exception as e:
+                    logger.warning("Spooled segment %s still not written: %s", path.name, e)
+                    break
+                self._failed.remove(path)
+                path.unlink(missing_ok=True)
+
+            if not self._buffer:
+                self._has_items.clear()
+                return
+
+            batch, self._buffer = self._buffer, []
+            self._has_items.clear()
+            self._full.clear()
+            path = self._segment_path
+            self._segment.close()
+            self._segment, self._segment_path = None, None
+
+            try:
+                await self._insert(batch)
+            except Exception as e:
+                # The batch is safe in its segment; drop it from memory and retry from disk
+                logger.warning("Deferred %d document(s) to spool: %s", len(batch), e)
+                self._failed.append(path)
+                return
+            path.unlink(missing_ok=True)
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call `await listener(docs)` with every chunk of documents newly inserted.
+
+        Replayed duplicates are left out, so listeners see each document once.
+        Listener failures are logged and not retried.
+        """
+        self._listeners.append(listener)
+
+    async def _insert(self, docs: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(docs), self.max_batch):
+            chunk = docs[start:start + self.max_batch]
+            try:
+                await self._collection.insert_many(chunk, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                failed = {err.get("index") for err in errors}
+                # The rest of an unordered batch did go in, even if this chunk gets retried
+                await self._notify([doc for i, doc in enumerate(chunk) if i not in failed])
+                if any(err.get("code") != DUPLICATE_KEY for err in errors) or e.details.get("writeConcernErrors"):
+                    raise
+            else:
+                await self._notify(chunk)
+
+    async def _notify(self, docs: List[Dict[str, Any]]) -> None:
+        if not docs:
+            return
+        for listener in self._listeners:
+            try:
+                await listener(docs)
+            except Exception as e:
+                logger.warning("Write-behind listener %s failed for %d document(s): %s",
+                               getattr(listener, "__name__", listener), len(docs), e)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._failed:
+            logger.warning("%d spooled segment(s) left in %s for replay on next start",
+                           len(self._failed), self.spool_dir)
+        if self._lock_fd is not None:
+            # Unlocked, any leftover segments count as dead and are replayed by the next queue to start
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            if not self._failed:
+                (self.spool_dir / f"{self._run_id}.lock").unlink(missing_ok=True)
@@ -23,10 +23,13 @@ const AdminDashboard = () => {
   const [selectedSet, setSelectedSet] = useState(null);
   const [showEditDialog, setShowEditDialog] = useState(false);
   const [editingQuestion, setEditingQuestion] = useState(null);
-  const [stats, setStats] = useState({ users: [], attempts: [] });
+  const [stats, setStats] = useState({ users: [], totalUsers: 0, totalAttempts: 0 });
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [loadingUsers, setLoadingUsers] = useState(false);
   const [studyMaterials, setStudyMaterials] = useState([]);
   const [showMaterialDialog, setShowMaterialDialog] = useState(false);
   const [showAddSetDialog, setShowAddSetDialog] = useState(false);
+  const [materialFile, setMaterialFile] = useState(null);
   const [newMaterial, setNewMaterial] = useState({
     title: "",
     description: "",
@@ -67,24 +70,51 @@ const AdminDashboard = () => {
 
   const fetchData = async () => {
     try {
-      const [setsRes, usersRes, attemptsRes, materialsRes] = await Promise.all([
+      const [setsRes, usersRes, statsRes, materialsRes] = await Promise.all([
         axios.get(`${API}/admin/question-sets`),
         axios.get(`${API}/admin/users`),
-        axios.get(`${API}/admin/test-attempts`),
+        axios.get(`${API}/stats`),
         axios.get(`${API}/study-materials`)
       ]);
       setQuestionSets(setsRes.data.sets);
-      setStats({ users: usersRes.data.users, attempts: attemptsRes.data.attempts });
+      setStats({
+        users: usersRes.data.users,
+        totalUsers: statsRes.data.total_users,
+        totalAttempts: statsRes.data.total_attempts
+      });
+      setUsersCursor(usersRes.data.next_cursor);
       setStudyMaterials(materialsRes.data.materials);
     } catch (error) {
       toast.error("Failed to fetch data");
     }
   };
 
+  const loadMoreUsers = async () => {
+    setLoadingUsers(true);
+    try {
+      const response = await axios.get(`${API}/admin/users`, { params: { cursor: usersCursor } });
+      setStats((prev) => ({ ...prev, users: [...prev.users, ...response.data.users] }));
+      setUsersCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error("Failed to fetch users");
+    } finally {
+      setLoadingUsers(false);
+    }
+  };
+
   const fetchQuestions = async (setNumber) => {
     try {
-      const response = await axios.get(`${API}/admin/questions?set_number=${setNumber}`);
-      setAllQuestions(response.data.questions);
+      // The listing is paginated; a set normally fits in one page
+      let questions = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${API}/admin/questions`, {
+          params: { set_number: setNumber, cursor: cursor || undefined }
+        });
+        questions = questions.concat(response.data.questions);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setAllQuestions(questions);
       setSelectedSet(setNumber);
     } catch (error) {
       toast.error("Failed to fetch questions");
@@ -140,7 +170,15 @@ const AdminDashboard = () => {
 
   const addStudyMaterial = async () => {
     try {
-      await axios.post(`${API}/admin/study-materials`, newMaterial);
+      const response = await axios.post(`${API}/admin/study-materials`, newMaterial);
+      if (materialFile) {
+        // Sent as the raw body; the server streams it to disk
+        await axios.put(`${API}/admin/study-materials/${response.data.id}/file`, materialFile, {
+          params: { filename: materialFile.name },
+          headers: { "Content-Type": materialFile.type || "application/octet-stream" },
+        });
+        setMaterialFile(null);
+      }
       toast.success("Study material added successfully");
       setShowMaterialDialog(false);
       setNewMaterial({
@@ -232,7 +270,7 @@ const AdminDashboard = () => {
             <div className="flex items-center justify-between">
               <div>
                 <p className="text-sm text-gray-600">Total Users</p>
-                <p className="text-3xl font-bold text-indigo-900">{stats.users.length}</p>
+                <p className="text-3xl font-bold text-indigo-900">{stats.totalUsers}</p>
               </div>
               <Users className="w-12 h-12 text-indigo-600" />
             </div>
@@ -250,7 +288,7 @@ const AdminDashboard = () => {
             <div className="flex items-center justify-between">
               <div>
                 <p className="text-sm text-gray-600">Test Attempts</p>
-                <p className="text-3xl font-bold text-green-900">{stats.attempts.length}</p>
+                <p className="text-3xl font-bold text-green-900">{stats.totalAttempts}</p>
               </div>
               <BarChart3 className="w-12 h-12 text-green-600" />
             </div>
@@ -419,6 +457,14 @@ const AdminDashboard = () => {
                   </tbody>
                 </table>
               </div>
+              <div className="flex items-center justify-between mt-4 text-sm text-gray-600">
+                <span>Showing {stats.users.length} of {stats.totalUsers}</span>
+                {usersCursor && (
+                  <Button variant="outline" onClick={loadMoreUsers} disabled={loadingUsers}>
+                    {loadingUsers ? "Loading..." : "Load more"}
+                  </Button>
+                )}
+              </div>
             </Card>
           </TabsContent>
         </Tabs>
@@ -504,6 +550,14 @@ const AdminDashboard = () => {
                 placeholder="https://..."
               />
             </div>
+            <div>
+              <Label>Or upload a file</Label>
+              <Input
+                type="file"
+                accept=".pdf,.txt,.doc,.docx,.ppt,.pptx,video/*"
+                onChange={(e) => setMaterialFile(e.target.files[0] || null)}
+              />
+            </div>
             <div>
               <Label>File Type</Label>
               <select
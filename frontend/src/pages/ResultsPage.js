@@ -35,7 +35,7 @@ const ResultsPage = () => {
     );
   }
 
-  const { score, total_marks, percentage, detailed_results } = results;
+  const { score, total_marks, percentage, rank, out_of, percentile, detailed_results } = results;
   const correctCount = detailed_results.filter((r) => r.is_correct).length;
   const incorrectCount = detailed_results.filter((r) => !r.is_correct).length;
 
@@ -67,6 +67,11 @@ const ResultsPage = () => {
                 </p>
               </div>
             </div>
+            {rank && (
+              <p data-testid="rank" className="mt-6 text-lg opacity-90">
+                Rank {rank} of {out_of} · better than or equal to {percentile}% of attempts
+              </p>
+            )}
           </div>
         </Card>
 
@@ -37,7 +37,13 @@ const SampleTest = () => {
 
   const fetchQuestions = async () => {
     try {
-      const response = await axios.get(`${API}/questions/sample`);
+      // Keep the same paper if the page is reloaded mid-test
+      let seed = sessionStorage.getItem("sample_seed");
+      if (!seed) {
+        seed = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        sessionStorage.setItem("sample_seed", seed);
+      }
+      const response = await axios.get(`${API}/questions/sample`, { params: { seed } });
       setQuestions(response.data.questions);
       setTimeLeft(response.data.time_limit);
       setLoading(false);
@@ -63,6 +69,7 @@ const SampleTest = () => {
         time_taken: 900 - timeLeft,
       });
 
+      sessionStorage.removeItem("sample_seed");
       sessionStorage.setItem(`results_${response.data.attempt_id}`, JSON.stringify(response.data));
       navigate(`/results/${response.data.attempt_id}`);
     } catch (error) {
@@ -124,7 +124,13 @@ const StudyMaterials = () => {
                         <Button
                           size="sm"
                           variant="outline"
-                          onClick={() => window.open(material.file_url, "_blank")}
+                          onClick={() =>
+                            // Uploaded files are served by the backend under /api
+                            window.open(
+                              material.file_url.startsWith("/") ? `${BACKEND_URL}${material.file_url}` : material.file_url,
+                              "_blank"
+                            )
+                          }
                           className="gap-2"
                         >
                           <Download className="w-4 h-4" />
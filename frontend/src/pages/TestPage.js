@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
@@ -22,6 +22,11 @@ const TestPage = () => {
   const [timeLeft, setTimeLeft] = useState(10800);
   const [loading, setLoading] = useState(true);
   const [hasAccess, setHasAccess] = useState(false);
+  // Exam session: answers are autosaved to the server in small patches
+  const sessionId = useRef(null);
+  const pendingAnswers = useRef({});
+  const patchSeq = useRef(0);
+  const autosaveTimer = useRef(null);
 
   useEffect(() => {
     checkAccessAndFetchQuestions();
@@ -73,6 +78,7 @@ const TestPage = () => {
       setTamilQuestions(response.data.tamil_questions);
       setPhysicsQuestions(response.data.physics_questions);
       setTimeLeft(response.data.time_limit);
+      await startOrResumeSession();
       setLoading(false);
     } catch (error) {
       toast.error("Failed to load questions");
@@ -80,11 +86,79 @@ const TestPage = () => {
     }
   };
 
+  const startOrResumeSession = async () => {
+    const user = JSON.parse(localStorage.getItem("user"));
+    try {
+      const savedId = sessionStorage.getItem("exam_session_id");
+      if (savedId) {
+        try {
+          const resumed = await axios.get(`${API}/exam/sessions/${savedId}`);
+          if (resumed.data.status === "active") {
+            sessionId.current = savedId;
+            patchSeq.current = resumed.data.seq;
+            setAnswers(resumed.data.answers);
+            setTimeLeft(resumed.data.time_left);
+            return;
+          }
+        } catch (error) {
+          // Unknown or expired session: start a new one
+        }
+      }
+      const started = await axios.post(`${API}/exam/sessions`, { user_id: user.id, test_type: "full" });
+      sessionId.current = started.data.session_id;
+      sessionStorage.setItem("exam_session_id", started.data.session_id);
+    } catch (error) {
+      // Without a session the test still works; answers are sent on submit
+      sessionId.current = null;
+    }
+  };
+
+  const flushAnswers = async () => {
+    clearTimeout(autosaveTimer.current);
+    const changes = pendingAnswers.current;
+    if (!sessionId.current || Object.keys(changes).length === 0) return;
+    pendingAnswers.current = {};
+    patchSeq.current += 1;
+    try {
+      await axios.patch(`${API}/exam/sessions/${sessionId.current}/answers`, {
+        seq: patchSeq.current,
+        answers: changes,
+      });
+    } catch (error) {
+      // Put the changes back (newer edits win) and retry with the next autosave
+      pendingAnswers.current = { ...changes, ...pendingAnswers.current };
+      throw error;
+    }
+  };
+
   const handleAnswerChange = (questionId, answer) => {
     setAnswers({ ...answers, [questionId]: answer });
+    pendingAnswers.current[questionId] = answer;
+    clearTimeout(autosaveTimer.current);
+    autosaveTimer.current = setTimeout(() => flushAnswers().catch(() => {}), 2000);
   };
 
   const handleSubmit = async () => {
+    if (sessionId.current) {
+      // No fallback to /test/submit here: if the submit went through but the response was
+      // lost, a second submit would record the attempt twice. Retrying this one is safe.
+      try {
+        await flushAnswers();
+        const response = await axios.post(`${API}/exam/sessions/${sessionId.current}/submit`);
+        sessionStorage.removeItem("exam_session_id");
+        sessionStorage.setItem(`results_${response.data.attempt_id}`, JSON.stringify(response.data));
+        navigate(`/results/${response.data.attempt_id}`);
+      } catch (error) {
+        if (error.response?.status === 409) {
+          sessionStorage.removeItem("exam_session_id");
+          toast.error("This test has already been submitted");
+        } else {
+          toast.error("Failed to submit test, please try again");
+        }
+      }
+      return;
+    }
+    // No server-side session was started: send every answer in one request
     try {
       const answersArray = Object.keys(answers).map((questionId) => ({
         question_id: questionId,
@@ -97,6 +171,7 @@ const TestPage = () => {
         time_taken: 10800 - timeLeft,
       });
 
+      sessionStorage.removeItem("exam_session_id");
       sessionStorage.setItem(`results_${response.data.attempt_id}`, JSON.stringify(response.data));
       navigate(`/results/${response.data.attempt_id}`);
     } catch (error) {
@@ -0,0 +1,167 @@
+"""
+JSON serialization benchmark: FastAPI's default path vs. orjson
+
+Builds payloads shaped like three large responses and serializes each one
+three ways:
+
+    default     jsonable_encoder + stdlib json (what JSONResponse did)
+    encoder     jsonable_encoder + orjson (router default_response_class only)
+    direct      orjson on the returned dict (route returns FastJSONResponse)
+
+For each it reports time per response, bytes out, and the peak memory
+allocated while producing one response (tracemalloc).
+
+Usage:
+    python tests/bench_json.py --repeat 200
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from fast_json import dumps  # noqa: E402
+
+LABELS = "ABCD"
+TAMIL = "பின்வருவனவற்றுள் சரியான விடையைத் தேர்ந்தெடுக்கவும்"
+
+
+def make_questions():
+    questions = []
+    for subject, part, count, marks in (("tamil", "A", 30, 2), ("physics", "B", 100, 1.5)):
+        for n in range(1, count + 1):
+            questions.append({
+                "id": str(uuid.uuid4()),
+                "question_number": n,
+                "question_text": f"{TAMIL} {n}" if subject == "tamil" else f"A body of mass {n} kg moves with velocity v. Find its momentum.",
+                "options": [{"label": label, "text": f"{TAMIL[:20]} {label}" if subject == "tamil" else f"option {label}"} for label in LABELS],
+                "correct_answer": random.choice(LABELS),
+                "marks": marks,
+                "subject": subject,
+                "part": part,
+                "set_number": 1,
+            })
+    return questions
+
+
+def full_test_payload(questions):
+    strip = [{k: v for k, v in q.items() if k != "correct_answer"} for q in questions]
+    return {
+        "tamil_questions": [q for q in strip if q["subject"] == "tamil"],
+        "physics_questions": [q for q in strip if q["subject"] == "physics"],
+        "total_marks": 200,
+        "time_limit": 10800,
+    }
+
+
+def submit_payload(questions):
+    detailed = [{
+        "question_id": q["id"],
+        "question_number": q["question_number"],
+        "question_text": q["question_text"],
+        "selected_answer": random.choice(LABELS),
+        "correct_answer": q["correct_answer"],
+        "is_correct": random.random() < 0.5,
+        "marks": q["marks"],
+        "options": q["options"],
+    } for q in questions]
+    return {
+        "attempt_id": str(uuid.uuid4()),
+        "score": 131.5,
+        "total_marks": 200.0,
+        "percentage": 65.75,
+        "subject_scores": {"tamil": {"score": 40.0, "total_marks": 50.0, "correct": 22, "answered": 30},
+                           "physics": {"score": 91.5, "total_marks": 150.0, "correct": 61, "answered": 100}},
+        "part_scores": {"A": {"score": 40.0, "total_marks": 50.0, "correct": 22, "answered": 30},
+                        "B": {"score": 91.5, "total_marks": 150.0, "correct": 61, "answered": 100}},
+        "detailed_results": detailed,
+    }
+
+
+def attempts_payload(questions, count=100):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    attempts = [{
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "test_type": "full",
+        "answers": [{"question_id": q["id"], "selected_answer": random.choice(LABELS)} for q in questions],
+        "score": 120.5,
+        "total_marks": 200.0,
+        "time_taken": 9000,
+        "submitted_at": (start + timedelta(minutes=i)).isoformat(),
+    } for i in range(count)]
+    return {"attempts": attempts, "next_cursor": "eyJ2IjpbIjIwMjUtMDEtMDEiLCJhYmMiXX0"}
+
+
+def default_path(payload):
+    # Starlette JSONResponse.render after FastAPI's jsonable_encoder
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encoder_path(payload):
+    return orjson.dumps(jsonable_encoder(payload), option=orjson.OPT_NON_STR_KEYS)
+
+
+def direct_path(payload):
+    return dumps(payload)
+
+
+PATHS = (("default", default_path), ("encoder", encoder_path), ("direct", direct_path))
+
+
+def measure(func, payload, repeat):
+    func(payload)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func(payload)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    func(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, len(body), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    questions = make_questions()
+    endpoints = (
+        ("GET /questions/full", full_test_payload(questions)),
+        ("POST /test/submit", submit_payload(questions)),
+        ("GET /admin/test-attempts", attempts_payload(questions)),
+    )
+
+    for name, payload in endpoints:
+        # Every path must produce the same JSON
+        reference = json.loads(default_path(payload))
+        assert all(json.loads(func(payload)) == reference for _, func in PATHS)
+
+        print(name)
+        base = None
+        for label, func in PATHS:
+            elapsed, size, peak = measure(func, payload, args.repeat)
+            base = base or elapsed
+            print(f"  {label:<8} {elapsed * 1000:8.3f} ms  {size / 1024:7.1f} KiB out  "
+                  f"peak alloc {peak / 1024:8.1f} KiB  speedup {base / elapsed:5.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Login burst benchmark
+
+Fires N concurrent logins at a running backend while a probe keeps calling
+a cheap route (/api/stats), then reports latency percentiles for both. With
+bcrypt on the event loop the probe latency climbs to roughly
+N * bcrypt-time / workers; with the hashing pool it should stay flat.
+
+Usage:
+    python tests/bench_login.py --url http://localhost:8001 --concurrency 200
+
+Run it once against the old build and once against the new one to compare.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, latencies, statuses):
+    ms = [v * 1000 for v in latencies]
+    codes = ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items()))
+    print(
+        f"{name:<8} n={len(ms):<5} p50={percentile(ms, 50):8.1f}ms "
+        f"p95={percentile(ms, 95):8.1f}ms p99={percentile(ms, 99):8.1f}ms "
+        f"max={max(ms, default=0):8.1f}ms  [{codes}]"
+    )
+
+
+async def timed(client, method, path, latencies, statuses, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, path, **kwargs)
+    latencies.append(time.perf_counter() - start)
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def probe(client, stop, latencies, statuses, interval):
+    while not stop.is_set():
+        await timed(client, "GET", "/api/stats", latencies, statuses)
+        await asyncio.sleep(interval)
+
+
+async def run(url, concurrency, probe_interval):
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+    limits = httpx.Limits(max_connections=concurrency + 10)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        response = await client.post("/api/auth/register", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": password,
+        })
+        response.raise_for_status()
+
+        # Idle baseline for the probe route
+        idle, idle_statuses = [], {}
+        for _ in range(20):
+            await timed(client, "GET", "/api/stats", idle, idle_statuses)
+
+        login, login_statuses = [], {}
+        busy, busy_statuses = [], {}
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, busy, busy_statuses, probe_interval))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            timed(client, "POST", "/api/auth/login", login, login_statuses,
+                  json={"username": username, "password": password})
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe_task
+
+    print(f"{concurrency} concurrent logins in {elapsed:.2f}s ({concurrency / elapsed:.1f} logins/s)")
+    report("login", login, login_statuses)
+    report("idle", idle, idle_statuses)
+    report("probe", busy, busy_statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.probe_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Scoring benchmark: per-answer dict loop vs. the compiled AnswerKey
+
+Builds a synthetic 130-question full test (30 Tamil part A + 100 physics
+part B) and scores random submissions three ways:
+
+    loop        the original submit_test loop (dict lookup per answer)
+    engine      AnswerKey.score per submission
+    batch       AnswerKey.score_batch over all submissions at once
+
+Each is timed with and without building detailed_results.
+
+Usage:
+    python tests/bench_scoring.py --submissions 2000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from scoring import AnswerKey  # noqa: E402
+
+LABELS = "ABCD"
+
+
+def make_questions():
+    questions = []
+    for i in range(1, 31):
+        questions.append(("tamil", "A", 2 if i <= 20 else 1, i))
+    for i in range(1, 101):
+        questions.append(("physics", "B", 1.5, i))
+    return [{
+        "id": f"{subject}_{n}",
+        "question_number": n,
+        "question_text": f"{subject} question {n}",
+        "options": [{"label": label, "text": f"option {label}"} for label in LABELS],
+        "correct_answer": random.choice(LABELS),
+        "marks": marks,
+        "subject": subject,
+        "part": part,
+    } for subject, part, marks, n in questions]
+
+
+def make_submissions(questions, count):
+    return [
+        [(q["id"], random.choice(LABELS)) for q in questions if random.random() < 0.9]
+        for _ in range(count)
+    ]
+
+
+def legacy_score(questions_by_id, answers, detailed):
+    # The pre-engine submit_test loop
+    score = 0
+    total_marks = 0
+    detailed_results = []
+    for question_id, selected_answer in answers:
+        question = questions_by_id.get(question_id)
+        if question:
+            total_marks += question['marks']
+            is_correct = selected_answer == question['correct_answer']
+            if is_correct:
+                score += question['marks']
+            if detailed:
+                detailed_results.append({
+                    "question_id": question_id,
+                    "question_number": question['question_number'],
+                    "question_text": question['question_text'],
+                    "selected_answer": selected_answer,
+                    "correct_answer": question['correct_answer'],
+                    "is_correct": is_correct,
+                    "marks": question['marks'],
+                    "options": question['options']
+                })
+    return score, total_marks, detailed_results
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms total  {elapsed / count * 1e6:8.1f} µs/submission")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    questions = make_questions()
+    submissions = make_submissions(questions, args.submissions)
+    count = len(submissions)
+
+    compile_start = time.perf_counter()
+    answer_key = AnswerKey(questions)
+    print(f"compiled {len(questions)} questions in {(time.perf_counter() - compile_start) * 1000:.2f} ms\n")
+
+    # The old route fetched the questions and built the lookup on every submission
+    def loop(detailed):
+        for answers in submissions:
+            questions_by_id = {q['id']: q for q in questions}
+            legacy_score(questions_by_id, answers, detailed)
+
+    def engine(detailed):
+        for answers in submissions:
+            result = answer_key.score(answers)
+            if detailed:
+                answer_key.detailed_results(result)
+
+    def batch():
+        answer_key.score_batch(submissions)
+
+    # Sanity check: both paths agree on every score
+    for answers in submissions[:200]:
+        expected, expected_total, _ = legacy_score({q['id']: q for q in questions}, answers, False)
+        result = answer_key.score(answers)
+        assert abs(result.score - expected) < 1e-9 and abs(result.total_marks - expected_total) < 1e-9
+
+    print("scores only")
+    base = timed("  loop", count, lambda: loop(False))
+    fast = timed("  engine", count, lambda: engine(False))
+    bulk = timed("  batch", count, batch)
+    print(f"  speedup: engine {base / fast:.1f}x, batch {base / bulk:.1f}x\n")
+
+    print("with detailed_results")
+    base = timed("  loop", count, lambda: loop(True))
+    fast = timed("  engine", count, lambda: engine(True))
+    print(f"  speedup: engine {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
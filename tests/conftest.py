@@ -0,0 +1,61 @@
+"""
+Shared fixtures
+
+The tests run against mongomock-motor, an in-memory stand-in for Motor,
+so they need no mongod. Async tests use anyio's pytest plugin
+(pytest.mark.anyio) on the asyncio backend.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """An empty database of its own for each test."""
+    return mongomock_motor.AsyncMongoMockClient()[f"test_{uuid.uuid4().hex[:8]}"]
+
+
+@pytest.fixture(scope="session")
+async def server():
+    """backend/server.py started on mongomock, shared by the whole session."""
+    import motor.motor_asyncio
+
+    scratch = tempfile.mkdtemp(prefix="server-tests-")
+    os.environ.setdefault("MONGO_URL", "mongodb://mongomock")
+    os.environ.setdefault("DB_NAME", "server_tests")
+    os.environ["ATTEMPT_SPOOL_DIR"] = os.path.join(scratch, "spool")
+    os.environ["CONTENT_STORE_DIR"] = os.path.join(scratch, "content")
+    os.environ["INVALIDATION_BUS"] = "none"
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    import server
+
+    await server.app.router.startup()
+    try:
+        yield server
+    finally:
+        await server.app.router.shutdown()
+
+
+@pytest.fixture
+async def client(server):
+    import httpx
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -0,0 +1,303 @@
+"""
+Exam-start stampede load test
+
+Replays the traffic of one exam sitting. Users arrive over --ramp seconds;
+each one registers, logs in, downloads the full paper, starts an exam
+session and autosaves answers --patches times. Once every user is
+seated, they all submit within a --submit-window second window. The
+report gives, per endpoint, request count, errors, throughput and
+p50/p95/p99/max latency.
+
+Targets:
+    --url http://localhost:8001    a running backend (with a real mongod), started
+                                   with RATE_LIMIT_STORE=off: all the simulated
+                                   students come from one address
+    --in-process                   imports backend/server.py with Motor swapped
+                                   for mongomock_motor (pip install
+                                   mongomock-motor); no server or database needed.
+                                   Client and app share one event loop, so
+                                   use it to compare builds, not to size hardware.
+
+The full paper must have questions. --seed-set N first imports a synthetic
+130-question set N through /api/admin/questions/bulk (in-process mode always
+seeds one).
+
+Regression mode:
+    python tests/loadtest.py --in-process --users 200 --save-baseline baseline.json
+    python tests/loadtest.py --in-process --users 200 --baseline baseline.json --tolerance 0.25
+Against a baseline, a route fails when its p95 is more than --tolerance
+slower and also more than --min-delta-ms slower (so fast routes don't fail
+on noise). --max-p95 ROUTE=MS sets absolute limits, and --max-error-rate
+caps failed requests. Any failure exits with status 1.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+LABELS = "ABCD"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        self.first: Dict[str, float] = {}
+        self.last: Dict[str, float] = {}
+
+    async def request(self, client, name, method, path, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0  # 0 = transport error/timeout
+        end = time.perf_counter()
+        self.latencies.setdefault(name, []).append(end - start)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+        self.first.setdefault(name, start)
+        self.last[name] = end
+        return response
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, latencies in self.latencies.items():
+            ms = [v * 1000 for v in latencies]
+            statuses = self.statuses[name]
+            errors = sum(n for code, n in statuses.items() if code == 0 or code >= 400)
+            span = max(self.last[name] - self.first[name], 1e-9)
+            result[name] = {
+                "count": len(ms),
+                "errors": errors,
+                "rps": round(len(ms) / span, 1),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "max_ms": round(max(ms), 2),
+                "statuses": {str(code): n for code, n in sorted(statuses.items())},
+            }
+        return result
+
+
+def synthetic_set(set_number):
+    questions = []
+    for subject, part, count in (("tamil", "A", 30), ("physics", "B", 100)):
+        for n in range(1, count + 1):
+            marks = (2 if n <= 20 else 1) if subject == "tamil" else 1.5
+            questions.append({
+                "id": f"{subject}_s{set_number}_{n}",
+                "question_number": n,
+                "question_text": f"Load test {subject} question {n}",
+                "options": [{"label": label, "text": f"option {label}"} for label in LABELS],
+                "correct_answer": random.choice(LABELS),
+                "marks": marks,
+                "subject": subject,
+                "part": part,
+                "set_number": set_number,
+            })
+    return questions
+
+
+async def student(client, rec: Recorder, index: int, args, seated: asyncio.Event, seated_count: List[int],
+                  submit_at: asyncio.Event):
+    user_id, session_id, question_ids = None, None, []
+    try:
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        username = f"load_{args.run_id}_{index}"
+        password = "load-test-password"
+
+        response = await rec.request(client, "POST /api/auth/register", "POST", "/api/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": password})
+        user_id = response.json()["id"] if response is not None and response.status_code == 200 else None
+        response = await rec.request(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                     json={"username": username, "password": password})
+        if response is not None and response.status_code == 200:
+            user_id = response.json().get("id", user_id)
+
+        response = await rec.request(client, "GET /api/questions/full", "GET", "/api/questions/full",
+                                     headers={"Accept-Encoding": "br, gzip"})
+        if response is not None and response.status_code == 200:
+            paper = response.json()
+            question_ids = [q["id"] for q in paper["tamil_questions"] + paper["physics_questions"]]
+
+        response = await rec.request(client, "POST /api/exam/sessions", "POST", "/api/exam/sessions",
+                                     json={"user_id": user_id, "test_type": "full"})
+        session_id = response.json()["session_id"] if response is not None and response.status_code == 200 else None
+
+        if session_id and question_ids:
+            # Answer the paper in --patches slices, pausing between them like a student working
+            per_patch = max(1, len(question_ids) // args.patches)
+            for seq in range(1, args.patches + 1):
+                await asyncio.sleep(random.uniform(0, args.think))
+                batch = question_ids[(seq - 1) * per_patch: seq * per_patch]
+                await rec.request(client, "PATCH /api/exam/sessions/{id}/answers", "PATCH",
+                                  f"/api/exam/sessions/{session_id}/answers",
+                                  json={"seq": seq, "answers": {qid: random.choice(LABELS) for qid in batch}})
+    finally:
+        # Counted even if this student failed, so the others are not left waiting for the submit
+        seated_count[0] += 1
+        if seated_count[0] == args.users:
+            seated.set()
+    await submit_at.wait()
+    await asyncio.sleep(random.uniform(0, args.submit_window))
+    if session_id:
+        await rec.request(client, "POST /api/exam/sessions/{id}/submit", "POST",
+                          f"/api/exam/sessions/{session_id}/submit")
+    else:
+        # No session (e.g. it failed to start): fall back to the one-shot submit
+        await rec.request(client, "POST /api/test/submit", "POST", "/api/test/submit", json={
+            "user_id": user_id, "test_type": "full", "time_taken": 10800,
+            "answers": [{"question_id": qid, "selected_answer": random.choice(LABELS)} for qid in question_ids]})
+
+
+async def stampede(client, args) -> Recorder:
+    rec = Recorder()
+    if args.seed_set:
+        response = await client.post("/api/admin/questions/bulk", json=synthetic_set(args.seed_set))
+        response.raise_for_status()
+
+    seated, submit_at = asyncio.Event(), asyncio.Event()
+    seated_count = [0]
+    tasks = [asyncio.create_task(student(client, rec, i, args, seated, seated_count, submit_at))
+             for i in range(args.users)]
+    start = time.perf_counter()
+    await seated.wait()
+    seated_at = time.perf_counter()
+    submit_at.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    end = time.perf_counter()
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        print(f"{len(failed)} students failed; first error: {failed[0]!r}")
+    total = sum(len(v) for v in rec.latencies.values())
+    print(f"{args.users} users: seated in {seated_at - start:.1f}s, submits done {end - seated_at:.1f}s later; "
+          f"{total} requests, {total / (end - start):.1f} req/s overall")
+    return rec
+
+
+async def run_remote(args) -> Recorder:
+    limits = httpx.Limits(max_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        return await stampede(client, args)
+
+
+async def run_in_process(args) -> Recorder:
+    try:
+        import mongomock_motor
+    except ImportError:
+        sys.exit("--in-process needs mongomock-motor: pip install mongomock-motor")
+    import motor.motor_asyncio
+
+    scratch = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("MONGO_URL", "mongodb://mongomock")
+    os.environ.setdefault("DB_NAME", "loadtest")
+    os.environ["ATTEMPT_SPOOL_DIR"] = os.path.join(scratch, "spool")
+    os.environ["CONTENT_STORE_DIR"] = os.path.join(scratch, "content")
+    # Every simulated student shares one client address
+    os.environ.setdefault("RATE_LIMIT_STORE", "off")
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    args.seed_set = args.seed_set or 1
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            return await stampede(client, args)
+    finally:
+        await server.app.router.shutdown()
+
+
+def print_report(summary):
+    print(f"{'endpoint':<42} {'n':>6} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, s in sorted(summary.items()):
+        print(f"{name:<42} {s['count']:>6} {s['errors']:>5} {s['rps']:>8.1f} {s['p50_ms']:>7.1f}ms "
+              f"{s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms {s['max_ms']:>7.1f}ms")
+
+
+def regressions(summary, args) -> List[str]:
+    failures = []
+    total = sum(s["count"] for s in summary.values())
+    errors = sum(s["errors"] for s in summary.values())
+    if total and errors / total > args.max_error_rate:
+        failures.append(f"error rate {errors / total:.2%} > {args.max_error_rate:.2%}")
+
+    for limit in args.max_p95:
+        route, _, ms = limit.rpartition("=")
+        if route in summary and summary[route]["p95_ms"] > float(ms):
+            failures.append(f"{route}: p95 {summary[route]['p95_ms']}ms > limit {ms}ms")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["endpoints"]
+        for route, s in summary.items():
+            if route not in baseline:
+                continue
+            before, after = baseline[route]["p95_ms"], s["p95_ms"]
+            if after > before * (1 + args.tolerance) and after - before > args.min_delta_ms:
+                failures.append(f"{route}: p95 {before}ms -> {after}ms (+{(after / before - 1):.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8001")
+    target.add_argument("--in-process", action="store_true")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users arrive")
+    parser.add_argument("--patches", type=int, default=5, help="autosave patches per user")
+    parser.add_argument("--think", type=float, default=0.5, help="max seconds between patches")
+    parser.add_argument("--submit-window", type=float, default=2.0, help="seconds in which everyone submits")
+    parser.add_argument("--seed-set", type=int, default=0, help="import a synthetic set with this number first")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--random-seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--save-baseline", help="write this run as a baseline")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--max-p95", action="append", default=[], metavar="ROUTE=MS")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+    args.run_id = uuid.uuid4().hex[:8]
+    rec = asyncio.run(run_in_process(args) if args.in_process else run_remote(args))
+    summary = rec.summary()
+    print_report(summary)
+
+    report = {"users": args.users, "target": "in-process" if args.in_process else args.url, "endpoints": summary}
+    for path in (args.json, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2))
+
+    failures = regressions(summary, args)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Multi-worker cache coherence check
+
+Starts backend/serve.py with --workers processes against one database
+and checks that a change made through one worker reaches the caches of
+all the others:
+
+    questions      an admin edit changes the full-paper ETag on every worker
+    entitlements   a signed reconcile webhook grants access on every worker
+    materials      a new study material is listed by every worker
+    exam session   autosaves spread over the workers all survive the submit
+
+Every probe is a burst of requests on fresh connections, so the kernel
+spreads them over the workers. The caches are primed first (so a stale
+entry would be served), then the change is made and the burst repeated
+until every response agrees. The report gives how long that took.
+Passing only means the workers agreed before --timeout; with
+4 workers and 16-request bursts, a worker the kernel never picked would
+go unnoticed.
+
+Needs a real mongod (MONGO_URL). A throwaway database is created and
+dropped afterwards.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python tests/multiworker_check.py --workers 4
+    MONGO_URL=... python tests/multiworker_check.py --bus unix     # force the no-replica-set transport
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from loadtest import LABELS, synthetic_set
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+class Check:
+    def __init__(self, url, burst, timeout):
+        self.url = url
+        self.burst = burst
+        self.timeout = timeout
+        self.failures = []
+
+    async def request(self, method, path, **kwargs):
+        # A new connection per request, so consecutive requests can land on different workers
+        async with httpx.AsyncClient(base_url=self.url, timeout=30) as client:
+            response = await client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def sample(self, path, read):
+        responses = await asyncio.gather(*[self.request("GET", path) for _ in range(self.burst)])
+        return [read(r) for r in responses]
+
+    async def converge(self, name, path, read, expected):
+        """Repeat the burst until every response reads as `expected`; returns seconds taken."""
+        start = time.perf_counter()
+        while True:
+            values = await self.sample(path, read)
+            stale = sum(1 for v in values if v != expected)
+            elapsed = time.perf_counter() - start
+            if not stale:
+                print(f"  {name:<14} consistent after {elapsed * 1000:7.1f} ms")
+                return elapsed
+            if elapsed > self.timeout:
+                self.failures.append(f"{name}: {stale}/{len(values)} responses still stale after {self.timeout}s")
+                print(f"  {name:<14} FAILED ({stale}/{len(values)} stale)")
+                return elapsed
+            await asyncio.sleep(0.05)
+
+
+async def check_questions(check):
+    path = "/api/questions/full?set_number=1"
+    etag = lambda r: r.headers.get("etag")
+    before = await check.sample(path, etag)
+    if len(set(before)) != 1:
+        check.failures.append(f"questions: workers disagree before any change: {set(before)}")
+    await check.request("PUT", "/api/admin/questions/physics_s1_1",
+                        json={"question_text": f"Edited {uuid.uuid4().hex[:8]}"})
+    after = (await check.request("GET", path)).headers.get("etag")
+    if after == before[0]:
+        check.failures.append("questions: ETag unchanged on the worker that was asked")
+    await check.converge("questions", path, etag, after)
+
+
+async def check_entitlements(check, secret):
+    user = (await check.request("POST", "/api/auth/register", json={
+        "username": f"mw_{uuid.uuid4().hex[:8]}", "email": f"mw_{uuid.uuid4().hex[:8]}@example.com",
+        "password": "multiworker-password"})).json()
+    path = f"/api/payment/check-access/{user['id']}/2"
+    has_access = lambda r: r.json()["has_access"]
+    await check.sample(path, has_access)  # every worker caches "no access"
+
+    event = {"event": "payment.captured", "payload": {"payment": {"entity": {
+        "id": f"pay_{uuid.uuid4().hex[:14]}", "order_id": f"order_{uuid.uuid4().hex[:14]}",
+        "amount": 10000, "notes": {"user_id": user["id"], "set_number": "2"}}}}}
+    body = json.dumps(event).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    await check.request("POST", "/api/payment/reconcile", content=body, headers={
+        "Content-Type": "application/json", "X-Razorpay-Signature": signature})
+    await check.converge("entitlements", path, has_access, True)
+
+
+async def check_materials(check):
+    path = "/api/study-materials?subject=physics"
+    count = lambda r: len(r.json()["materials"])
+    before = await check.sample(path, count)
+    await check.request("POST", "/api/admin/study-materials", json={
+        "title": "Multi-worker check", "description": "", "file_type": "pdf", "subject": "physics"})
+    await check.converge("materials", path, count, before[0] + 1)
+
+
+async def check_exam_session(check):
+    session = (await check.request("POST", "/api/exam/sessions", json={"test_type": "full", "set_number": 1})).json()
+    path = f"/api/exam/sessions/{session['session_id']}"
+    question_ids = [f"physics_s1_{n}" for n in range(1, 41)]
+    # One answer per request, each on a new connection, so the session moves between workers
+    for seq, question_id in enumerate(question_ids, 1):
+        await check.request("PATCH", path + "/answers", json={"seq": seq, "answers": {question_id: LABELS[seq % 4]}})
+    start = time.perf_counter()
+    await check.request("POST", path + "/submit")
+    elapsed = time.perf_counter() - start
+    saved = (await check.request("GET", path)).json()["answers"]
+    missing = [q for q in question_ids if q not in saved]
+    if missing:
+        check.failures.append(f"exam session: {len(missing)}/{len(question_ids)} answers lost on submit")
+        print(f"  {'exam session':<14} FAILED ({len(missing)} answers lost)")
+    else:
+        print(f"  {'exam session':<14} all {len(question_ids)} answers kept (submit {elapsed * 1000:.1f} ms)")
+
+
+async def wait_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"serve.py exited with status {process.returncode}")
+            try:
+                if (await client.get("/api/stats")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit("Workers did not become ready")
+
+
+async def run(args, url, secret):
+    check = Check(url, args.burst or 4 * args.workers, args.timeout)
+    response = await check.request("POST", "/api/admin/questions/bulk", json=synthetic_set(1))
+    print(f"Seeded set 1: {response.json()}")
+    await asyncio.sleep(1)  # let every worker finish reloading the bank after the seed
+    print(f"{args.workers} workers, bursts of {check.burst}:")
+    await check_questions(check)
+    await check_entitlements(check, secret)
+    await check_materials(check)
+    await check_exam_session(check)
+    return check.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--bus", choices=["auto", "changestream", "unix"], default="auto")
+    parser.add_argument("--burst", type=int, default=0, help="requests per probe (default: 4 per worker)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds allowed for the workers to agree")
+    args = parser.parse_args()
+
+    if not os.environ.get("MONGO_URL"):
+        raise SystemExit("Set MONGO_URL to a running mongod")
+    db_name = f"multiworker_check_{uuid.uuid4().hex[:8]}"
+    secret = uuid.uuid4().hex
+    scratch = tempfile.mkdtemp(prefix="multiworker-")
+    env = {
+        **os.environ,
+        "DB_NAME": db_name,
+        "RAZORPAY_WEBHOOK_SECRET": secret,
+        "ATTEMPT_SPOOL_DIR": os.path.join(scratch, "spool"),
+        "CONTENT_STORE_DIR": os.path.join(scratch, "content"),
+        "INVALIDATION_SOCKET_DIR": os.path.join(scratch, "sockets"),
+        "MONGO_MIN_POOL_SIZE": "2",
+    }
+    url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "serve.py"), "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--bus", args.bus, "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+    try:
+        asyncio.run(wait_ready(url, process))
+        failures = asyncio.run(run(args, url, secret))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        from pymongo import MongoClient
+        with MongoClient(os.environ["MONGO_URL"]) as client:
+            client.drop_database(db_name)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
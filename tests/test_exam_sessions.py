@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from exam_sessions import SUBMITTED, ExamSessionStore, SessionClosed, SessionNotFound
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def collection(db):
+    return db.exam_sessions
+
+
+def store(collection, **kwargs):
+    return ExamSessionStore(collection, handoff=0, **kwargs)
+
+
+async def test_patches_apply_in_sequence_order(collection):
+    sessions = store(collection)
+    session = await sessions.create("user-1", "full", 1, 3600)
+    await sessions.patch(session.id, 2, {"q1": "B", "q2": "C"})
+    # A retried or overtaken patch never rolls an answer back
+    await sessions.patch(session.id, 1, {"q1": "A"})
+    await sessions.patch(session.id, 2, {"q1": "D"})
+    await sessions.patch(session.id, 3, {"q2": None, "$where": "A", "a.b": "A"})
+    assert session.answers == {"q1": "B"}
+    assert session.seq == 3
+
+
+async def test_flush_saves_answers_for_another_worker(collection):
+    sessions = store(collection)
+    session = await sessions.create("user-1", "full", 1, 3600)
+    await sessions.patch(session.id, 1, {"q1": "A", "q2": "B"})
+    await sessions.flush()
+    await sessions.patch(session.id, 2, {"q2": None})
+    await sessions.flush()
+
+    loaded = await store(collection).get(session.id)
+    assert loaded.answers == {"q1": "A"} and loaded.seq == 2
+
+
+async def test_finalize_returns_answers_once(collection):
+    sessions = store(collection)
+    session = await sessions.create("user-1", "full", 1, 3600)
+    await sessions.patch(session.id, 1, {"q1": "A"})
+
+    submitted = await sessions.finalize(session.id)
+    assert submitted.answers == {"q1": "A"} and submitted.status == SUBMITTED
+    with pytest.raises(SessionClosed):
+        await sessions.finalize(session.id)
+    with pytest.raises(SessionClosed):
+        await sessions.patch(session.id, 2, {"q2": "B"})
+    assert (await collection.find_one({"id": session.id}))["answers"] == {"q1": "A"}
+
+
+async def test_concurrent_submits_on_two_workers_score_once(collection):
+    first, second = store(collection), store(collection)
+    session = await first.create("user-1", "full", 1, 3600)
+    await first.patch(session.id, 1, {"q1": "A"})
+    await first.flush()
+    await second.get(session.id)  # both workers now hold it as active
+
+    results = await asyncio.gather(first.finalize(session.id), second.finalize(session.id),
+                                   return_exceptions=True)
+    closed = [r for r in results if isinstance(r, SessionClosed)]
+    assert len(closed) == 1
+    assert [r.answers for r in results if not isinstance(r, Exception)] == [{"q1": "A"}]
+
+
+async def test_handoff_keeps_answers_from_both_workers(collection):
+    first, second = store(collection), store(collection)
+    second.on_claim = first.release  # what the invalidation bus does across processes
+    session = await first.create("user-1", "full", 1, 3600)
+    await first.patch(session.id, 1, {"q1": "A"})  # in memory only, not flushed
+    await second.patch(session.id, 2, {"q2": "B"})
+
+    submitted = await second.finalize(session.id)
+    assert submitted.answers == {"q1": "A", "q2": "B"}
+
+
+async def test_patch_after_deadline_is_refused(collection):
+    sessions = store(collection, grace=0)
+    session = await sessions.create("user-1", "full", 1, 0)
+    await asyncio.sleep(0.01)
+    with pytest.raises(SessionClosed):
+        await sessions.patch(session.id, 1, {"q1": "A"})
+    # A late submit still scores what was saved in time
+    assert (await sessions.finalize(session.id)).answers == {}
+
+
+async def test_unknown_session(collection):
+    with pytest.raises(SessionNotFound):
+        await store(collection).get("missing")
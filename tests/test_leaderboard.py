@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from leaderboard import Leaderboard, ScoreHistogram
+
+pytestmark = pytest.mark.anyio
+
+
+def histogram(scores, capacity=1024):
+    board = ScoreHistogram(capacity=capacity)
+    for score in scores:
+        board.add(score)
+    return board
+
+
+def test_rank_and_percentile_with_ties():
+    board = histogram([10, 20, 20, 30, 0])
+    assert board.count == 5
+    assert [board.rank(s) for s in (30, 25, 20, 10, 0)] == [1, 2, 2, 4, 5]
+    assert [board.percentile(s) for s in (30, 20, 10, 0)] == [100.0, 80.0, 40.0, 20.0]
+    assert board.at_or_below(19.99) == 2
+
+
+def test_quantiles():
+    board = histogram([10, 20, 20, 30, 0])
+    assert board.quantile(0.2) == 0.0
+    assert board.quantile(0.21) == 10.0
+    assert board.quantile(0.5) == 20.0
+    assert board.quantile(0.9) == 30.0
+    assert board.quantile(1.0) == 30.0
+
+
+def test_growth_past_capacity_keeps_counts():
+    board = histogram([0.5, 1.5], capacity=4)
+    board.add(150.25)  # bucket 15025, far past the initial 4
+    board.add(2, n=3)
+    assert board.count == 6
+    assert [board.rank(s) for s in (150.25, 2, 1.5, 0.5)] == [1, 2, 5, 6]
+    assert board.at_or_below(10_000) == 6
+    assert board.quantile(1.0) == 150.25
+    assert board.distribution() == [
+        {"score": 0.5, "count": 1}, {"score": 1.5, "count": 1}, {"score": 2.0, "count": 3},
+        {"score": 150.25, "count": 1}]
+
+
+def test_hundredth_mark_resolution():
+    board = histogram([1 / 3, 0.5, 1, 1.01])
+    assert [board.rank(s) for s in (1.01, 1, 0.5, 0.33)] == [1, 2, 3, 4]
+    assert board.percentile(0.34) == 25.0
+
+
+def test_empty_board():
+    board = ScoreHistogram(capacity=1)
+    assert (board.percentile(10), board.quantile(0.5), board.distribution()) == (None, None, [])
+    assert board.rank(10) == 1
+
+
+async def test_reload_keeps_attempts_not_yet_in_mongo(db):
+    old = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    await db.test_attempts.insert_many(
+        [{"test_type": "full", "set_number": 1, "score": s, "submitted_at": old} for s in (10, 20)]
+        + [{"test_type": "full", "set_number": 1, "score": 5}])  # from before submitted_at was stored
+    leaderboard = Leaderboard(db.test_attempts, refresh_interval=0, settle=120)
+    assert await leaderboard.load() == 3
+
+    now = datetime.now(timezone.utc).isoformat()
+    assert leaderboard.record("full", 1, 15, now) == {"rank": 2, "out_of": 4, "percentile": 75.0}
+    await leaderboard.load()  # still spooled: kept
+    assert leaderboard.board("full", 1).count == 4
+
+    await db.test_attempts.insert_one({"test_type": "full", "set_number": 1, "score": 15, "submitted_at": now})
+    await leaderboard.load()  # written now, and not counted twice
+    assert leaderboard.board("full", 1).count == 4
+
+
+async def test_unaccepted_boards_are_not_kept(db):
+    leaderboard = Leaderboard(db.test_attempts, refresh_interval=0)
+    leaderboard.accept = lambda test_type, set_number: test_type == "full"
+    assert leaderboard.record("junk", 7, 10) == {"rank": None, "out_of": None, "percentile": None}
+    assert leaderboard.board("junk", 7) is None
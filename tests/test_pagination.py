@@ -0,0 +1,53 @@
+import pytest
+from pymongo import ASCENDING, DESCENDING
+
+from pagination import InvalidCursor, decode_cursor, fetch_page
+
+pytestmark = pytest.mark.anyio
+
+
+async def page_through(collection, sort, limit):
+    ids, cursor = [], None
+    while True:
+        docs, cursor = await fetch_page(collection, {}, sort, limit, cursor, {"_id": 0})
+        ids.extend(doc["id"] for doc in docs)
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+async def users(db):
+    docs = [{"id": f"u{i:02d}", "created_at": f"2025-01-{i // 2 + 1:02d}"} for i in range(12)]
+    # Rows from before created_at was recorded: null or missing
+    docs += [{"id": "u90", "created_at": None}, {"id": "u91"}]
+    await db.users.insert_many(docs)
+    return db.users
+
+
+@pytest.mark.parametrize("direction", [ASCENDING, DESCENDING])
+@pytest.mark.parametrize("limit", [1, 3, 5, 20])
+async def test_every_document_once_in_sort_order(users, direction, limit):
+    sort = [("created_at", direction), ("id", direction)]
+    expected = [doc["id"] async for doc in users.find({}).sort(sort)]
+
+    assert await page_through(users, sort, limit) == expected
+    assert len(expected) == 14
+
+
+async def test_last_page_has_no_cursor(users):
+    docs, cursor = await fetch_page(users, {}, [("id", ASCENDING)], 14)
+    assert len(docs) == 14 and cursor is None
+
+
+async def test_filter_is_kept_across_pages(users):
+    sort = [("created_at", DESCENDING), ("id", DESCENDING)]
+    query = {"created_at": {"$gte": "2025-01-04"}}
+    docs, cursor = await fetch_page(users, query, sort, 2)
+    more, _ = await fetch_page(users, query, sort, 10, cursor)
+    assert [d["id"] for d in docs + more] == ["u11", "u10", "u09", "u08", "u07", "u06"]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "WzFd", "eyJhIjogMX0="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, [("created_at", DESCENDING), ("id", DESCENDING)])
@@ -0,0 +1,45 @@
+import httpx
+import pytest
+
+from payment_gateway import GatewayUnavailable, RazorpayGateway
+
+pytestmark = pytest.mark.anyio
+
+
+def gateway(*outcomes):
+    """A gateway whose calls get the given outcomes in order: an exception class or a status code."""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, type):
+            raise outcome("simulated", request=request)
+        return httpx.Response(outcome, json={"id": "order_1"})
+
+    gw = RazorpayGateway("key", "secret", retries=2, backoff=0)
+    gw._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=gw.api_url)
+    return gw, calls
+
+
+@pytest.mark.parametrize("outcome", [httpx.ConnectError, httpx.ConnectTimeout, 429, 503])
+async def test_create_order_retries_when_the_gateway_did_not_act(outcome):
+    gw, calls = gateway(outcome, 200)
+    assert await gw.create_order({"amount": 100}) == {"id": "order_1"}
+    assert calls == ["POST", "POST"]
+
+
+@pytest.mark.parametrize("outcome", [httpx.ReadTimeout, httpx.RemoteProtocolError, 500, 502, 504])
+async def test_create_order_is_not_resent_once_it_may_have_landed(outcome):
+    gw, calls = gateway(outcome, 200)
+    with pytest.raises(GatewayUnavailable, match="after 1 attempt"):
+        await gw.create_order({"amount": 100})
+    assert calls == ["POST"]
+    assert gw.breaker.failures == 1
+
+
+@pytest.mark.parametrize("outcome", [httpx.ReadTimeout, 500])
+async def test_fetch_order_retries_any_failure(outcome):
+    gw, calls = gateway(outcome, outcome, 200)
+    assert await gw.fetch_order("order_1") == {"id": "order_1"}
+    assert calls == ["GET"] * 3
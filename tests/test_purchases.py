@@ -0,0 +1,111 @@
+import pytest
+
+from purchases import dedupe_orders, purchase_doc, reconcile, record_purchase
+
+pytestmark = pytest.mark.anyio
+
+
+def captured(order_id, user_id="user-1", set_number=2, kind="payment.captured"):
+    return {"event": kind, "payload": {"payment": {"entity": {
+        "id": f"pay_{order_id}", "order_id": order_id, "amount": 10000,
+        "notes": {"user_id": user_id, "set_number": str(set_number)}}}}}
+
+
+def refunded(order_id, amount_refunded=10000):
+    return {"event": "refund.processed", "payload": {
+        "payment": {"entity": {"id": f"pay_{order_id}", "order_id": order_id, "amount": 10000,
+                               "amount_refunded": amount_refunded}},
+        "refund": {"entity": {"id": f"rfnd_{order_id}"}}}}
+
+
+@pytest.fixture
+async def purchases(db):
+    await db.purchased_sets.create_index("order_id", unique=True, name="order_unique")
+    return db.purchased_sets
+
+
+async def test_capture_grants_once(purchases):
+    result = await reconcile(purchases, [captured("order_a"), captured("order_a", kind="order.paid")])
+    assert (result.received, result.granted, result.already_recorded) == (2, 1, 0)
+    assert result.user_ids == {"user-1"}
+
+    again = await reconcile(purchases, [captured("order_a")])
+    assert (again.granted, again.already_recorded) == (0, 1)
+    rows = await purchases.find({}, {"_id": 0}).to_list(None)
+    assert len(rows) == 1
+    assert rows[0]["is_active"] is True and rows[0]["set_number"] == 2 and rows[0]["source"] == "reconcile"
+
+
+async def test_verify_then_webhook_keeps_one_row(purchases):
+    assert await record_purchase(purchases, purchase_doc("user-1", 2, "order_b", "pay_order_b"))
+    result = await reconcile(purchases, [captured("order_b")])
+    assert (result.granted, result.already_recorded) == (0, 1)
+    assert await purchases.count_documents({"order_id": "order_b"}) == 1
+    assert not await record_purchase(purchases, purchase_doc("user-1", 2, "order_b", "pay_order_b"))
+
+
+@pytest.mark.parametrize("events", [
+    [captured("order_c"), refunded("order_c")],
+    [refunded("order_c"), captured("order_c")],
+])
+async def test_refund_wins_in_either_order(purchases, events):
+    result = await reconcile(purchases, events)
+    assert (result.granted, result.revoked) == (0, 1)
+    row = await purchases.find_one({"order_id": "order_c"})
+    assert row["is_active"] is False and row["refund_id"] == "rfnd_order_c"
+
+
+async def test_refund_of_existing_purchase(purchases):
+    await reconcile(purchases, [captured("order_d")])
+    result = await reconcile(purchases, [refunded("order_d")])
+    assert result.revoked == 1
+    assert (await purchases.find_one({"order_id": "order_d"}))["is_active"] is False
+
+
+async def test_unusable_events_are_skipped(purchases):
+    events = [
+        {"event": "payment.failed", "payload": {}},
+        {"event": "payment.captured", "payload": {"payment": {"entity": {"id": "pay_x"}}}},
+        captured("order_e", user_id=None),
+        refunded("order_f", amount_refunded=5000),
+    ]
+    result = await reconcile(purchases, events)
+    assert [s["reason"] for s in result.skipped] == [
+        "unhandled event", "no order id", "missing user_id/set_number notes", "partial refund"]
+    assert await purchases.count_documents({}) == 0
+
+
+async def test_dedupe_orders_keeps_refund_then_earliest(db):
+    rows = db.purchased_sets
+    await rows.insert_many([
+        {"id": "1", "order_id": "order_g", "is_active": True, "purchased_at": "2025-01-01"},
+        {"id": "2", "order_id": "order_g", "is_active": True, "purchased_at": "2025-01-02"},
+        {"id": "3", "order_id": "order_h", "is_active": True, "purchased_at": "2025-01-01"},
+        {"id": "4", "order_id": "order_h", "is_active": False, "purchased_at": "2025-01-03"},
+        {"id": "5", "order_id": None},
+        {"id": "6", "order_id": None},
+    ])
+    assert await dedupe_orders(rows) == 2
+    kept = {doc["order_id"]: doc["id"] async for doc in rows.find({})}
+    assert kept == {"order_g": "1", "order_h": "4", "legacy:5": "5", "legacy:6": "6"}
+    await rows.create_index("order_id", unique=True)
+
+
+async def test_verify_updates_the_cached_entitlement(client, server, monkeypatch):
+    import hashlib
+    import hmac
+
+    monkeypatch.setenv("RAZORPAY_KEY_SECRET", "test-secret")
+    user_id = "user-verify"
+    path = f"/api/payment/check-access/{user_id}/3"
+    assert (await client.get(path)).json() == {"has_access": False}  # cached: no sets
+
+    signature = hmac.new(b"test-secret", b"order_v|pay_v", hashlib.sha256).hexdigest()
+    response = await client.post("/api/payment/verify", json={
+        "razorpay_order_id": "order_v", "razorpay_payment_id": "pay_v", "razorpay_signature": signature,
+        "user_id": user_id, "set_number": 3})
+    assert response.json()["success"] is True
+
+    misses = server.entitlements.misses
+    assert (await client.get(path)).json() == {"has_access": True}
+    assert server.entitlements.misses == misses  # served from the granted entry, not reloaded
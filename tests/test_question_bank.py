@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from invalidation import InvalidationBus
+from question_bank import QuestionBank
+
+pytestmark = pytest.mark.anyio
+
+
+def question(n, text="Question"):
+    return {"id": f"physics_{n}", "question_number": n, "question_text": f"{text} {n}",
+            "correct_answer": "A", "subject": "physics", "set_number": 1}
+
+
+async def test_invalidate_reloads(db):
+    await db.questions.insert_one(question(1))
+    bank = QuestionBank(db.questions)
+    first = await bank.snapshot()
+    await db.questions.insert_one(question(2))
+    assert await bank.snapshot() is first and bank.current() is first
+
+    bank.invalidate()
+    assert bank.current() is None
+    assert len((await bank.snapshot()).group("physics", 1).questions) == 2
+
+
+async def test_writes_outside_the_server_show_up_after_max_age(db):
+    await db.questions.insert_one(question(1))
+    bank = QuestionBank(db.questions, max_age=60)
+    first = await bank.snapshot()
+    first.memo("answer_key", lambda snapshot: object())
+
+    bank._expires = 0  # aged out, nothing changed: the same snapshot comes back, memos intact
+    assert bank.current() is None
+    assert await bank.snapshot() is first and bank.current() is first
+
+    await db.questions.update_one({"id": "physics_1"}, {"$set": {"question_text": "Fixed 1"}})
+    assert (await bank.snapshot()) is first  # still within max_age
+    bank._expires = 0
+    second = await bank.snapshot()
+    assert second is not first and second.version == first.version
+    assert second.group("physics", 1).questions[0]["question_text"] == "Fixed 1"
+
+
+async def test_script_publish_reaches_running_workers(db, tmp_path, monkeypatch):
+    monkeypatch.setenv("INVALIDATION_BUS", "unix")
+    monkeypatch.setenv("INVALIDATION_SOCKET_DIR", str(tmp_path))
+    worker = InvalidationBus.from_env(db)
+    received = asyncio.Event()
+
+    async def on_questions_changed(payload):
+        received.set()
+
+    worker.subscribe("questions", on_questions_changed)
+    await worker.start()
+    try:
+        await InvalidationBus.publish_once(db, "questions")
+        await asyncio.wait_for(received.wait(), timeout=2)
+    finally:
+        await worker.close()
+    assert [p.name for p in tmp_path.iterdir()] == []  # the script's socket is cleaned up too
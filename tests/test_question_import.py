@@ -0,0 +1,75 @@
+import gzip
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SET_NUMBER = 41
+
+
+def question(n, subject="physics", **fields):
+    return {
+        "question_number": n,
+        "question_text": f"Question {n}",
+        "options": [{"label": label, "text": f"option {label}"} for label in "ABCD"],
+        "correct_answer": "A",
+        "marks": 1.5,
+        "subject": subject,
+        "part": "B",
+        "set_number": SET_NUMBER,
+        **fields,
+    }
+
+
+async def test_invalid_rows_are_reported_and_skipped(client, server):
+    rows = [
+        question(1),
+        question(2, marks=0),
+        question(3, correct_answer="E"),
+        question(4, options=[{"label": "A", "text": "x"}]),
+        question(5, options=[{"label": "A", "text": "x"}, {"label": "A", "text": "y"}]),
+        question(6, question_number=0),
+        "not an object",
+        question(1, question_text="Same id again"),
+        question(7, subject="tamil", marks=1),
+    ]
+    response = await client.post("/api/admin/questions/bulk", json=rows)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["valid"], report["inserted"], report["duplicates"]) == (9, 2, 2, 1)
+    assert [(e["row"], e["id"]) for e in report["errors"]] == [
+        (2, f"physics_s{SET_NUMBER}_2"), (3, f"physics_s{SET_NUMBER}_3"), (4, f"physics_s{SET_NUMBER}_4"),
+        (5, f"physics_s{SET_NUMBER}_5"), (6, f"physics_s{SET_NUMBER}_0"), (7, None), (8, f"physics_s{SET_NUMBER}_1")]
+    assert "correct_answer 'E'" in report["errors"][1]["error"]
+
+    stored = await server.db.questions.find({"set_number": SET_NUMBER}, {"_id": 0, "id": 1}).to_list(None)
+    assert sorted(q["id"] for q in stored) == [f"physics_s{SET_NUMBER}_1", f"tamil_s{SET_NUMBER}_7"]
+
+
+async def test_dry_run_and_reimport_change_nothing(client, server):
+    rows = [question(n, set_number=SET_NUMBER + 1) for n in (1, 2)]
+    dry = (await client.post("/api/admin/questions/bulk?dry_run=true", json=rows)).json()
+    assert (dry["dry_run"], dry["inserted"]) == (True, 2)
+    assert await server.db.questions.count_documents({"set_number": SET_NUMBER + 1}) == 0
+
+    first = (await client.post("/api/admin/questions/bulk", json=rows)).json()
+    again = (await client.post("/api/admin/questions/bulk", json=rows)).json()
+    assert (first["inserted"], again["inserted"], again["updated"], again["unchanged"]) == (2, 0, 0, 2)
+
+
+async def test_gzipped_csv_import(client, server):
+    set_number = SET_NUMBER + 2
+    csv = (
+        "set_number,subject,part,question_number,question_text,option_A,option_B,correct_answer,marks\n"
+        f'{set_number},physics,B,1,"Two lines,\nwith a comma",yes,no,B,1.5\n'
+        f"{set_number},physics,B,2,Bad answer,yes,no,C,1.5\n"
+    )
+    response = await client.post("/api/admin/questions/import", content=gzip.compress(csv.encode()),
+                                 headers={"Content-Type": "text/csv", "Content-Encoding": "gzip"})
+    report = response.json()
+    assert (report["inserted"], report["error_count"]) == (1, 1)
+    stored = await server.db.questions.find_one({"id": f"physics_s{set_number}_1"})
+    assert stored["question_text"] == "Two lines,\nwith a comma" and stored["marks"] == 1.5
+
+    response = await client.post("/api/admin/questions/import", content=b"{}", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 415
@@ -0,0 +1,145 @@
+import asyncio
+import random
+
+import pytest
+
+from rate_limits import Admission, Budget, MemoryBuckets, RateLimiter, client_ip
+
+pytestmark = pytest.mark.anyio
+
+
+def limiter(ip="100/60", user="2/60", store=None):
+    budgets = {"login": {scope: Budget.parse(value) for scope, value in (("ip", ip), ("user", user))
+                         if Budget.parse(value) is not None}}
+    return RateLimiter(budgets, MemoryBuckets() if store is None else store)
+
+
+def test_budget_parse():
+    budget = Budget.parse("10/60")
+    assert (budget.count, budget.seconds) == (10, 60)
+    assert Budget.parse("5").seconds == 60
+    assert Budget.parse("off") is None and Budget.parse("0") is None
+
+
+def test_from_env():
+    rates = RateLimiter.from_env(None, {"RATE_LIMIT_LOGIN_USER": "3/30", "RATE_LIMIT_FEEDBACK_IP": "off"})
+    assert rates.budgets["login"]["user"].count == 3
+    assert "ip" not in rates.budgets["feedback"]
+    assert isinstance(rates.store, MemoryBuckets)
+    assert RateLimiter.from_env(None, {"RATE_LIMIT_STORE": "off"}).store is None
+
+
+async def test_user_budget_is_per_user():
+    rates = limiter()
+    assert await rates.check("login", "1.2.3.4", "alice") == 0
+    assert await rates.check("login", "1.2.3.4", "alice") == 0
+    wait = await rates.check("login", "1.2.3.4", "alice")
+    assert 0 < wait <= 30
+    assert await rates.check("login", "1.2.3.4", "bob") == 0
+    assert rates.limited == {("login", "user"): 1}
+
+
+async def test_ip_budget_is_checked_first():
+    rates = limiter(ip="1/60")
+    assert await rates.check("login", "1.2.3.4", "alice") == 0
+    assert await rates.check("login", "1.2.3.4", "bob") > 0
+    assert await rates.check("login", "5.6.7.8", "bob") == 0
+    assert rates.limited == {("login", "ip"): 1}
+
+
+async def test_bucket_refills():
+    rates = limiter(user="2/0.1")  # a token every 50 ms
+    for _ in range(2):
+        assert await rates.check("login", None, "alice") == 0
+    assert await rates.check("login", None, "alice") > 0
+    await asyncio.sleep(0.06)
+    assert await rates.check("login", None, "alice") == 0
+
+
+async def test_unknown_route_and_missing_keys_are_allowed():
+    rates = limiter(ip="off", user="1/60")
+    assert await rates.check("register", "1.2.3.4", "alice") == 0
+    for _ in range(3):
+        assert await rates.check("login", "1.2.3.4", None) == 0
+
+
+async def test_store_failure_allows_the_request():
+    class Broken:
+        async def take(self, key, budget):
+            raise ConnectionError("mongo is down")
+
+    assert await limiter(store=Broken()).check("login", "1.2.3.4", "alice") == 0
+
+
+async def test_memory_buckets_forget_least_recently_used():
+    buckets = MemoryBuckets(max_keys=2)
+    budget = Budget(1, 60)
+    assert await buckets.take("a", budget) == 0
+    assert await buckets.take("b", budget) == 0
+    assert await buckets.take("c", budget) == 0
+    assert await buckets.take("a", budget) == 0  # forgotten, so full again
+    assert await buckets.take("c", budget) > 0
+
+
+def test_client_ip():
+    assert client_ip("10.0.0.1", "1.1.1.1, 2.2.2.2") == "10.0.0.1"
+    assert client_ip("10.0.0.1", "1.1.1.1, 2.2.2.2", trusted_hops=1) == "2.2.2.2"
+    assert client_ip("10.0.0.1", "1.1.1.1, 2.2.2.2", trusted_hops=5) == "1.1.1.1"
+    assert client_ip("10.0.0.1", None, trusted_hops=1) == "10.0.0.1"
+
+
+async def test_admission_queues_then_sheds():
+    admission = Admission(max_in_flight=1, max_queue=1, queue_timeout=1.0)
+    assert await admission.acquire()
+    queued = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    assert admission.queued == 1
+    assert not await admission.acquire()  # queue full
+    admission.release()  # the slot goes to the queued request
+    assert await queued
+    assert admission.in_flight == 1 and admission.shed == 1
+    admission.release()
+    assert admission.in_flight == 0
+
+
+async def test_admission_times_out_waiting():
+    admission = Admission(max_in_flight=1, max_queue=4, queue_timeout=0.01)
+    assert await admission.acquire()
+    assert not await admission.acquire()
+    assert (admission.shed, admission.queued, admission.in_flight) == (1, 0, 1)
+
+
+async def test_cancelled_waiter_passes_its_slot_on():
+    admission = Admission(max_in_flight=1, max_queue=4, queue_timeout=1.0)
+    assert await admission.acquire()
+    waiter = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    admission.release()  # handed to the waiter...
+    waiter.cancel()  # ...which goes away before it runs
+    try:
+        admitted = await waiter
+    except asyncio.CancelledError:
+        admitted = False
+    if admitted:
+        # Some Python versions let wait_for return the handed-over slot despite the cancel
+        admission.release()
+    assert admission.in_flight == 0 and admission.queued == 0
+
+
+async def test_admission_never_leaks_slots():
+    admission = Admission(max_in_flight=3, max_queue=8, queue_timeout=0.003)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        if not await admission.acquire():
+            return
+        peak = max(peak, admission.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.004))
+        finally:
+            admission.release()
+
+    await asyncio.gather(*[request() for _ in range(300)])
+    assert admission.in_flight == 0 and admission.queued == 0
+    assert peak <= 3 and admission.shed > 0
@@ -0,0 +1,41 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SET_NUMBER = 61
+
+
+@pytest.fixture
+async def pool(client):
+    questions = [{
+        "question_number": n,
+        "question_text": f"Question {n}",
+        "options": [{"label": label, "text": f"option {label}"} for label in "ABCD"],
+        "correct_answer": "A",
+        "marks": 1.5,
+        "subject": "physics",
+        "part": "B",
+        "set_number": SET_NUMBER,
+    } for n in range(1, 6)]
+    await client.post("/api/admin/questions/bulk", json=questions)
+
+
+async def test_same_seed_same_paper(client, pool):
+    path = f"/api/questions/sample?subject=physics&set_number={SET_NUMBER}&count=3"
+    first = (await client.get(path + "&seed=user-1:1")).json()
+    again = (await client.get(path + "&seed=user-1:1")).json()
+    assert first == again
+    assert len(first["questions"]) == 3 and first["total_marks"] == 4.5
+    assert all("correct_answer" not in q for q in first["questions"])
+
+
+async def test_pools_are_only_cached_for_real_groups(client, server, pool):
+    await client.get(f"/api/questions/sample?subject=physics&set_number={SET_NUMBER}&seed=s")
+    snapshot = await server.question_bank.snapshot()
+    cached = len(snapshot._memo)
+    for n in range(20):
+        response = await client.get(f"/api/questions/sample?subject=made-up-{n}&seed=s")
+        assert response.json() == {"questions": [], "total_marks": 0, "time_limit": 0}
+    response = await client.get(f"/api/questions/sample?subject=physics&set_number=99999&seed=s")
+    assert response.json()["questions"] == []
+    assert len(snapshot._memo) == cached
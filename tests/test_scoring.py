@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from scoring import AnswerKey
+
+LABELS = ["A", "B", "C", "D"]
+
+
+def paper():
+    questions = []
+    for subject, part, count in (("tamil", "A", 30), ("physics", "B", 100)):
+        for n in range(1, count + 1):
+            questions.append({
+                "id": f"{subject}_s1_{n}",
+                "question_number": n,
+                "question_text": f"{subject} {n}",
+                "options": [{"label": label, "text": label} for label in LABELS],
+                "correct_answer": random.choice(LABELS),
+                "marks": (2 if n <= 20 else 1) if subject == "tamil" else 1.5,
+                "subject": subject,
+                "part": part,
+            })
+    return questions
+
+
+def submission(questions, answered=0.8):
+    return [(q["id"], random.choice(LABELS)) for q in questions if random.random() < answered]
+
+
+def assert_same(batch, single, answer_key):
+    # Marks are multiples of 0.5, so the float sums are exact either way
+    assert (batch.score, batch.total_marks, batch.percentage) == (single.score, single.total_marks, single.percentage)
+    assert batch.subjects == single.subjects
+    assert batch.parts == single.parts
+    assert answer_key.detailed_results(batch) == answer_key.detailed_results(single)
+
+
+@pytest.fixture
+def answer_key():
+    random.seed(7)
+    return AnswerKey(paper())
+
+
+def test_score_counts_marks_per_subject_and_part():
+    questions = paper()
+    answer_key = AnswerKey(questions)
+    tamil_1, physics_1 = questions[0], questions[30]
+    wrong = next(label for label in LABELS if label != physics_1["correct_answer"])
+    result = answer_key.score([(tamil_1["id"], tamil_1["correct_answer"]), (physics_1["id"], wrong),
+                               ("not-a-question", "A")])
+    assert (result.score, result.total_marks, result.percentage) == (2.0, 3.5, 57.14)
+    assert result.subjects == {
+        "tamil": {"score": 2.0, "total_marks": 2.0, "correct": 1, "answered": 1},
+        "physics": {"score": 0.0, "total_marks": 1.5, "correct": 0, "answered": 1}}
+    assert set(result.parts) == {"A", "B"}
+
+
+def test_score_batch_matches_score(answer_key):
+    questions = [{"id": qid} for qid in answer_key.ids]
+    submissions = [submission(questions, answered) for answered in (0, 0.3, 0.8, 1, 1, 0.5) * 20]
+    results = answer_key.score_batch(submissions)
+    assert len(results) == len(submissions)
+    for answers, batch in zip(submissions, results):
+        assert_same(batch, answer_key.score(answers), answer_key)
+
+
+def test_score_batch_falls_back_on_unknown_pairs(answer_key):
+    submissions = [[(answer_key.ids[0], "A"), ("not-a-question", "A")], [(answer_key.ids[1], "Z")]]
+    for answers, batch in zip(submissions, answer_key.score_batch(submissions)):
+        assert_same(batch, answer_key.score(answers), answer_key)
+
+
+def test_score_batch_accepts_iterators_and_empty_batches(answer_key):
+    answers = [(answer_key.ids[0], "A"), (answer_key.ids[5], "B")]
+    (batch,) = answer_key.score_batch([iter(answers)])
+    assert_same(batch, answer_key.score(answers), answer_key)
+    assert answer_key.score_batch([]) == []
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SET_NUMBER = 51
+
+
+@pytest.fixture
+async def paper(client):
+    questions = [{
+        "question_number": n,
+        "question_text": f"Question {n}",
+        "options": [{"label": label, "text": f"option {label}"} for label in "ABCD"],
+        "correct_answer": "A",
+        "marks": 2 if subject == "physics" else 1,
+        "subject": subject,
+        "part": "A" if subject == "tamil" else "B",
+        "set_number": SET_NUMBER,
+    } for subject in ("tamil", "physics") for n in (1, 2)]
+    response = await client.post("/api/admin/questions/bulk", json=questions)
+    report = response.json()
+    assert report["inserted"] + report["unchanged"] == 4
+    return [f"{q['subject']}_s{SET_NUMBER}_{q['question_number']}" for q in questions]
+
+
+async def stored_attempts(server, user_id):
+    await server.attempt_writer.flush()
+    return await server.db.test_attempts.find({"user_id": user_id}, {"_id": 0}).to_list(None)
+
+
+async def test_session_submit_records_one_attempt(client, server, paper):
+    user_id = f"user-{uuid.uuid4().hex[:8]}"
+    session = (await client.post("/api/exam/sessions", json={
+        "user_id": user_id, "test_type": "full", "set_number": SET_NUMBER})).json()
+    path = f"/api/exam/sessions/{session['session_id']}"
+    tamil_1, tamil_2, physics_1, physics_2 = paper
+    await client.patch(path + "/answers", json={"seq": 1, "answers": {tamil_1: "A", physics_1: "B"}})
+    await client.patch(path + "/answers", json={"seq": 2, "answers": {physics_1: "A", physics_2: "C"}})
+
+    # A double click: both submits arrive together, only one may score
+    first, second = await asyncio.gather(client.post(path + "/submit"), client.post(path + "/submit"))
+    assert sorted([first.status_code, second.status_code]) == [200, 409]
+    result = (first if first.status_code == 200 else second).json()
+    # total_marks counts the questions answered
+    assert (result["score"], result["total_marks"]) == (3, 5)
+    assert result["rank"] >= 1 and result["out_of"] >= 1
+
+    assert (await client.post(path + "/submit")).status_code == 409
+    assert (await client.patch(path + "/answers", json={"seq": 3, "answers": {tamil_2: "A"}})).status_code == 409
+
+    attempts = await stored_attempts(server, user_id)
+    assert len(attempts) == 1
+    assert attempts[0]["set_number"] == SET_NUMBER and attempts[0]["score"] == 3
+    assert {a["question_id"]: a["selected_answer"] for a in attempts[0]["answers"]} == {
+        tamil_1: "A", physics_1: "A", physics_2: "C"}
+
+    analytics = (await client.get(f"/api/users/{user_id}/analytics")).json()
+    assert analytics["attempts"] == 1
+
+
+async def test_one_shot_submit_records_one_attempt(client, server, paper):
+    user_id = f"user-{uuid.uuid4().hex[:8]}"
+    response = await client.post("/api/test/submit", json={
+        "user_id": user_id, "test_type": "full", "set_number": SET_NUMBER, "time_taken": 60,
+        "answers": [{"question_id": qid, "selected_answer": "A"} for qid in paper]})
+    assert response.status_code == 200
+    assert response.json()["score"] == 6
+    assert len(await stored_attempts(server, user_id)) == 1
+
+
+async def test_unknown_session_is_404(client):
+    assert (await client.post("/api/exam/sessions/missing/submit")).status_code == 404
+
+
+async def test_made_up_test_types_and_sets_get_no_board(client, server, paper):
+    boards = len(server.leaderboard._boards)
+    for test_type, set_number in [("junk", None), ("full", 9999), ("sample", -1)]:
+        response = await client.post("/api/test/submit", json={
+            "user_id": f"user-{uuid.uuid4().hex[:8]}", "test_type": test_type, "set_number": set_number,
+            "time_taken": 60, "answers": [{"question_id": paper[0], "selected_answer": "A"}]})
+        assert response.status_code == 200
+        assert (response.json()["rank"], response.json()["percentile"]) == (None, None)
+    assert len(server.leaderboard._boards) == boards
+
+    # The attempts are still stored; a reload must skip them too
+    await server.attempt_writer.flush()
+    await server.leaderboard.load()
+    assert all(key[0] != "junk" and key[1] not in (9999, -1) for key in server.leaderboard._boards)
@@ -0,0 +1,115 @@
+import asyncio
+import fcntl
+import json
+import os
+
+import pytest
+
+from write_behind import WriteBehindQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def attempts(db):
+    # Replays rely on the unique id index to reject what already made it to Mongo
+    await db.test_attempts.create_index("id", unique=True)
+    return db.test_attempts
+
+
+def queue(collection, spool_dir, notified, **kwargs):
+    writer = WriteBehindQueue(collection, spool_dir, **kwargs)
+
+    async def listener(docs):
+        notified.extend(doc["id"] for doc in docs)
+
+    writer.add_listener(listener)
+    return writer
+
+
+def write_segment(spool_dir, name, ids):
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    (spool_dir / name).write_text("".join(json.dumps({"id": i, "score": 1}) + "\n" for i in ids))
+
+
+async def stored_ids(collection):
+    return sorted([doc["id"] async for doc in collection.find({})])
+
+
+async def test_segment_of_a_dead_run_is_replayed_once(attempts, tmp_path):
+    # The crashed run got a1 into Mongo (and to the listeners) before it died
+    await attempts.insert_one({"id": "a1", "score": 1})
+    write_segment(tmp_path, "deadrun00000-1-1.ndjson", ["a1", "a2", "a3"])
+    (tmp_path / "deadrun00000.lock").touch()  # left behind, nobody holds it
+
+    notified = []
+    writer = queue(attempts, tmp_path, notified)
+    await writer.start()
+    try:
+        assert await stored_ids(attempts) == ["a1", "a2", "a3"]
+        assert notified == ["a2", "a3"]  # the duplicate counts as written, but is not announced again
+        assert not list(tmp_path.glob("deadrun*"))
+    finally:
+        await writer.close()
+
+
+async def test_segment_of_a_live_run_is_left_alone(attempts, tmp_path):
+    write_segment(tmp_path, "liverun00000-1-1.ndjson", ["b1"])
+    fd = os.open(tmp_path / "liverun00000.lock", os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        writer = queue(attempts, tmp_path, [])
+        await writer.start()
+        await writer.close()
+        assert await stored_ids(attempts) == []
+        assert (tmp_path / "liverun00000-1-1.ndjson").exists()
+    finally:
+        os.close(fd)
+
+
+async def test_spooled_attempts_survive_a_crash(attempts, tmp_path):
+    notified = []
+    crashed = queue(attempts, tmp_path, notified, max_delay=60)
+    await crashed.start()
+    for i in range(3):
+        crashed.submit({"id": f"c{i}", "score": i})
+    # The process dies before the batch is flushed: no close(), its lock goes with it
+    crashed._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await crashed._task
+    os.close(crashed._lock_fd)
+    assert await stored_ids(attempts) == []
+
+    restarted = queue(attempts, tmp_path, notified)
+    await restarted.start()
+    try:
+        assert await stored_ids(attempts) == ["c0", "c1", "c2"]
+        assert notified == ["c0", "c1", "c2"]
+        assert not list(tmp_path.glob("*.ndjson"))
+    finally:
+        await restarted.close()
+
+
+async def test_failed_insert_is_retried_from_disk(attempts, tmp_path):
+    class Flaky:
+        failures = 1
+
+        async def insert_many(self, docs, ordered=True):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("mongo is down")
+            return await attempts.insert_many(docs, ordered=ordered)
+
+    notified = []
+    writer = queue(Flaky(), tmp_path, notified, max_delay=60)
+    await writer.start()
+    try:
+        writer.submit({"id": "d1", "score": 1})
+        await writer.flush()
+        assert await stored_ids(attempts) == [] and len(list(tmp_path.glob("*.ndjson"))) == 1
+        await writer.flush()
+        assert await stored_ids(attempts) == ["d1"]
+        assert notified == ["d1"]
+        assert not list(tmp_path.glob("*.ndjson"))
+    finally:
+        await writer.close()